@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Feature Ablation Engine
+
+Runs many feature-subset experiments for a ticker against one shared float32
+feature matrix instead of re-preparing data per model:
+  - Base vs Base + Sentiment (the run_experiment() comparison)
+  - Leave-one-feature-group-out for every group in get_feature_groups()
+  - Permutation importance of the full model on the test set
+
+All subset models are fitted in a single parallel batch (threads, so the
+matrix is shared rather than pickled to workers). Models are either the RF
+that run_experiment() trains (train_rf() with calibrate=True, i.e. RF_PARAMS
+plus RF_CALIBRATION) or sklearn's histogram gradient boosting, which is much
+faster for large ablation grids.
+
+Usage:
+    python ablation.py                          # All tickers, RF
+    python ablation.py --tickers SPX NDX        # Subset of tickers
+    python ablation.py --model hgb              # Histogram gradient boosting
+    python ablation.py --no-permutation         # Skip permutation importance
+"""
+
+import argparse
+import os
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import accuracy_score, brier_score_loss
+
+from modelling import (
+    RANDOM_SEED, RESULTS_DIR, RF_CALIBRATION, RF_CALIBRATION_HOLDOUT, RF_CALIBRATION_METHOD, RF_PARAMS,
+    build_feature_matrix, detect_tickers, get_feature_groups, get_feature_sets, prepare_ticker_data,
+)
+from rf_calibration import SingleFitCalibratedClassifier
+
+
+def make_model(kind):
+    """Unfitted classifier for one ablation; each uses 1 thread since experiments run in parallel."""
+    if kind == 'rf':
+        # Calibrated like train_rf(calibrate=True), so deltas match the run_experiment() models
+        return SingleFitCalibratedClassifier(
+            RandomForestClassifier(**{**RF_PARAMS, 'random_state': RANDOM_SEED, 'n_jobs': 1}),
+            method=RF_CALIBRATION_METHOD, calibration=RF_CALIBRATION, holdout_ratio=RF_CALIBRATION_HOLDOUT
+        )
+    if kind == 'hgb':
+        return HistGradientBoostingClassifier(
+            max_depth=4, min_samples_leaf=20, learning_rate=0.05, max_iter=200,
+            random_state=RANDOM_SEED
+        )
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+def column_subset(X, cols):
+    """
+    Selects columns of the shared feature matrix. A contiguous run is returned
+    as a view; anything else is gathered once for that experiment.
+    """
+    cols = np.asarray(cols)
+    if len(cols) and np.array_equal(cols, np.arange(cols[0], cols[0] + len(cols))):
+        return X[:, cols[0]:cols[0] + len(cols)]
+    return X[:, cols]
+
+
+def build_experiments(all_feats):
+    """Maps experiment name -> column indices into the all_feats matrix."""
+    base_feats, _ = get_feature_sets()
+    position = {f: i for i, f in enumerate(all_feats)}
+    experiments = {
+        'Base': [position[f] for f in base_feats],
+        'Base + Sentiment': list(range(len(all_feats))),
+    }
+    for group, feats in get_feature_groups().items():
+        dropped = set(feats)
+        experiments[f'Without {group}'] = [i for f, i in position.items() if f not in dropped]
+    return experiments
+
+
+def fit_and_score(name, kind, X_train, y_train, X_test, y_test):
+    start = time.perf_counter()
+    model = make_model(kind).fit(X_train, y_train)
+    probs = model.predict_proba(X_test)[:, 1]
+    return {
+        'Experiment': name,
+        'Features': X_train.shape[1],
+        'Accuracy': accuracy_score(y_test, (probs > 0.5).astype(int)),
+        'Brier': brier_score_loss(y_test, probs),
+        'FitSeconds': time.perf_counter() - start,
+    }, model
+
+
+def run_ablation(ticker, kind='rf', n_jobs=-1, permutation=True, n_repeats=10):
+    """Runs every ablation for one ticker. Returns (results_df, permutation_importance_series or None)."""
+    train_df, test_df = prepare_ticker_data(ticker)
+    base_feats, sent_feats = get_feature_sets()
+    all_feats = base_feats + sent_feats
+
+    # One contiguous float32 matrix per split, shared by every experiment
+    X_train = build_feature_matrix(train_df, all_feats)
+    X_test = build_feature_matrix(test_df, all_feats)
+    y_train = train_df['Target'].to_numpy()
+    y_test = test_df['Target'].to_numpy()
+
+    experiments = build_experiments(all_feats)
+    outputs = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(fit_and_score)(
+            name, kind, column_subset(X_train, cols), y_train, column_subset(X_test, cols), y_test
+        )
+        for name, cols in experiments.items()
+    )
+    results = pd.DataFrame([row for row, _ in outputs])
+    full = results.set_index('Experiment').loc['Base + Sentiment']
+    results['Delta_Accuracy'] = results['Accuracy'] - full['Accuracy']
+    results['Delta_Brier'] = results['Brier'] - full['Brier']
+    results.insert(0, 'Ticker', ticker)
+
+    importances = None
+    if permutation:
+        full_model = dict(zip(experiments, (model for _, model in outputs)))['Base + Sentiment']
+        perm = permutation_importance(
+            full_model, X_test, y_test, scoring='neg_brier_score',
+            n_repeats=n_repeats, random_state=RANDOM_SEED, n_jobs=n_jobs
+        )
+        importances = pd.Series(perm.importances_mean, index=all_feats, name=ticker).sort_values(ascending=False)
+
+    return results, importances
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run feature ablations on a shared feature matrix')
+    parser.add_argument('--tickers', nargs='+', help='Tickers to include (default: all)')
+    parser.add_argument('--model', choices=['rf', 'hgb'], default='rf',
+                        help='Model used for every ablation (default: rf)')
+    parser.add_argument('-j', '--jobs', type=int, default=-1,
+                        help='Parallel experiments (default: all cores)')
+    parser.add_argument('--no-permutation', action='store_true',
+                        help='Skip permutation importance')
+    args = parser.parse_args()
+
+    all_results, all_importances = [], []
+    for ticker in args.tickers or detect_tickers():
+        start = time.perf_counter()
+        try:
+            results, importances = run_ablation(
+                ticker, kind=args.model, n_jobs=args.jobs, permutation=not args.no_permutation
+            )
+        except Exception as e:
+            print(f"Error processing {ticker}: {e}")
+            traceback.print_exc()
+            continue
+        print(f"\n=== Ablations for {ticker} ({len(results)} experiments, "
+              f"{time.perf_counter() - start:.2f}s) ===")
+        print(results.drop(columns='Ticker').to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        all_results.append(results)
+        if importances is not None:
+            print("\nPermutation importance (Brier increase):")
+            print(importances.head(5).to_string(float_format=lambda v: f"{v:.5f}"))
+            all_importances.append(importances)
+
+    if not all_results:
+        print("\nNo ablations completed")
+        return
+    path = os.path.join(RESULTS_DIR, f'ablation_{args.model}.csv')
+    pd.concat(all_results).to_csv(path, index=False)
+    print(f"\nSaved {path}")
+    if all_importances:
+        path = os.path.join(RESULTS_DIR, f'permutation_importance_{args.model}.csv')
+        pd.concat(all_importances, axis=1).to_csv(path)
+        print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
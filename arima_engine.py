@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+ARIMA engine: order selection, warm-started walk-forward fits and a
+closed-form least-squares AR fallback, parallel across tickers.
+
+  - Order selection: d is chosen once per ticker (KPSS test), the series is
+    differenced once, and an AIC/BIC grid over (p, q) is fitted on it. Each
+    q is a chain over increasing p in which every fit is warm-started from
+    the previous one; chains from all tickers run in parallel.
+  - Chosen orders are cached in results/arima_orders.json, keyed by a hash of
+    the training series and the selection settings, so re-runs skip the grid.
+  - walk_forward() re-estimates the model at every step like the original
+    loop in train_arima, but starts each fit from the previous parameters;
+    refit_every > 1 only filters the new observations between refits.
+  - ar_ls_walk_forward() is an AR(p) on the d-th differences fitted by
+    ordinary least squares. Every expanding-window fit of the walk-forward is
+    solved at once from cumulative normal equations (NumPy only), which is
+    orders of magnitude faster for large ticker universes.
+
+Usage:
+    python arima_engine.py                                  # Select orders for all tickers (cached)
+    python arima_engine.py --tickers SPX NDX --criterion bic
+    python arima_engine.py --engine ar_ls                   # Least-squares AR order selection
+    python arima_engine.py --refresh                        # Ignore cached orders
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+from joblib import Parallel, delayed
+
+# Default cache; modelling.py passes its own ARIMA_ORDER_CACHE_PATH. Not imported from modelling:
+# joblib workers import this module, and `python modelling.py` would execute modelling twice.
+ORDER_CACHE_PATH = os.path.join('results', 'arima_orders.json')
+
+# Order-selection grid
+MAX_P = 5
+MAX_D = 2
+MAX_Q = 3
+KPSS_ALPHA = 0.05
+
+ENGINES = ['statsmodels', 'ar_ls']
+CRITERIA = ['aic', 'bic']
+
+
+def direction_probability(forecast, current):
+    """Maps a price forecast to P(up) as in train_arima: sigmoid(10 * relative change)."""
+    change = (forecast - current) / current
+    return 1 / (1 + np.exp(-change * 10))
+
+
+def difference(x, d):
+    return np.diff(np.asarray(x, dtype=np.float64), n=d) if d else np.asarray(x, dtype=np.float64)
+
+
+# === Order selection ===
+
+def choose_d_kpss(x, max_d=MAX_D, alpha=KPSS_ALPHA):
+    """Smallest d whose differenced series is not rejected as level-stationary by KPSS."""
+    from statsmodels.tsa.stattools import kpss
+
+    for d in range(max_d + 1):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # p-value outside the lookup table
+            p_value = kpss(difference(x, d), regression='c', nlags='auto')[1]
+        if p_value > alpha:
+            return d
+    return max_d
+
+
+def choose_d_variance(x, max_d=MAX_D):
+    """NumPy-only rule for ar_ls: the d (>= 1 for prices) with the smallest differenced std."""
+    stds = [np.std(difference(x, d)) for d in range(1, max_d + 1)]
+    return 1 + int(np.argmin(stds))
+
+
+def information_criterion(llf, n_params, n_obs, criterion):
+    penalty = 2 * n_params if criterion == 'aic' else np.log(n_obs) * n_params
+    return -2 * llf + penalty
+
+
+def fit_chain(y, d, q, max_p=MAX_P, criterion='aic'):
+    """
+    Fits ARMA(p, q) for p = 0..max_p on the already differenced series y,
+    warm-starting each fit from the previous p (new AR coefficient set to 0).
+    Returns [(order, ic, params)] with ic = inf for fits that failed.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    trend = 'c' if d == 0 else 'n'
+    results, previous = [], None
+    for p in range(max_p + 1):
+        start = None
+        if previous is not None:
+            # Layout: [const], ar.L1..ar.Lp, ma.L1..ma.Lq, sigma2
+            start = np.insert(previous, (trend == 'c') + p - 1, 0.0)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                fit = ARIMA(y, order=(p, 0, q), trend=trend).fit(start_params=start)
+            previous = fit.params
+            ic = information_criterion(fit.llf, len(fit.params), fit.nobs, criterion)
+            results.append(((p, d, q), float(ic), [float(v) for v in fit.params]))
+        except Exception:
+            previous = None
+            results.append(((p, d, q), float('inf'), None))
+    return results
+
+
+def select_ar_order(x, max_p=MAX_P, max_d=MAX_D, criterion='aic'):
+    """(p, d, 0) minimising the criterion for least-squares AR on a common sample."""
+    d = choose_d_variance(x, max_d)
+    y = difference(x, d)
+    n = len(y) - max_p
+    candidates = []
+    for p in range(max_p + 1):
+        Z, target = lag_matrix(y, p)
+        Z, target = Z[max_p - p:], target[max_p - p:]
+        beta, *_ = np.linalg.lstsq(Z, target, rcond=None)
+        sigma2 = np.mean((target - Z @ beta) ** 2)
+        llf = -0.5 * n * (np.log(2 * np.pi * sigma2) + 1)
+        candidates.append(((p, d, 0), float(information_criterion(llf, p + 2, n, criterion)), None))
+    return candidates
+
+
+def series_key(x, engine, criterion):
+    digest = hashlib.sha1(np.ascontiguousarray(x, dtype=np.float64).tobytes())
+    digest.update(json.dumps([engine, criterion, MAX_P, MAX_D, MAX_Q, KPSS_ALPHA]).encode())
+    return digest.hexdigest()
+
+
+class OrderCache:
+    """Chosen orders in a JSON file, keyed by series hash + selection settings."""
+
+    def __init__(self, path=ORDER_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return tuple(entry['order']) if entry else None
+
+    def put(self, key, ticker, order, ic, engine, criterion):
+        self.entries[key] = {'ticker': ticker, 'order': list(order), criterion: ic, 'engine': engine,
+                             'selected': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def select_orders(series, engine='statsmodels', criterion='aic', n_jobs=-1, cache=True, refresh=False,
+                  verbose=True, cache_path=ORDER_CACHE_PATH):
+    """
+    Chooses an order per ticker. series: {ticker: training prices}.
+    Returns {ticker: (p, d, q)}; cached tickers (in cache_path) are not refitted unless refresh=True.
+    """
+    store = OrderCache(cache_path) if cache else None
+    orders, todo = {}, {}
+    for ticker, x in series.items():
+        x = np.asarray(x, dtype=np.float64)
+        key = series_key(x, engine, criterion)
+        cached = store.get(key) if store and not refresh else None
+        if cached:
+            orders[ticker] = cached
+        else:
+            todo[ticker] = (x, key)
+
+    if todo:
+        start = time.perf_counter()
+        if engine == 'ar_ls':
+            grids = {t: select_ar_order(x, criterion=criterion) for t, (x, _) in todo.items()}
+        else:
+            # Difference each series once; every (ticker, q) chain reuses it
+            diffed = {}
+            for ticker, (x, _) in todo.items():
+                d = choose_d_kpss(x)
+                diffed[ticker] = (difference(x, d), d)
+            chains = [(t, q) for t in todo for q in range(MAX_Q + 1)]
+            fitted = Parallel(n_jobs=n_jobs)(
+                delayed(fit_chain)(diffed[t][0], diffed[t][1], q, MAX_P, criterion) for t, q in chains
+            )
+            grids = {t: [] for t in todo}
+            for (ticker, _), results in zip(chains, fitted):
+                grids[ticker].extend(results)
+
+        for ticker, candidates in grids.items():
+            order, ic, _ = min(candidates, key=lambda c: c[1])
+            orders[ticker] = tuple(order)
+            if store:
+                store.put(todo[ticker][1], ticker, order, ic, engine, criterion)
+        if store:
+            store.save()
+        if verbose:
+            print(f"Selected ARIMA orders for {len(todo)} ticker(s) in {time.perf_counter() - start:.1f}s")
+    return orders
+
+
+# === Walk-forward forecasting ===
+
+def walk_forward(price_train, price_test, order, refit_every=1):
+    """
+    One-step-ahead walk-forward over price_test with statsmodels ARIMA.
+    Returns (preds, probs, params of the last fit). Each refit starts from the
+    previous parameters; failed steps predict 0 with probability 0.5.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    history = list(np.asarray(price_train, dtype=np.float64))
+    test = np.asarray(price_test, dtype=np.float64)
+    preds, probs = np.zeros(len(test), dtype=int), np.full(len(test), 0.5)
+    fit, params = None, None
+
+    for i, actual in enumerate(test):
+        try:
+            if fit is None or i % refit_every == 0:
+                fit = ARIMA(history, order=order).fit(start_params=params)
+                params = fit.params
+            forecast = fit.forecast(steps=1)[0]
+            preds[i] = int(forecast > history[-1])
+            probs[i] = direction_probability(forecast, history[-1])
+        except Exception as e:
+            print(f"ARIMA forecast error at step {i}: {e}")
+            fit = None
+        history.append(actual)
+        if fit is not None and (i + 1) % refit_every:
+            fit = fit.extend([actual])  # Filter only the new observation, same parameters
+    return preds, probs, params
+
+
+def lag_matrix(y, p):
+    """Design rows [1, y[t-1], ..., y[t-p]] and targets y[t] for t = p..len(y)-1."""
+    Z = np.ones((len(y) - p, p + 1))
+    for k in range(1, p + 1):
+        Z[:, k] = y[p - k:len(y) - k]
+    return Z, y[p:]
+
+
+def ar_ls_walk_forward(price_train, price_test, order):
+    """
+    Walk-forward AR(p) on d-th differences with an OLS refit at every step.
+    All expanding-window fits come from prefix sums of Z'Z and Z'y, so the
+    whole test period is solved in one batched np.linalg.solve.
+    Returns (preds, probs, coefficients of the last fit).
+    """
+    p, d, q = order
+    if q:
+        raise ValueError(f"ar_ls fits pure AR models; got order {order}")
+    x = np.concatenate([np.asarray(price_train, dtype=np.float64), np.asarray(price_test, dtype=np.float64)])
+    n_train, n_test = len(price_train), len(price_test)
+    Z, target = lag_matrix(difference(x, d), p)
+
+    # Prefix sums over design rows (row j has target index t = j + p)
+    ZZ = np.concatenate([np.zeros((1, p + 1, p + 1)), np.cumsum(Z[:, :, None] * Z[:, None, :], axis=0)])
+    Zy = np.concatenate([np.zeros((1, p + 1)), np.cumsum(Z * target[:, None], axis=0)])
+
+    # Level x[n_train + i] is difference index t_i = n_train + i - d; its fit uses rows before it
+    rows = np.arange(n_test) + n_train - d - p
+    ridge = 1e-8 * np.eye(p + 1)
+    beta = np.linalg.solve(ZZ[rows] + ridge, Zy[rows][:, :, None])[:, :, 0]
+    forecast_diff = np.einsum('ij,ij->i', Z[rows], beta)
+
+    # Undo differencing: x[t+1] = diff^d x[t+1] + sum_{k<d} diff^k x[t]
+    last = np.arange(n_test) + n_train - 1
+    forecast = forecast_diff + sum(difference(x, k)[last - k] for k in range(d))
+    current = x[last]
+    preds = (forecast > current).astype(int)
+    return preds, direction_probability(forecast, current), beta[-1]
+
+
+def forecast_ticker(price_train, price_test, order, engine='statsmodels', refit_every=1):
+    if engine == 'ar_ls':
+        return ar_ls_walk_forward(price_train, price_test, order)
+    return walk_forward(price_train, price_test, order, refit_every)
+
+
+def forecast_tickers(splits, orders, engine='statsmodels', refit_every=1, n_jobs=-1):
+    """
+    Walk-forward forecasts for many tickers in parallel.
+    splits: {ticker: (price_train, price_test)}; orders: {ticker: order}.
+    Returns {ticker: (preds, probs, params)}.
+    """
+    tickers = list(splits)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(forecast_ticker)(*splits[t], orders[t], engine, refit_every) for t in tickers
+    )
+    return dict(zip(tickers, results))
+
+
+def main():
+    from modelling import detect_tickers, prepare_ticker_data
+
+    parser = argparse.ArgumentParser(description='Select and cache ARIMA orders per ticker')
+    parser.add_argument('--tickers', nargs='+', help='Tickers (default: all)')
+    parser.add_argument('--engine', choices=ENGINES, default='statsmodels')
+    parser.add_argument('--criterion', choices=CRITERIA, default='aic')
+    parser.add_argument('--jobs', type=int, default=-1, help='Parallel jobs (default: all cores)')
+    parser.add_argument('--start', help='First date of the sample')
+    parser.add_argument('--end', help='Last date of the sample')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached orders')
+    args = parser.parse_args()
+
+    tickers = args.tickers or detect_tickers()
+    series = {t: prepare_ticker_data(t, args.start, args.end)[0]['Close'] for t in tickers}
+    orders = select_orders(series, args.engine, args.criterion, args.jobs, refresh=args.refresh)
+
+    print(f"\n{'Ticker':<8} Order ({args.engine}, {args.criterion})")
+    for ticker in tickers:
+        print(f"{ticker:<8} {orders[ticker]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Multi-node GKG backfill through a shared lease queue.
+
+process-gdelt.py is limited to one machine's process pool and a local
+processed_log.txt. Here the file list is split into date-ordered batches in an
+SQLite queue on shared storage (QUEUE_PATH). Any number of worker processes,
+on any number of nodes that mount the same directory, claim one batch at a
+time under a lease and keep the lease alive with heartbeats. A worker that
+dies stops heartbeating, and its batch is reclaimed once the lease expires;
+failed batches are retried up to MAX_ATTEMPTS times.
+
+Each worker runs process-gdelt.py's process_file (same filtering, theme/entity
+parts and duplicate suppression) and writes additive per-day sums (records,
+tone, tone squared, polarity, duplicates) for every batch to its own shard,
+SHARD_DIR/<worker>/<batch>.parquet, before marking the batch done. Shard files
+are written atomically. A worker that lost its lease discards its result, so
+every batch has exactly one accepted shard file. `reduce` merges the accepted
+shards into gdelt_economic_signals.csv, compacts the theme/entity parts and
+appends the files to processed_log.txt, so later incremental runs of
+process-gdelt.py skip them. Duplicate suppression works within a batch; the
+cross-day window restarts at batch boundaries.
+
+The SQLite database uses a rollback journal (not WAL) because WAL needs shared
+memory and does not work across hosts on network filesystems.
+
+Usage:
+    python backfill-gdelt.py init --batch-size 20            # Queue every not-yet-processed GKG file
+    python backfill-gdelt.py worker                          # Run on each node (as many as you like)
+    python backfill-gdelt.py status
+    python backfill-gdelt.py reduce                          # Once the queue is drained
+    python backfill-gdelt.py bench --workers 1 2 4           # Local scaling run on a copy of the queue
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import entity_index
+import theme_matrix
+
+pg = importlib.import_module('process-gdelt')
+
+BACKFILL_DIR = os.path.join('results', 'backfill')
+QUEUE_PATH = os.path.join(BACKFILL_DIR, 'queue.db')
+SHARD_DIR = os.path.join(BACKFILL_DIR, 'shards')
+BATCH_SIZE = 20          # GKG files per claimed batch (consecutive dates)
+LEASE_SECONDS = 120      # A batch is reclaimable this long after its last heartbeat
+HEARTBEAT_SECONDS = 20
+MAX_ATTEMPTS = 3
+
+SUMS = ['count', 'tone_n', 'tone_sum', 'tone_sq', 'polarity_n', 'polarity_sum', 'records', 'duplicates']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY, files TEXT, state TEXT, owner TEXT, lease_until REAL,
+    attempts INTEGER DEFAULT 0, error TEXT, started REAL, finished REAL, seconds REAL
+);
+CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, batch INTEGER);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY, host TEXT, pid INTEGER, started REAL, heartbeat REAL, batches INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS batches_by_state ON batches (state, lease_until);
+"""
+
+
+class WorkQueue:
+    """Lease-based batch queue in SQLite (one connection per process)."""
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, sql, params=()):
+        """Runs one statement in an immediate (write-locked) transaction."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            cur = self.conn.execute(sql, params)
+            self.conn.execute('COMMIT')
+            return cur
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def enqueue(self, files, batch_size=BATCH_SIZE):
+        """Adds batches of files not queued before; returns the number of new batches."""
+        names = {os.path.basename(f): f for f in files}
+        known = {row['name'] for row in self.conn.execute('SELECT name FROM files')}
+        new = [names[n] for n in sorted(names) if n not in known]
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for start in range(0, len(new), batch_size):
+                batch = new[start:start + batch_size]
+                cur = self.conn.execute("INSERT INTO batches (files, state) VALUES (?, 'pending')",
+                                        (json.dumps(batch),))
+                self.conn.executemany('INSERT INTO files VALUES (?, ?)',
+                                      [(os.path.basename(f), cur.lastrowid) for f in batch])
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return -(-len(new) // batch_size)
+
+    def register(self, worker_id):
+        self._write('INSERT OR REPLACE INTO workers (id, host, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?)',
+                    (worker_id, socket.gethostname(), os.getpid(), time.time(), time.time()))
+
+    def claim(self, worker_id, lease=LEASE_SECONDS):
+        """Leases the oldest pending (or expired) batch; returns (id, files) or None when nothing is left."""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A batch whose workers keep dying (e.g. out of memory) is not handed out forever
+            self.conn.execute("""
+                UPDATE batches SET state = 'failed', error = 'lease expired ' || attempts || ' times'
+                WHERE state = 'leased' AND lease_until < ? AND attempts >= ?
+            """, (now, MAX_ATTEMPTS))
+            row = self.conn.execute("""
+                SELECT id, files FROM batches
+                WHERE (state = 'pending') OR (state = 'leased' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+            """, (now,)).fetchone()
+            if row is not None:
+                self.conn.execute("""
+                    UPDATE batches SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1,
+                                       started = ?, error = NULL
+                    WHERE id = ?
+                """, (worker_id, now + lease, now, row['id']))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return None if row is None else (row['id'], json.loads(row['files']))
+
+    def heartbeat(self, worker_id, batch_id, lease=LEASE_SECONDS):
+        """Extends the lease; False if the batch was reclaimed by someone else."""
+        now = time.time()
+        self._write('UPDATE workers SET heartbeat = ? WHERE id = ?', (now, worker_id))
+        cur = self._write("UPDATE batches SET lease_until = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                          (now + lease, batch_id, worker_id))
+        return cur.rowcount == 1
+
+    def complete(self, worker_id, batch_id):
+        """Marks the batch done if this worker still holds it; False means the result must be discarded."""
+        now = time.time()
+        cur = self._write("""
+            UPDATE batches SET state = 'done', finished = ?, seconds = ? - started
+            WHERE id = ? AND owner = ? AND state = 'leased'
+        """, (now, now, batch_id, worker_id))
+        if cur.rowcount == 1:
+            self._write('UPDATE workers SET batches = batches + 1 WHERE id = ?', (worker_id,))
+        return cur.rowcount == 1
+
+    def fail(self, worker_id, batch_id, error, max_attempts=MAX_ATTEMPTS):
+        self._write("""
+            UPDATE batches SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                               owner = NULL, error = ?
+            WHERE id = ? AND owner = ?
+        """, (max_attempts, error, batch_id, worker_id))
+
+    def counts(self):
+        now = time.time()
+        rows = self.conn.execute("""
+            SELECT CASE WHEN state = 'leased' AND lease_until < ? THEN 'expired' ELSE state END AS state,
+                   COUNT(*) AS n FROM batches GROUP BY 1
+        """, (now,)).fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+    def done_batches(self):
+        return self.conn.execute("SELECT id, owner, files FROM batches WHERE state = 'done' ORDER BY id").fetchall()
+
+    def workers(self):
+        return self.conn.execute('SELECT * FROM workers ORDER BY started').fetchall()
+
+
+def shard_path(worker_id, batch_id, shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, worker_id, f"{batch_id:06d}.parquet")
+
+
+def process_batch(files, write_parts=True):
+    """
+    Runs process_file over a batch in date order and returns per-day additive sums.
+    Duplicate suppression uses a fresh rolling window per batch.
+    """
+    rolling = dedup.RollingFilter() if pg.DEDUP else None
+    daily = []
+    for file_path in sorted(files):
+        file_path, sums, sig, theme_df, entity_df = pg.process_file(file_path)
+        if write_parts and theme_df is not None:
+            theme_matrix.write_part(theme_df, file_path)
+        if write_parts and entity_df is not None:
+            entity_index.write_part(entity_df, file_path)
+        if sums is None:
+            continue
+        if sig is not None:
+            dup = rolling.check(sig)
+            if dup.any():
+                dups = sig[dup]
+                sums = pg.remove_rows(sums, dups['DATE'].to_numpy(dtype=str), dups['tone'].to_numpy(),
+                                      dups['polarity'].to_numpy())
+        daily.append(sums)
+    if not daily:
+        return pd.DataFrame(columns=['DATE', *SUMS])
+    out = pd.concat(daily).groupby(level=0).sum()
+    out.index.name = 'DATE'
+    return out.reset_index()
+
+
+def run_worker(queue_path=QUEUE_PATH, shard_dir=SHARD_DIR, worker_id=None, lease=LEASE_SECONDS,
+               heartbeat_every=HEARTBEAT_SECONDS, write_parts=True, verbose=True):
+    """Claims batches until the queue is empty; returns the number of batches completed."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(queue_path)
+    queue.register(worker_id)
+    completed = 0
+    while True:
+        claim = queue.claim(worker_id, lease)
+        if claim is None:
+            break
+        batch_id, files = claim
+
+        # Heartbeats from a side thread (own connection) while the batch is processed
+        stop, lost = threading.Event(), threading.Event()
+
+        def beat():
+            hb = WorkQueue(queue_path)
+            while not stop.wait(min(heartbeat_every, lease / 3)):
+                if not hb.heartbeat(worker_id, batch_id, lease):
+                    lost.set()
+                    break
+            hb.close()
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        start = time.perf_counter()
+        try:
+            sums = process_batch(files, write_parts)
+            stop.set()
+            beater.join()
+            if lost.is_set():
+                print(f"[{worker_id}] lost lease on batch {batch_id}; discarding result")
+                continue
+            path = shard_path(worker_id, batch_id, shard_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sums.to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+            if queue.complete(worker_id, batch_id):
+                completed += 1
+                if verbose:
+                    print(f"[{worker_id}] batch {batch_id}: {len(files)} files in {time.perf_counter() - start:.1f}s")
+            else:
+                os.remove(path)
+                print(f"[{worker_id}] batch {batch_id} was reclaimed; discarding result")
+        except Exception:
+            stop.set()
+            beater.join()
+            queue.fail(worker_id, batch_id, traceback.format_exc(limit=3))
+            print(f"[{worker_id}] batch {batch_id} failed:\n{traceback.format_exc(limit=3)}")
+    queue.close()
+    return completed
+
+
+def reduce_shards(queue_path=QUEUE_PATH, shard_dir=SHARD_DIR, output_file=pg.OUTPUT_FILE,
+                  log_file=pg.LOG_FILE, compact=True):
+    """Merges the accepted shard of every done batch into the daily signals file."""
+    queue = WorkQueue(queue_path)
+    counts = queue.counts()
+    unfinished = {k: v for k, v in counts.items() if k not in ('done', 'failed')}
+    if unfinished:
+        print(f"Warning: queue not drained ({unfinished}); reducing the finished batches only")
+    batches = queue.done_batches()
+    queue.close()
+    if not batches:
+        print("No finished batches to reduce.")
+        return None
+
+    parts = [pd.read_parquet(shard_path(row['owner'], row['id'], shard_dir)) for row in batches]
+    sums = pd.concat(parts).astype({'DATE': str}).groupby('DATE')[SUMS].sum().sort_index()
+    daily = pg.daily_signals(sums)
+
+    # Days already in the output (e.g. from earlier incremental runs) are replaced
+    if os.path.exists(output_file):
+        pg.upsert_daily(daily, output_file)
+    else:
+        daily.to_csv(output_file, index=False)
+    if pg.DEDUP:
+        stats = sums[['records', 'duplicates']].astype(np.int64).reset_index()
+        stats.columns = ['Date', 'Records', 'Duplicates']
+        header = not os.path.exists(dedup.DEDUP_STATS_PATH)
+        stats.to_csv(dedup.DEDUP_STATS_PATH, mode='a', header=header, index=False)
+
+    processed = set()
+    if os.path.exists(log_file):
+        with open(log_file) as f:
+            processed = set(f.read().splitlines())
+    with open(log_file, 'a') as log:
+        for row in batches:
+            for file in json.loads(row['files']):
+                if os.path.basename(file) not in processed:
+                    log.write(os.path.basename(file) + "\n")
+
+    print(f"Reduced {len(batches)} batches -> {output_file}: {len(daily)} days")
+    if compact:
+        if pg.THEME_MATRIX and os.path.isdir(theme_matrix.THEME_PARTS_DIR):
+            theme_matrix.compact()
+        if pg.ENTITY_INDEX and os.path.isdir(entity_index.ENTITY_PARTS_DIR):
+            entity_index.compact()
+    return daily
+
+
+def print_status(queue_path=QUEUE_PATH):
+    queue = WorkQueue(queue_path)
+    counts = queue.counts()
+    total = sum(counts.values())
+    print(f"Batches: {total} " + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    now = time.time()
+    for row in queue.workers():
+        age = now - row['heartbeat']
+        print(f"  {row['id']:<28} {row['host']:<16} batches={row['batches']:<5} last heartbeat {age:6.0f}s ago")
+    failed = queue.conn.execute("SELECT id, error FROM batches WHERE state = 'failed'").fetchall()
+    for row in failed:
+        print(f"  failed batch {row['id']}: {row['error'].strip().splitlines()[-1]}")
+    queue.close()
+
+
+def bench(files, worker_counts, batch_size):
+    """Runs the whole queue with 1..N local worker processes each and reports throughput."""
+    print(f"Benchmark: {len(files)} files, batch size {batch_size}, workers {worker_counts}")
+    results = []
+    for n in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_path = os.path.join(tmp, 'queue.db')
+            queue = WorkQueue(queue_path)
+            queue.enqueue(files, batch_size)
+            queue.close()
+            start = time.perf_counter()
+            procs = [subprocess.Popen([sys.executable, __file__, '--queue', queue_path,
+                                       '--shards', os.path.join(tmp, 'shards'), 'worker', '--quiet', '--no-parts'])
+                     for _ in range(n)]
+            for p in procs:
+                p.wait()
+            seconds = time.perf_counter() - start
+            queue = WorkQueue(queue_path)
+            done = queue.counts().get('done', 0)
+            queue.close()
+        results.append({'workers': n, 'seconds': seconds, 'files_per_s': len(files) / seconds, 'batches_done': done})
+
+    base = results[0]['files_per_s']
+    print(f"\n{'Workers':>8} {'Seconds':>9} {'Files/s':>9} {'Speedup':>8} {'Efficiency':>11}")
+    for r in results:
+        speedup = r['files_per_s'] / base
+        print(f"{r['workers']:>8} {r['seconds']:>9.2f} {r['files_per_s']:>9.2f} {speedup:>7.2f}x "
+              f"{speedup / r['workers'] * results[0]['workers']:>10.0%}")
+    print(f"(CPU cores on this machine: {os.cpu_count()})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-node GKG backfill through a shared lease queue')
+    parser.add_argument('--queue', default=QUEUE_PATH, help=f'Queue database on shared storage (default: {QUEUE_PATH})')
+    parser.add_argument('--shards', default=SHARD_DIR, help=f'Shard directory (default: {SHARD_DIR})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init = commands.add_parser('init', help='Queue GKG files that are not yet processed')
+    init.add_argument('-d', '--data-dir', default=pg.INPUT_DIR)
+    init.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    worker = commands.add_parser('worker', help='Claim and process batches until the queue is empty')
+    worker.add_argument('--id', default=None, help='Worker id (default: <host>-<pid>)')
+    worker.add_argument('--lease', type=float, default=LEASE_SECONDS)
+    worker.add_argument('--quiet', action='store_true')
+    worker.add_argument('--no-parts', action='store_true', help='Skip theme/entity parts (used by bench)')
+    commands.add_parser('status', help='Queue and worker status')
+    red = commands.add_parser('reduce', help='Merge shards into the daily signals')
+    red.add_argument('--no-compact', action='store_true', help='Skip theme/entity compaction')
+    ben = commands.add_parser('bench', help='Local scaling benchmark on a temporary queue')
+    ben.add_argument('-d', '--data-dir', default=pg.INPUT_DIR)
+    ben.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    ben.add_argument('--batch-size', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        processed = set()
+        if os.path.exists(pg.LOG_FILE):
+            with open(pg.LOG_FILE) as f:
+                processed = set(f.read().splitlines())
+        files = [f for f in sorted(glob.glob(os.path.join(args.data_dir, '*.gkg.csv')))
+                 if os.path.basename(f) not in processed]
+        queue = WorkQueue(args.queue)
+        n = queue.enqueue(files, args.batch_size)
+        print(f"Queued {n} new batches ({len(files)} unprocessed files considered) -> {args.queue}")
+        queue.close()
+    elif args.command == 'worker':
+        n = run_worker(args.queue, args.shards, args.id, args.lease, write_parts=not args.no_parts,
+                       verbose=not args.quiet)
+        if not args.quiet:
+            print(f"Queue empty; completed {n} batches")
+    elif args.command == 'status':
+        print_status(args.queue)
+    elif args.command == 'reduce':
+        reduce_shards(args.queue, args.shards, compact=not args.no_compact)
+    else:
+        files = sorted(glob.glob(os.path.join(args.data_dir, '*.gkg.csv')))
+        bench(files, args.workers, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
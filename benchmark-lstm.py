@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+LSTM Training Mode Benchmark
+
+Compares total wall time of the per-ticker LSTM loop (16 small models: base +
+sentiment for each ticker) against the batched grouped-weight mode that trains
+all tickers' models in one job, and reports per-ticker accuracy for both.
+
+Usage:
+    python benchmark-lstm.py                      # All tickers in DATA_PATH
+    python benchmark-lstm.py --tickers SPX NDX    # Subset of tickers
+    python benchmark-lstm.py --epochs 5           # Quick run
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+import lstm_config
+import modelling
+
+
+def detect_tickers():
+    columns = pd.read_csv(modelling.DATA_PATH, nrows=0).columns
+    return sorted(c.replace('_Open', '') for c in columns if '_Open' in c)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-ticker vs batched LSTM training')
+    parser.add_argument('--tickers', nargs='+', help='Tickers to include (default: all)')
+    parser.add_argument('--epochs', type=int, default=lstm_config.LSTM_MAX_EPOCHS,
+                        help=f'Max epochs per model (default: {lstm_config.LSTM_MAX_EPOCHS})')
+    args = parser.parse_args()
+
+    tickers = args.tickers or detect_tickers()
+    base_feats, sent_feats = modelling.get_feature_sets()
+    feature_sets = {'base': base_feats, 'sent': base_feats + sent_feats}
+    splits = {t: modelling.prepare_ticker_data(t) for t in tickers}
+
+    # Per-ticker loop (current default)
+    per_ticker = {}
+    start = time.perf_counter()
+    for ticker, (train_df, test_df) in splits.items():
+        for key, feats in feature_sets.items():
+            modelling.set_seeds()
+            preds, _, _ = modelling.train_lstm(
+                train_df[feats], train_df['Target'], test_df[feats], test_df['Target'],
+                input_dim=len(feats), epochs=args.epochs, verbose=False
+            )
+            per_ticker[(ticker, key)] = preds
+    per_ticker_time = time.perf_counter() - start
+
+    # Batched grouped-weight mode
+    batched = {}
+    start = time.perf_counter()
+    for key, feats in feature_sets.items():
+        modelling.set_seeds()
+        datasets = {
+            t: (train_df[feats], train_df['Target'], test_df[feats], test_df['Target'])
+            for t, (train_df, test_df) in splits.items()
+        }
+        results, _ = modelling.train_lstm_multi(datasets, input_dim=len(feats), epochs=args.epochs, verbose=False)
+        for ticker, (preds, _) in results.items():
+            batched[(ticker, key)] = preds
+    batched_time = time.perf_counter() - start
+
+    rows = []
+    for (ticker, key), preds in per_ticker.items():
+        y_true = splits[ticker][1]['Target'].iloc[modelling.SEQ_LEN:].values
+        rows.append({
+            'Ticker': ticker, 'Model': key,
+            'Acc_PerTicker': accuracy_score(y_true, preds),
+            'Acc_Batched': accuracy_score(y_true, batched[(ticker, key)]),
+        })
+
+    print("=" * 70)
+    print("LSTM Training Benchmark")
+    print("=" * 70)
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.2%}"))
+    print("-" * 70)
+    print(f"Models trained:     {len(per_ticker)}")
+    print(f"Per-ticker loop:    {per_ticker_time:.2f}s")
+    print(f"Batched (grouped):  {batched_time:.2f}s")
+    print(f"Speedup:            {per_ticker_time / max(batched_time, 1e-9):.2f}x")
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
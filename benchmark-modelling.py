@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Modelling Stage Benchmark Suite
+
+asv-style cases for the modelling pipeline, each run in a fresh interpreter
+on fixed synthetic datasets (seeded; 1, 8 and 100 tickers x 3k and 30k days)
+and optionally the real DATA_PATH file:
+
+    load          load_and_process_data for one ticker (CSV parse scales with the file)
+    features      create_features for every ticker
+    train_rf      calibrated RF for one ticker (base + sentiment features)
+    train_lstm    LSTM for one ticker, fixed BENCH_LSTM_EPOCHS epochs, no early stopping
+    train_arima   BENCH_ARIMA_STEPS walk-forward ARIMA refits for one ticker
+    backtest      backtest_strategy + calculate_trading_metrics for every ticker
+    experiment    run_experiment (RF only, no plots, no saved models) for every ticker
+
+Each case records wall time, CPU time (all threads) and memory (peak RSS during
+the timed runs minus the RSS after setup; on Linux the kernel's high-water mark
+is reset after setup so setup peaks are not counted). Results go to results/benchmarks/<time>.json; with a
+baseline, any case slower (best-of-N wall time, cases over 50 ms) or larger
+(memory) than baseline * (1 + threshold) fails the run with exit code 1.
+
+Usage:
+    python benchmark-modelling.py                         # Quick suite (1 and 8 tickers x 3k days + real data)
+    python benchmark-modelling.py --suite full            # All sizes, including 100 tickers and 30k days
+    python benchmark-modelling.py --cases train_rf backtest
+    python benchmark-modelling.py --save-baseline         # Record results/benchmarks/baseline.json
+    python benchmark-modelling.py --threshold 0.25        # Compare to the baseline with a 25% tolerance
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import current_rss, peak_rss
+
+BENCH_DIR = os.path.join('results', 'benchmarks')
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+SEED = 42
+BENCH_LSTM_EPOCHS = 2
+BENCH_ARIMA_STEPS = 5
+
+# Datasets as (tickers, days); 'real' is modelling.DATA_PATH
+SUITES = {
+    'quick': [(1, 3000), (8, 3000), 'real'],
+    'full': [(1, 3000), (8, 3000), (100, 3000), (1, 30000), (8, 30000), (100, 30000), 'real'],
+}
+
+
+# === Synthetic data ===
+
+def synthetic_path(n_tickers, n_days):
+    return os.path.join(DATA_DIR, f"synthetic_{n_tickers}x{n_days}.csv")
+
+
+def make_synthetic(n_tickers, n_days, seed=SEED):
+    """
+    Writes (once) a wide CSV in the merged_stooq_gdelt.csv layout: Date,
+    {ticker}_Open/_Close/_Volume per ticker and the shared News_* columns.
+    Prices are geometric random walks; values depend only on the seed.
+    """
+    path = synthetic_path(n_tickers, n_days)
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('1990-01-01', periods=n_days)
+    columns = {'Date': dates.strftime('%Y-%m-%d')}
+    for i in range(n_tickers):
+        ticker = f"T{i:03d}"
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, n_days)))
+        columns[f"{ticker}_Open"] = close * (1 + rng.normal(0, 0.003, n_days))
+        columns[f"{ticker}_Close"] = close
+        columns[f"{ticker}_Volume"] = rng.lognormal(15, 0.4, n_days).round()
+    columns['News_Sentiment'] = rng.normal(-2, 0.6, n_days)
+    columns['News_Disagreement'] = rng.normal(3.5, 0.4, n_days)
+    columns['News_Volatility'] = rng.normal(6.5, 0.8, n_days)
+    columns['News_Volume'] = rng.poisson(10000, n_days)
+    tmp = f"{path}.tmp"
+    pd.DataFrame(columns).to_csv(tmp, index=False, float_format='%.6f')
+    os.replace(tmp, path)
+    return path
+
+
+def dataset_label(dataset):
+    return 'real' if dataset == 'real' else f"{dataset[0]}x{dataset[1]}"
+
+
+# === Memory ===
+
+def reset_peak_rss():
+    """Resets the kernel's RSS high-water mark (Linux); returns False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def high_water_rss():
+    """Peak RSS since the last reset_peak_rss() (VmHWM), else since process start."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return peak_rss()
+
+
+# === Cases (run inside the child process) ===
+# Each takes the configured modelling module and returns the function to time.
+
+def detect_tickers(modelling):
+    columns = pd.read_csv(modelling.DATA_PATH, nrows=0).columns
+    return sorted(c.replace('_Open', '') for c in columns if '_Open' in c)
+
+
+def first_ticker_split(modelling):
+    return modelling.prepare_ticker_data(detect_tickers(modelling)[0])
+
+
+def case_load(modelling):
+    ticker = detect_tickers(modelling)[0]
+    return lambda: modelling.load_and_process_data(modelling.DATA_PATH, ticker)
+
+
+def case_features(modelling):
+    frames = [modelling.load_and_process_data(modelling.DATA_PATH, t) for t in detect_tickers(modelling)]
+    return lambda: [modelling.create_features(df) for df in frames]
+
+
+def case_train_rf(modelling):
+    train_df, test_df = first_ticker_split(modelling)
+    base_feats, sent_feats = modelling.get_feature_sets()
+    feats = base_feats + sent_feats
+    X_train = modelling.build_feature_matrix(train_df, feats)
+    X_test = modelling.build_feature_matrix(test_df, feats)
+
+    def run():
+        modelling.set_seeds(torch_seed=False)
+        modelling.train_rf(X_train[:, :len(base_feats)], train_df['Target'],
+                           X_test[:, :len(base_feats)], test_df['Target'], calibrate=True)
+        modelling.train_rf(X_train, train_df['Target'], X_test, test_df['Target'], calibrate=True)
+    return run
+
+
+def case_train_lstm(modelling):
+    from lstm_models import train_lstm
+
+    train_df, test_df = first_ticker_split(modelling)
+    base_feats, sent_feats = modelling.get_feature_sets()
+    feats = base_feats + sent_feats
+
+    def run():
+        modelling.set_seeds()
+        train_lstm(train_df[feats], train_df['Target'], test_df[feats], test_df['Target'],
+                   input_dim=len(feats), epochs=BENCH_LSTM_EPOCHS, patience=0, verbose=False)
+    return run
+
+
+def case_train_arima(modelling):
+    train_df, test_df = first_ticker_split(modelling)
+    return lambda: modelling.train_arima(train_df['Close'], test_df['Close'].iloc[:BENCH_ARIMA_STEPS])
+
+
+def case_backtest(modelling):
+    rng = np.random.default_rng(SEED)
+    splits = [modelling.prepare_ticker_data(t)[1] for t in detect_tickers(modelling)]
+    signals = [(df['Return'].values, rng.integers(0, 2, len(df))) for df in splits]
+
+    def run():
+        for returns, preds in signals:
+            equity, _ = modelling.backtest_strategy(returns, preds, 'bench')
+            modelling.calculate_trading_metrics(equity)
+    return run
+
+
+def case_experiment(modelling):
+    return lambda: modelling.run_experiment(models=['rf'], plots=False, save_models=False)
+
+
+CASES = {
+    'load': case_load,
+    'features': case_features,
+    'train_rf': case_train_rf,
+    'train_lstm': case_train_lstm,
+    'train_arima': case_train_arima,
+    'backtest': case_backtest,
+    'experiment': case_experiment,
+}
+
+
+def run_case(case, data_path, repeat):
+    """Child process: sets up one case, times it `repeat` times and prints a JSON result."""
+    import modelling
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    modelling.DATA_PATH = data_path
+    modelling.RESULTS_DIR = workdir
+    modelling.USE_FEATURE_STORE = False  # Measure computation, not cache hits
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn = CASES[case](modelling)
+        rss_setup = current_rss()
+        reset_peak_rss()
+        walls, cpus = [], []
+        for _ in range(repeat):
+            wall, cpu = time.perf_counter(), time.process_time()
+            fn()
+            walls.append(time.perf_counter() - wall)
+            cpus.append(time.process_time() - cpu)
+    print(json.dumps({
+        'wall_seconds': walls,
+        'cpu_seconds': cpus,
+        'memory_mb': max(high_water_rss() - rss_setup, 0) / 2**20,
+        'peak_rss_mb': peak_rss() / 2**20,
+    }))
+
+
+# === Parent ===
+
+def benchmark(case, data_path, repeat):
+    """Runs one case on one dataset file in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, __file__, '--run-case', case, '--data', data_path, '--repeat', str(repeat)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{case} on {data_path} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['min_wall'] = min(result['wall_seconds'])
+    result['median_wall'] = statistics.median(result['wall_seconds'])
+    result['median_cpu'] = statistics.median(result['cpu_seconds'])
+    return result
+
+
+def check_regressions(results, baseline, threshold):
+    """Cases whose best wall time or memory exceed the baseline by more than threshold."""
+    failures = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('min_wall', 'memory_mb'):
+            floor = 0.05 if metric == 'min_wall' else 5.0  # Ignore noise on tiny values
+            if result[metric] > max(base[metric], floor) * (1 + threshold):
+                failures.append(f"{key} {metric}: {base[metric]:.3f} -> {result[metric]:.3f} "
+                                f"({result[metric] / max(base[metric], 1e-9) - 1:+.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the modelling pipeline stages')
+    parser.add_argument('--suite', choices=list(SUITES), default='quick', help='Dataset sizes (default: quick)')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES),
+                        help='Cases to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (default: 3)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f'Baseline results (default: {BASELINE_PATH})')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown / memory growth vs baseline (default: 0.2 = 20%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args.run_case, args.data, args.repeat)
+        return
+
+    import modelling
+    datasets = [d for d in SUITES[args.suite] if d != 'real' or os.path.exists(modelling.DATA_PATH)]
+
+    results = {}
+    print("=" * 78)
+    print(f"Modelling Benchmark ({args.suite} suite, {args.repeat} runs per case)")
+    print("=" * 78)
+    print(f"{'Case':<14}{'Dataset':<12}{'Wall s':>10}{'CPU s':>10}{'Mem MB':>10}{'Peak MB':>10}")
+    for dataset in datasets:
+        data_path = modelling.DATA_PATH if dataset == 'real' else make_synthetic(*dataset)
+        for case in args.cases:
+            key = f"{case}@{dataset_label(dataset)}"
+            result = benchmark(case, data_path, args.repeat)
+            results[key] = result
+            print(f"{case:<14}{dataset_label(dataset):<12}{result['median_wall']:>10.3f}"
+                  f"{result['median_cpu']:>10.3f}{result['memory_mb']:>10.1f}{result['peak_rss_mb']:>10.1f}")
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("-" * 78)
+    print(f"Saved {path}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (use --save-baseline)")
+        return
+    with open(args.baseline) as f:
+        failures = check_regressions(results, json.load(f), args.threshold)
+    if failures:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} vs {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Startup / Import Time Benchmark
+
+Runs each entry point in a fresh interpreter with `python -X importtime` and
+reports wall time, total import time, the slowest packages imported and which
+heavy libraries (torch, statsmodels, matplotlib) were loaded. Entry points that
+should stay light fail the run (exit code 1) if they import a heavy library.
+
+Usage:
+    python benchmark-startup.py                  # All scenarios, 5 runs each
+    python benchmark-startup.py --repeat 10
+    python benchmark-startup.py --top 10         # Show more slow packages
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ['torch', 'statsmodels', 'matplotlib']
+
+# name -> (interpreter arguments, heavy modules allowed)
+SCENARIOS = {
+    'import modelling': (['-c', 'import modelling'], []),
+    'modelling.py --help': (['modelling.py', '--help'], []),
+    'import serving': (['-c', 'import serving'], []),
+    'import model_registry': (['-c', 'import model_registry'], []),
+    'import lstm_models': (['-c', 'import lstm_models'], ['torch']),
+}
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def run_scenario(args, repeat):
+    """Runs one scenario `repeat` times; returns (wall times, parsed importtime of the last run)."""
+    times, rows = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', *args],
+                              capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+        rows = parse_importtime(proc.stderr)
+    return times, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark interpreter startup and import time')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario (default: 5)')
+    parser.add_argument('--top', type=int, default=5, help='Slowest packages to list (default: 5)')
+    args = parser.parse_args()
+
+    failures = []
+    print("=" * 70)
+    print("Startup Benchmark (python -X importtime)")
+    print("=" * 70)
+    for name, (cmd, allowed) in SCENARIOS.items():
+        times, rows = run_scenario(cmd, args.repeat)
+        total_import = sum(r[2] for r in rows if r[3] == 0) / 1e6
+        # Slowest packages, excluding this repo's own modules (which contain them)
+        packages = sorted((r for r in rows if '.' not in r[0] and not os.path.exists(f"{r[0]}.py")),
+                          key=lambda r: r[2], reverse=True)
+        loaded = {r[0] for r in rows}
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        unexpected = [m for m in heavy if m not in allowed]
+
+        print(f"\n{name}")
+        print(f"  Wall time:    median {statistics.median(times):.3f}s, min {min(times):.3f}s ({args.repeat} runs)")
+        print(f"  Import time:  {total_import:.3f}s")
+        print(f"  Heavy libs:   {', '.join(heavy) or 'none'}")
+        for module, _, cumulative_us, _ in packages[:args.top]:
+            print(f"    {cumulative_us / 1e6:7.3f}s  {module}")
+        if unexpected:
+            failures.append(f"{name} imported {', '.join(unexpected)}")
+
+    print("-" * 70)
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: light entry points do not import torch, statsmodels or matplotlib")
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,7 @@ Usage:
     python collect-gdelt.py --merge-all          # Merge all CSV files by type
     python collect-gdelt.py --info                # Show dataset information
     python collect-gdelt.py --export-parquet      # Export merged data to Parquet format
+    python collect-gdelt.py --merge-gkg --trace   # Also write a per-stage JSON trace
 """
 
 import pandas as pd
@@ -21,6 +22,12 @@ import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import threading
+import numpy as np
+import dedup
+import entity_index
+import mention_join
+from instrumentation import add_trace_arguments, tracer
+from theme_matrix import MARKET_THEMES
 
 # GDELT column definitions based on official documentation
 # These columns were determined by examining the actual data structure
@@ -72,12 +79,15 @@ MENTIONS_COLUMNS = [
 class GDELTProcessor:
     """Process and merge GDELT data files"""
     
-    def __init__(self, data_dir='.', max_workers=8, last_n=None):
+    def __init__(self, data_dir='.', max_workers=8, last_n=None, build_entity_index=True,
+                 suppress_duplicates=True):
         self.data_dir = Path(data_dir)
         self.export_files = sorted(glob.glob(str(self.data_dir / '*.export.CSV')))
         self.gkg_files = sorted(glob.glob(str(self.data_dir / '*.gkg.csv')))
         self.mentions_files = sorted(glob.glob(str(self.data_dir / '*.mentions.CSV')))
         self.max_workers = max_workers
+        self.build_entity_index = build_entity_index  # Organization index parts from every GKG file read
+        self.suppress_duplicates = suppress_duplicates  # Near-duplicate (syndicated copy) removal in merge_gkg_files
         
         # Limit to last N files if specified
         if last_n is not None and last_n > 0:
@@ -86,14 +96,7 @@ class GDELTProcessor:
             self.mentions_files = self.mentions_files[-last_n:]
         
         # Market-related themes to filter
-        self.market_themes = {
-            'ECON_STOCKMARKET',
-            'ECON_FINANCIAL_MARKETS',
-            'ECON_DEBT',
-            'ECON_CURRENCY_EXCHANGE_RATE',
-            'ECON_INFLATION',
-            'CRISISLEX_CRISISLEXREC'
-        }
+        self.market_themes = set(MARKET_THEMES)
         
         # Thread-safe counter
         self.stats_lock = threading.Lock()
@@ -147,6 +150,7 @@ class GDELTProcessor:
         
         print("\n" + "=" * 70)
         
+    @tracer.timed()
     def merge_export_files(self, output_file='merged_export.csv'):
         """Merge all export (events) files into a single CSV"""
         if not self.export_files:
@@ -211,6 +215,7 @@ class GDELTProcessor:
         themes_str = str(themes_str).upper()
         return any(theme in themes_str for theme in self.market_themes)
     
+    @tracer.timed()
     def read_and_filter_gkg_file(self, file):
         """
         Read a single GKG file, extract target columns, and filter by market themes
@@ -226,30 +231,39 @@ class GDELTProcessor:
             # Detect version
             version = self.detect_gkg_version(file)
             
+            # Column index -> name. Columns are read by index and renamed afterwards, because
+            # pandas applies `names` to integer usecols in file order, not in the listed order
             if version == 'v1':
-                # GKG 1.0: DATE, SourceCommonName, Themes, Tone, Organizations
-                # Indices: 1, 3, 6, 10, 9
-                target_cols = [1, 3, 6, 10, 9]
-                col_names = ['DATE', 'SourceCommonName', 'Themes', 'Tone', 'Organizations']
+                # GKG 1.0: DATE, SourceCommonName, DocumentIdentifier, Themes, Organizations, Tone
+                gkg_cols = {1: 'DATE', 3: 'SourceCommonName', 4: 'DocumentIdentifier', 6: 'Themes',
+                            9: 'Organizations', 10: 'Tone'}
             else:
-                # GKG 2.0: DATE, SourceCommonName, V2Themes, V2Tone, V2Organizations
-                # Indices: 1, 3, 8, 15, 14
-                target_cols = [1, 3, 8, 15, 14]
-                col_names = ['DATE', 'SourceCommonName', 'V2Themes', 'V2Tone', 'V2Organizations']
+                # GKG 2.0: DATE, SourceCommonName, DocumentIdentifier, V2Themes, V2Organizations, V2Tone
+                gkg_cols = {1: 'DATE', 3: 'SourceCommonName', 4: 'DocumentIdentifier', 8: 'V2Themes',
+                            14: 'V2Organizations', 15: 'V2Tone'}
             
             # Read only the columns we need
             df = pd.read_csv(
                 file, 
                 sep='\t', 
                 header=None, 
-                usecols=target_cols,
-                names=col_names,
+                usecols=list(gkg_cols),
                 low_memory=False, 
                 encoding='utf-8',
                 on_bad_lines='skip'
-            )
+            ).rename(columns=gkg_cols)
             
             rows_before = len(df)
+            tracer.count('bytes_read', os.path.getsize(file))
+            tracer.count('rows_read', rows_before)
+            
+            # Organization sentiment over all rows, before the market-theme filter
+            if self.build_entity_index:
+                orgs_col, tone_col = ('Organizations', 'Tone') if version == 'v1' else ('V2Organizations', 'V2Tone')
+                tone = pd.to_numeric(df[tone_col].astype(str).str.split(',', n=1).str[0], errors='coerce')
+                entity_df = entity_index.aggregate_entities(df, orgs_col, tone)
+                if entity_df is not None:
+                    entity_index.write_part(entity_df, file)
             
             # Filter by market themes (handle both Themes and V2Themes)
             themes_col = 'Themes' if version == 'v1' else 'V2Themes'
@@ -264,6 +278,7 @@ class GDELTProcessor:
                 })
             
             rows_after = len(df)
+            tracer.count('rows_kept', rows_after)
             
             with self.stats_lock:
                 self.total_rows_read += rows_before
@@ -275,11 +290,37 @@ class GDELTProcessor:
             tqdm.write(f"  ✗ Error reading {Path(file).name}: {e}")
             return None
     
+    @tracer.timed()
+    def suppress_near_duplicates(self, df, stats_file='gkg_dedup_stats.csv'):
+        """
+        Drop repeated URLs and syndicated copies (see dedup.py), day by day in date
+        order so each day is also checked against the previous dedup.WINDOW_DAYS days.
+        Writes per-day duplicate counts to stats_file in the data directory.
+        """
+        df = df.reset_index(drop=True)
+        tone = pd.to_numeric(df['V2Tone'].astype(str).str.split(',', n=1).str[0], errors='coerce')
+        sig = dedup.signatures(df, ['V2Themes', 'V2Organizations'], 'DocumentIdentifier', tone)
+        
+        rolling = dedup.RollingFilter()
+        dup = np.zeros(len(df), dtype=bool)
+        for day, idx in sorted(sig.groupby('DATE').indices.items()):
+            day_sig = sig.iloc[idx]
+            dup[idx] = rolling.check(day_sig, dedup.mark_duplicates(day_sig))
+        
+        stats = dedup.daily_stats(sig['DATE'], dup)
+        stats.to_csv(self.data_dir / stats_file, index=False)
+        rates = stats['Duplicates'] / stats['Records']
+        print(f"Near-duplicates removed: {int(dup.sum()):,} ({dup.mean():.1%}; "
+              f"per day {rates.min():.1%}-{rates.max():.1%}, see {stats_file})")
+        tracer.count('rows_duplicate', int(dup.sum()))
+        return df[~dup]
+    
+    @tracer.timed()
     def merge_gkg_files(self, output_file='merged_gkg_filtered.csv'):
         """
         Merge all GKG files with parallel processing and market theme filtering
-        Only extracts columns: DATE, SourceCommonName, V2Themes, V2Tone, V2Organizations
-        Only keeps rows containing market-related themes
+        Only extracts columns: DATE, SourceCommonName, DocumentIdentifier, V2Themes, V2Tone, V2Organizations
+        Only keeps rows containing market-related themes, without near-duplicate copies
         """
         if not self.gkg_files:
             print("No GKG files found!")
@@ -288,7 +329,7 @@ class GDELTProcessor:
         print(f"\n{'='*70}")
         print(f"Merging {len(self.gkg_files)} GKG files (Optimized Mode)")
         print(f"{'='*70}")
-        print(f"Target Columns: DATE, SourceCommonName, V2Themes, V2Tone, V2Organizations")
+        print(f"Target Columns: DATE, SourceCommonName, DocumentIdentifier, V2Themes, V2Tone, V2Organizations")
         print(f"Filtering by themes: {', '.join(sorted(self.market_themes))}")
         print(f"Parallel Workers: {self.max_workers}")
         print(f"Note: Automatically handles both GKG 1.0 (2013-2015) and 2.0 (2015+) formats")
@@ -332,6 +373,8 @@ class GDELTProcessor:
             # Remove duplicates based on DATE and DocumentIdentifier (implicit in content)
             rows_before_dedup = len(merged_df)
             merged_df = merged_df.drop_duplicates()
+            if self.suppress_duplicates:
+                merged_df = self.suppress_near_duplicates(merged_df)
             rows_after_dedup = len(merged_df)
             
             print(f"\nTotal rows read: {self.total_rows_read:,}")
@@ -344,11 +387,15 @@ class GDELTProcessor:
             print(f"\n✓ Saved to: {output_path}")
             print(f"  File size: {output_path.stat().st_size / (1024*1024):.1f} MB")
             
+            if self.build_entity_index and os.path.isdir(entity_index.ENTITY_PARTS_DIR):
+                entity_index.compact()
+            
             return merged_df
         else:
             print("\n✗ No market-related data found in any files!")
             return None
     
+    @tracer.timed()
     def merge_mentions_files(self, output_file='merged_mentions.csv'):
         """Merge all mentions files into a single CSV"""
         if not self.mentions_files:
@@ -382,6 +429,17 @@ class GDELTProcessor:
         
         return None
     
+    @tracer.timed()
+    def join_mentions(self, rebuild_index=False):
+        """Mention- and confidence-weighted daily tone via a GLOBALEVENTID join (see mention_join.py)"""
+        if not self.mentions_files:
+            print("No mentions files found!")
+            return None
+
+        print(f"\nJoining {len(self.mentions_files)} mentions files to {len(self.export_files)} export files...")
+        mention_join.build_index(self.export_files, rebuild=rebuild_index)
+        return mention_join.join_mentions(self.mentions_files)
+
     def merge_all(self):
         """Merge all file types"""
         print("\n" + "=" * 70)
@@ -404,6 +462,7 @@ class GDELTProcessor:
             print(f"  • merged_mentions.csv - {len(mentions_df):,} mentions")
         print()
         
+    @tracer.timed()
     def export_to_parquet(self):
         """Export merged CSV files to Parquet format for better performance"""
         try:
@@ -451,6 +510,7 @@ Examples:
   python collect-gdelt.py --merge-export      Merge only export (events) files
   python collect-gdelt.py --merge-gkg         Merge only GKG files
   python collect-gdelt.py --merge-mentions    Merge only mentions files
+  python collect-gdelt.py --join-mentions     Mention-weighted daily tone (events x mentions join)
   python collect-gdelt.py --export-parquet    Export merged data to Parquet format
         """
     )
@@ -465,6 +525,8 @@ Examples:
                        help='Merge GKG files only')
     parser.add_argument('--merge-mentions', action='store_true',
                        help='Merge mentions files only')
+    parser.add_argument('--join-mentions', action='store_true',
+                       help='Join mentions to events and write mention-weighted daily tone')
     parser.add_argument('--export-parquet', action='store_true',
                        help='Export merged CSV files to Parquet format')
     parser.add_argument('-d', '--data-dir', type=str, default='.',
@@ -473,15 +535,23 @@ Examples:
                        help='Number of parallel workers for processing (default: 8)')
     parser.add_argument('--last', type=int, default=None,
                        help='Process only the last N files (useful for testing)')
+    parser.add_argument('--no-entity-index', action='store_true',
+                       help='Do not build the organization sentiment index while merging GKG files')
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='Keep near-duplicate (syndicated) GKG records when merging')
+    add_trace_arguments(parser)
     
     args = parser.parse_args()
+    tracer.configure(args.trace, args.profile)
     
     # If no arguments provided, show help
     if len(sys.argv) == 1:
         parser.print_help()
         sys.exit(0)
     
-    processor = GDELTProcessor(args.data_dir, max_workers=args.workers, last_n=args.last)
+    processor = GDELTProcessor(args.data_dir, max_workers=args.workers, last_n=args.last,
+                               build_entity_index=not args.no_entity_index,
+                               suppress_duplicates=not args.no_dedup)
     
     if args.info:
         processor.show_info()
@@ -495,6 +565,9 @@ Examples:
     elif args.merge_mentions:
         processor.merge_mentions_files()
     
+    if args.join_mentions:
+        processor.join_mentions()
+
     if args.export_parquet:
         processor.export_to_parquet()
 
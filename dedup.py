@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate GKG record suppression.
+
+Syndicated wire stories show up as many GKG records with different URLs and
+sources but the same themes, organizations and (nearly) the same tone.
+Counting each copy as an article inflates News_Volume and tilts the daily
+tone towards whatever the wires carried. A record is treated as a duplicate
+of an earlier record when either
+  * its DocumentIdentifier/SOURCEURL is the same (exact key), or
+  * the 64-bit SimHash of its theme + organization tokens is within
+    MAX_DISTANCE bits and its tone within TONE_TOLERANCE (records with fewer
+    than MIN_TOKENS tokens are only matched exactly).
+
+Candidate pairs come from LSH banding: the signature is split into BANDS
+bands, and two signatures within MAX_DISTANCE < BANDS bits share at least one
+band exactly. Each record is compared with the first record of each of its
+bands (not with every member), which keeps the whole pass vectorized and
+O(n) per file; a near-duplicate of a later bucket member only is missed.
+Cross-file/cross-day matches use RollingFilter, which holds the keys and
+signatures of the last WINDOW_DAYS days only. Its memory is bounded by the
+window, and it can be saved to disk, so resumable ingests keep their state.
+
+Usage:
+    import dedup
+    flt = dedup.RollingFilter.load()
+    sig = dedup.signatures(df, ['THEMES', 'ORGANIZATIONS'], 'SOURCEURLS', tone)
+    dup = flt.check(sig, dedup.mark_duplicates(sig))    # also remembers the records that are kept
+    flt.save()
+
+    python dedup.py stats        # Per-day duplicate rates (results/gdelt_dedup_stats.csv)
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEDUP_STATE_PATH = os.path.join('results', 'dedup_state.npz')
+DEDUP_STATS_PATH = os.path.join('results', 'gdelt_dedup_stats.csv')
+
+BANDS = 4               # 16-bit bands of the 64-bit SimHash
+MAX_DISTANCE = 3        # Max Hamming distance for a near-duplicate (must be < BANDS)
+TONE_TOLERANCE = 0.25   # Max |AvgTone difference| for a near-duplicate
+MIN_TOKENS = 5          # Records with fewer theme/org tokens are only matched on their URL
+WINDOW_DAYS = 3         # Days of signatures kept by RollingFilter
+
+BAND_BITS = 64 // BANDS
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(x):
+    """Set bits per element of a uint64 array."""
+    return _POPCOUNT[np.ascontiguousarray(x, dtype=np.uint64).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def simhash(positions, tokens, n):
+    """
+    64-bit SimHash per record from (record position, token) pairs, plus each
+    record's token count. Every distinct token is hashed once; bit votes are
+    summed per record with one reduceat per bit.
+    """
+    counts = np.bincount(positions, minlength=n)
+    sig = np.zeros(n, dtype=np.uint64)
+    if len(positions) == 0:
+        return sig, counts
+
+    codes, uniques = pd.factorize(tokens)
+    order = np.argsort(positions, kind='stable')
+    token_hash = pd.util.hash_array(np.asarray(uniques, dtype=object))[codes[order]]
+    starts = np.flatnonzero(counts)
+    offsets = np.concatenate([[0], np.cumsum(counts[starts])[:-1]])
+    for bit in range(64):
+        ones = ((token_hash >> np.uint64(bit)) & np.uint64(1)).astype(np.int32)
+        votes = np.add.reduceat(2 * ones - 1, offsets)
+        sig[starts] |= (votes > 0).astype(np.uint64) << np.uint64(bit)
+    return sig, counts
+
+
+def signatures(df, token_cols, key_col, tone):
+    """
+    Frame of (DATE, key, simhash, tokens, tone) used for matching.
+    token_cols: ';'-separated columns (V2 "token,offset" entries are reduced to the token);
+    key_col: DocumentIdentifier / SOURCEURLS (the first URL is used); tone: AvgTone per row.
+    """
+    # One split of the joined columns (",offset" suffixes removed first), flattened without explode()
+    text = df[token_cols[0]].fillna('')
+    for col in token_cols[1:]:
+        text = text + ';' + df[col].fillna('')
+    lists = text.str.replace(r',[^;]*', '', regex=True).str.split(';').to_numpy(dtype=object)
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    flat = np.fromiter((token for tokens in lists for token in tokens), dtype=object, count=int(lengths.sum()))
+    record = np.repeat(np.arange(len(lists)), lengths)
+    keep = flat != ''
+    pairs = pd.DataFrame({'record': record[keep], 'token': flat[keep]}).drop_duplicates()
+    sig, n_tokens = simhash(pairs['record'].to_numpy(), pairs['token'].to_numpy(), len(df))
+
+    urls = df[key_col].fillna('').str.split(';', n=1).str[0].str.lower().str.rstrip('/')
+    urls = urls.str.replace(r'^https?://(www\.)?', '', regex=True)
+    key = pd.util.hash_pandas_object(urls, index=False).to_numpy(np.uint64, copy=True)
+    key[(urls == '').to_numpy()] = 0  # Missing URLs never match
+    return pd.DataFrame({
+        'DATE': df['DATE'].astype(str).str[:8].to_numpy(),
+        'key': key,
+        'simhash': sig,
+        'tokens': n_tokens.astype(np.int32),
+        'tone': np.asarray(tone, dtype=np.float64),
+    }, index=df.index)
+
+
+def _bands(sig):
+    return [((sig >> np.uint64(BAND_BITS * b)) & np.uint64((1 << BAND_BITS) - 1)).astype(np.int64)
+            for b in range(BANDS)]
+
+
+def _near(sig, tone, ref_sig, ref_tone):
+    return (popcount(sig ^ ref_sig) <= MAX_DISTANCE) & (np.abs(tone - ref_tone) <= TONE_TOLERANCE)
+
+
+def mark_duplicates(sig):
+    """
+    Boolean mask of records duplicating an earlier record of the same frame: the
+    same URL key, or near the first record of one of its LSH band buckets. Only
+    the first member of each bucket is compared, so a record that is near a
+    later member of its buckets but not near any first member is kept.
+    """
+    dup = pd.Series(sig['key'].to_numpy()).duplicated().to_numpy() & (sig['key'].to_numpy() != 0)
+    eligible = sig['tokens'].to_numpy() >= MIN_TOKENS
+    if not eligible.any():
+        return dup
+    simh, tone = sig['simhash'].to_numpy()[eligible], sig['tone'].to_numpy()[eligible]
+    near = np.zeros(len(simh), dtype=bool)
+    position = np.arange(len(simh))
+    for band in _bands(simh):
+        first = pd.Series(position).groupby(band).transform('first').to_numpy()
+        near |= (first != position) & _near(simh, tone, simh[first], tone[first])
+    dup[eligible] |= near
+    return dup
+
+
+class RollingFilter:
+    """
+    URL keys and signatures of the last WINDOW_DAYS days. check() flags records
+    matching anything in the window and then remembers the ones that are not duplicates.
+    The window is one frame, updated in add(), so check() does not rebuild it.
+    """
+
+    COLUMNS = ['DATE', 'key', 'simhash', 'tokens', 'tone']
+
+    def __init__(self, window_days=WINDOW_DAYS):
+        self.window_days = window_days
+        self.window = pd.DataFrame({c: pd.Series(dtype=t) for c, t in
+                                    zip(self.COLUMNS, [str, np.uint64, np.uint64, np.int32, np.float64])})
+        self.days = set()
+
+    def check(self, sig, known=None, remember=True):
+        """Duplicate mask for sig; known: records already flagged (e.g. by mark_duplicates)."""
+        dup = np.zeros(len(sig), dtype=bool) if known is None else np.array(known, dtype=bool)
+        if len(self.window):
+            seen = self.window
+            keys = sig['key'].to_numpy()
+            dup |= np.isin(keys, seen['key'].to_numpy()) & (keys != 0)
+
+            eligible = sig['tokens'].to_numpy() >= MIN_TOKENS
+            seen = seen[seen['tokens'] >= MIN_TOKENS]
+            simh, tone = sig['simhash'].to_numpy(), sig['tone'].to_numpy()
+            for band, seen_band in zip(_bands(simh), _bands(seen['simhash'].to_numpy())):
+                lookup = pd.Index(seen_band)
+                first = ~lookup.duplicated()
+                lookup, ref_sig, ref_tone = lookup[first], seen['simhash'].to_numpy()[first], seen['tone'].to_numpy()[first]
+                pos = lookup.get_indexer(band)
+                hit = eligible & (pos >= 0)
+                dup[hit] |= _near(simh[hit], tone[hit], ref_sig[pos[hit]], ref_tone[pos[hit]])
+        if remember:
+            self.add(sig[~dup])
+        return dup
+
+    def add(self, sig):
+        """Appends records to the window and drops days older than the last window_days."""
+        if not len(sig):
+            return
+        rows = sig[self.COLUMNS].astype({'DATE': str, 'tokens': np.int32})
+        self.window = pd.concat([self.window, rows], ignore_index=True)
+        self.days.update(rows['DATE'].unique())
+        if len(self.days) > self.window_days:
+            first = sorted(self.days)[-self.window_days]
+            self.days = {day for day in self.days if day >= first}
+            self.window = self.window[self.window['DATE'] >= first].reset_index(drop=True)
+
+    def save(self, path=DEDUP_STATE_PATH):
+        if not len(self.window):
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(path, DATE=self.window['DATE'].to_numpy(dtype='U8'),
+                 **{c: self.window[c].to_numpy() for c in self.COLUMNS[1:]})
+
+    @classmethod
+    def load(cls, path=DEDUP_STATE_PATH, window_days=WINDOW_DAYS):
+        flt = cls(window_days)
+        if os.path.exists(path):
+            data = np.load(path, allow_pickle=False)
+            flt.add(pd.DataFrame({c: data[c] for c in cls.COLUMNS}))
+        return flt
+
+
+def daily_stats(dates, dup):
+    """Per-day records and duplicates (for appending to DEDUP_STATS_PATH)."""
+    stats = pd.DataFrame({'Date': dates, 'Duplicates': dup}).groupby('Date')['Duplicates'].agg(['size', 'sum'])
+    return stats.rename(columns={'size': 'Records', 'sum': 'Duplicates'}).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GKG near-duplicate suppression')
+    commands = parser.add_subparsers(dest='command', required=True)
+    stats = commands.add_parser('stats', help='Per-day duplicate rates')
+    stats.add_argument('--path', default=DEDUP_STATS_PATH)
+    args = parser.parse_args()
+
+    daily = pd.read_csv(args.path, dtype={'Date': str}).groupby('Date')[['Records', 'Duplicates']].sum()
+    daily['Dup_Rate'] = daily['Duplicates'] / daily['Records']
+    print(daily.to_string(float_format=lambda x: f"{x:.1%}"))
+    total = daily.sum()
+    print(f"\nOverall: {int(total['Duplicates']):,} of {int(total['Records']):,} records "
+          f"({total['Duplicates'] / max(1, total['Records']):.1%})")
+
+
+if __name__ == '__main__':
+    main()
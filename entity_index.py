@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Organization-level GKG sentiment: an inverted index from normalized
+organization names to daily tone statistics, and per-ticker daily sentiment
+columns derived from it.
+
+The GKG ingest scripts (process-gdelt.py, collect-gdelt.py) call
+aggregate_entities() on every file in the same pass as their other
+aggregates and write one long-format Parquet part per file (DATE, entity,
+count, tone_sum, tone_sq). compact() merges the parts into
+results/entity_index.parquet, sorted by entity so lookups of a few names read
+only the matching row groups. Ticker columns are then built from the index
+alone, so adding or changing a TICKER_ENTITIES mapping never rescans GKG.
+
+Usage:
+    python entity_index.py compact                      # Parts -> results/entity_index.parquet
+    python entity_index.py search reserve               # Entities containing a substring
+    python entity_index.py lookup apple "federal reserve"
+    python entity_index.py signals                      # TICKER_ENTITIES -> results/entity_sentiment.csv
+    python entity_index.py signals --map TSLA=tesla     # Add a mapping for this run
+"""
+
+import argparse
+import glob
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ENTITY_PARTS_DIR = os.path.join('results', 'entity_parts')
+ENTITY_INDEX_PATH = os.path.join('results', 'entity_index.parquet')
+ENTITY_SENTIMENT_PATH = os.path.join('results', 'entity_sentiment.csv')
+
+ENTITY_MIN_RECORDS = 20   # Entities with fewer records in total are dropped at compaction
+ROW_GROUP_SIZE = 100_000
+
+# Ticker -> normalized organization names whose tone is pooled into its columns
+TICKER_ENTITIES = {
+    'AAPL': ['apple'],
+    'MSFT': ['microsoft'],
+    'NVDA': ['nvidia'],
+    'SPX': ['federal reserve', 'securities and exchange commission'],
+    'NDX': ['nasdaq', 'federal reserve'],
+    'DJI': ['dow jones', 'federal reserve'],
+    'DAX': ['european central bank', 'bundesbank'],
+    'NKX': ['bank of japan'],
+}
+
+# Trailing legal-form tokens removed by normalize_entity ("Apple Inc." -> "apple")
+ORG_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited',
+    'plc', 'llc', 'lp', 'ag', 'sa', 'nv', 'se',
+}
+
+STATS = ['count', 'tone_sum', 'tone_sq']
+_NON_WORD = re.compile(r"[^\w&]+")
+
+
+@lru_cache(maxsize=1_000_000)
+def normalize_entity(name):
+    """Lower-case, punctuation-free organization name without trailing legal-form suffixes."""
+    tokens = _NON_WORD.sub(' ', name.lower()).split()
+    while len(tokens) > 1 and tokens[-1] in ORG_SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+def aggregate_entities(df, orgs_col, tone):
+    """
+    Per (DATE, entity) record count, tone sum and tone sum of squares for one GKG file.
+    orgs_col: ';'-separated organizations (V2 "name,offset" entries are reduced to the name);
+    tone: AvgTone per row. Each record counts once per distinct normalized entity.
+    """
+    rows = tone.notna() & df[orgs_col].notna()
+    if not rows.any():
+        return None
+    orgs = df.loc[rows, orgs_col].str.split(';').explode()
+    has_offset = orgs.str.contains(r',\d+$', regex=True, na=False)
+    raw = orgs.str.rsplit(',', n=1).str[0].where(has_offset, orgs)
+
+    # Normalize each distinct raw name once (cached across files in this process)
+    codes, uniques = pd.factorize(raw)
+    names = np.array([normalize_entity(u) for u in uniques] + [''], dtype=object)[codes]  # -1 (NaN) -> ''
+    long = pd.DataFrame({'entity': names, 'record': orgs.index})
+    long = long[long['entity'] != ''].drop_duplicates()
+    if long.empty:
+        return None
+
+    long['DATE'] = df['DATE'].loc[long['record']].values
+    long['tone'] = tone.loc[long['record']].values
+    long['tone_sq'] = long['tone'] ** 2
+    out = long.groupby(['DATE', 'entity'], sort=False).agg(
+        count=('tone', 'size'), tone_sum=('tone', 'sum'), tone_sq=('tone_sq', 'sum')
+    ).reset_index()
+    out['DATE'] = out['DATE'].astype(str).str[:8]  # V2 timestamps are YYYYMMDDhhmmss
+    out['count'] = out['count'].astype(np.int32)
+    return out
+
+
+def write_part(entity_df, source_file, parts_dir=ENTITY_PARTS_DIR):
+    os.makedirs(parts_dir, exist_ok=True)
+    entity_df.to_parquet(os.path.join(parts_dir, f"{os.path.basename(source_file)}.parquet"), index=False)
+
+
+def compact(parts_dir=ENTITY_PARTS_DIR, out_path=ENTITY_INDEX_PATH, min_records=ENTITY_MIN_RECORDS):
+    """Merges parts into the entity-sorted index, summing duplicate (date, entity) cells."""
+    parts = sorted(glob.glob(os.path.join(parts_dir, '*.parquet')))
+    if not parts:
+        raise FileNotFoundError(f"No entity parts in {parts_dir}")
+    long = pd.concat((pd.read_parquet(p) for p in parts), ignore_index=True)
+    long = long.groupby(['entity', 'DATE'], as_index=False, sort=True)[STATS].sum()
+    totals = long.groupby('entity')['count'].transform('sum')
+    long = long[totals >= min_records]
+    long['Date'] = pd.to_datetime(long.pop('DATE'), format='%Y%m%d', errors='coerce')
+    long = long.dropna(subset=['Date'])[['entity', 'Date', *STATS]]
+    long.to_parquet(out_path, index=False, row_group_size=ROW_GROUP_SIZE)
+    print(f"Compacted {len(parts)} parts -> {out_path}: {long['entity'].nunique():,} entities, "
+          f"{len(long):,} entity-days (min {min_records} records per entity)")
+    return out_path
+
+
+class EntityIndex:
+    """Reads the compacted index; lookups push the entity filter down to Parquet row groups."""
+
+    def __init__(self, path=ENTITY_INDEX_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python entity_index.py compact` first")
+        self.path = path
+
+    def entities(self):
+        return pd.read_parquet(self.path, columns=['entity'])['entity'].unique()
+
+    def search(self, text):
+        text = normalize_entity(text)
+        return sorted(e for e in self.entities() if text in e)
+
+    def lookup(self, entities):
+        """Long (entity, Date, count, tone_sum, tone_sq) rows for the given names (normalized first)."""
+        names = sorted({normalize_entity(e) for e in entities})
+        return pd.read_parquet(self.path, filters=[('entity', 'in', names)])
+
+    def daily(self, entities, name):
+        """
+        Daily <name>_Entity_Sentiment (mean tone), _Entity_Disagreement (std) and
+        _Entity_Volume (records) pooled over entities; a record naming two of
+        them counts for both.
+        """
+        rows = self.lookup(entities)
+        if rows.empty:
+            return pd.DataFrame()
+        sums = rows.groupby('Date')[STATS].sum()
+        count = sums['count'].to_numpy(np.float64)
+        mean = sums['tone_sum'].to_numpy() / count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = (sums['tone_sq'].to_numpy() - count * mean ** 2) / (count - 1)
+        return pd.DataFrame({
+            f"{name}_Entity_Sentiment": mean,
+            f"{name}_Entity_Disagreement": np.sqrt(np.clip(var, 0, None)),
+            f"{name}_Entity_Volume": sums['count'].to_numpy(),
+        }, index=sums.index)
+
+    def ticker_sentiment(self, mapping=TICKER_ENTITIES):
+        """Wide daily frame with the three entity columns for every mapped ticker."""
+        frames = [self.daily(entities, ticker) for ticker, entities in mapping.items()]
+        frames = [f for f in frames if not f.empty]
+        return pd.concat(frames, axis=1).sort_index() if frames else pd.DataFrame()
+
+
+def write_ticker_sentiment(mapping=TICKER_ENTITIES, index_path=ENTITY_INDEX_PATH, out_path=ENTITY_SENTIMENT_PATH):
+    wide = EntityIndex(index_path).ticker_sentiment(mapping)
+    wide.index.name = 'Date'
+    wide.to_csv(out_path)
+    covered = sorted({c.split('_Entity_')[0] for c in wide.columns})
+    print(f"Saved {out_path}: {len(wide)} days, tickers {covered}")
+    return wide
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Organization-level GKG sentiment index')
+    parser.add_argument('--index', default=ENTITY_INDEX_PATH, help=f'Index file (default: {ENTITY_INDEX_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('compact', help='Merge Parquet parts into the index')
+    build.add_argument('--parts', default=ENTITY_PARTS_DIR)
+    build.add_argument('--min-records', type=int, default=ENTITY_MIN_RECORDS)
+    search = commands.add_parser('search', help='Entities containing a substring')
+    search.add_argument('text')
+    lookup = commands.add_parser('lookup', help='Daily pooled sentiment for entities')
+    lookup.add_argument('entities', nargs='+')
+    signals = commands.add_parser('signals', help='Write per-ticker entity sentiment columns')
+    signals.add_argument('--map', nargs='+', default=[], metavar='TICKER=ENTITY[,ENTITY...]',
+                         help='Extra or replacement ticker mappings')
+    signals.add_argument('--output', default=ENTITY_SENTIMENT_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        compact(args.parts, args.index, args.min_records)
+    elif args.command == 'search':
+        for entity in EntityIndex(args.index).search(args.text):
+            print(entity)
+    elif args.command == 'lookup':
+        print(EntityIndex(args.index).daily(args.entities, 'Lookup').to_string())
+    else:
+        mapping = dict(TICKER_ENTITIES)
+        for item in args.map:
+            ticker, entities = item.split('=', 1)
+            mapping[ticker] = entities.split(',')
+        write_ticker_sentiment(mapping, args.index, args.output)
+
+
+if __name__ == '__main__':
+    main()
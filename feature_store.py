@@ -0,0 +1,187 @@
+"""
+On-disk feature store for create_features() output.
+
+Entries are keyed by (ticker, input data hash, feature-definition version):
+  - the input hash covers the ticker's frame from load_and_process_data(),
+    so new or revised market/news rows produce a new entry;
+  - the definition version hashes the source of the feature builder, the
+    current feature sets and the feature registry fingerprint, so editing
+    create_features(), get_feature_sets() or features.py invalidates every
+    cached entry automatically.
+
+Each entry is stored columnar (one .npy per column plus the date index)
+and loaded memory-mapped. Least-recently-used entries are evicted once the
+store grows past its byte budget.
+
+Usage (scripts or notebooks):
+    from modelling import load_and_process_data, create_features, get_feature_sets
+    from feature_store import FeatureStore
+
+    store = FeatureStore()
+    df = load_and_process_data('results/merged_stooq_gdelt.csv', 'SPX')
+    features = store.get_or_compute('SPX', df, create_features, get_feature_sets)
+    store.report()
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIR = os.path.join('results', 'feature_store')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+
+def hash_frame(df):
+    """Stable content hash of a DataFrame (values, index and column names)."""
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps(list(map(str, df.columns))).encode())
+    return digest.hexdigest()[:16]
+
+
+def definition_version(builder, feature_sets_fn=None, version_salt=''):
+    """
+    Hash of the feature builder's source, the configured feature sets and an
+    optional salt (e.g. a fingerprint of a feature registry the builder delegates to).
+    """
+    digest = hashlib.sha1(inspect.getsource(builder).encode())
+    if feature_sets_fn is not None:
+        digest.update(json.dumps(feature_sets_fn()).encode())
+    digest.update(version_salt.encode())
+    return digest.hexdigest()[:16]
+
+
+class FeatureStore:
+    """Versioned, memory-mapped cache of per-ticker feature frames with LRU eviction."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidated': 0}
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- Keys & paths ---
+
+    def entry_dir(self, ticker, data_hash, version):
+        return os.path.join(self.root, ticker, f"{version}_{data_hash}")
+
+    # --- Read / write ---
+
+    def load(self, path):
+        """Loads one entry; column arrays are memory-mapped, not read eagerly."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy')), name=meta['index_name'])
+        columns = {
+            name: np.load(os.path.join(path, f"col_{i}.npy"), mmap_mode='r')
+            for i, name in enumerate(meta['columns'])
+        }
+        self.touch(path)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def save(self, path, df, meta):
+        """Writes an entry atomically (temp dir + rename) so readers never see partial files."""
+        tmp = f"{path}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, 'index.npy'), df.index.values)
+        for i, name in enumerate(df.columns):
+            np.save(os.path.join(tmp, f"col_{i}.npy"), df[name].to_numpy())
+        meta = dict(meta, columns=list(df.columns), index_name=df.index.name,
+                    rows=len(df), created=time.time(), last_access=time.time())
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+
+    def touch(self, path):
+        meta_path = os.path.join(path, 'meta.json')
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta['last_access'] = time.time()
+        # Replaced atomically: other processes may be reading meta.json (load/entries)
+        tmp = f"{meta_path}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    # --- Public API ---
+
+    def get_or_compute(self, ticker, df, builder, feature_sets_fn=None, version_salt=''):
+        """
+        Returns builder(df) for this ticker, from the store when the input data
+        and feature definitions are unchanged, otherwise computing and storing it.
+        """
+        version = definition_version(builder, feature_sets_fn, version_salt)
+        path = self.entry_dir(ticker, hash_frame(df), version)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            self.stats['hits'] += 1
+            return self.load(path)
+
+        self.stats['misses'] += 1
+        features = builder(df)
+        self.invalidate_stale(ticker, version)
+        self.save(path, features, {'ticker': ticker, 'version': version})
+        self.evict()
+        return features
+
+    def invalidate_stale(self, ticker, version):
+        """Drops this ticker's entries built with an older feature definition."""
+        ticker_dir = os.path.join(self.root, ticker)
+        if not os.path.isdir(ticker_dir):
+            return
+        for name in os.listdir(ticker_dir):
+            if not name.startswith(f"{version}_"):
+                shutil.rmtree(os.path.join(ticker_dir, name), ignore_errors=True)
+                self.stats['invalidated'] += 1
+
+    def entries(self):
+        """(path, size_bytes, last_access) for every complete entry."""
+        found = []
+        for ticker in os.listdir(self.root):
+            ticker_dir = os.path.join(self.root, ticker)
+            if not os.path.isdir(ticker_dir):
+                continue
+            for name in os.listdir(ticker_dir):
+                path = os.path.join(ticker_dir, name)
+                meta_path = os.path.join(path, 'meta.json')
+                if '.tmp' in name or not os.path.exists(meta_path):
+                    continue
+                with open(meta_path) as f:
+                    last_access = json.load(f)['last_access']
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                found.append((path, size, last_access))
+        return found
+
+    def evict(self):
+        """Removes least-recently-used entries until the store fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def report(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        entries = self.entries()
+        print("=== Feature Store ===")
+        print(f"Location:    {self.root}")
+        print(f"Entries:     {len(entries)} ({sum(s for _, s, _ in entries) / (1024 * 1024):.1f} MB)")
+        print(f"Hits:        {self.stats['hits']}")
+        print(f"Misses:      {self.stats['misses']}")
+        print(f"Hit rate:    {self.stats['hits'] / lookups:.1%}" if lookups else "Hit rate:    n/a")
+        print(f"Invalidated: {self.stats['invalidated']}")
+        print(f"Evicted:     {self.stats['evictions']}")
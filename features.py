@@ -0,0 +1,326 @@
+"""
+Declarative feature registry and fused rolling-window engine.
+
+Every model feature is one FeatureSpec(name, op, source, window, other).
+compute_features() groups the specs by source series and, per source, makes a
+single pass building prefix sums of x and x**2 (plus a NaN count). Every
+rolling mean/std over that source, for any number of windows, is then an
+O(1)-per-row difference of those prefix sums, so adding candidate features
+does not add passes over the data or per-window pandas temporaries.
+
+Supported ops:
+    lag            source shifted by `window` rows
+    pct_change     source / source.shift(window) - 1
+    mean, std      rolling mean / sample std (ddof=1) over `window`
+    rel_to_mean    source / rolling mean(window)
+    trend          source / rolling mean(window) - 1
+    rsi            Wilder-style RSI of source using simple rolling means
+    spread         (source - other) / other, `other` is a column
+    product        source * other, `other` may be another feature's name
+Cross-asset ops (panel mode only, `other` names a ticker):
+    rel_strength   pct_change(window) minus the other ticker's pct_change(window)
+    corr           rolling correlation with the other ticker's series
+    dispersion     rolling mean of the cross-sectional std across tickers
+Derived sources ('Close:diff', 'Close:gain', 'Close:loss') are built once and
+shared by every spec that uses them.
+"""
+
+import hashlib
+import inspect
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+FeatureSpec = namedtuple('FeatureSpec', ['name', 'op', 'source', 'window', 'other'])
+FeatureSpec.__new__.__defaults__ = (None, None)
+
+MARKET_FEATURES = [
+    FeatureSpec('Ret_Lag1', 'lag', 'Return', 1),
+    FeatureSpec('Ret_Lag2', 'lag', 'Return', 2),
+    FeatureSpec('Ret_Lag3', 'lag', 'Return', 3),
+    FeatureSpec('Ret_Lag5', 'lag', 'Return', 5),
+    FeatureSpec('Ret_Lag10', 'lag', 'Return', 10),
+    FeatureSpec('Vol_5', 'std', 'Return', 5),
+    FeatureSpec('Vol_20', 'std', 'Return', 20),
+    FeatureSpec('Intraday_Move', 'spread', 'Close', other='Open'),
+    FeatureSpec('MA_50', 'mean', 'Close', 50),
+    FeatureSpec('Trend_50', 'trend', 'Close', 50),
+    FeatureSpec('Mom_20', 'pct_change', 'Close', 20),
+    FeatureSpec('Mom_60', 'pct_change', 'Close', 60),
+    FeatureSpec('RSI', 'rsi', 'Close', 14),
+]
+
+SENTIMENT_FEATURES = [
+    FeatureSpec('Sent_MA_3', 'mean', 'News_Sentiment', 3),
+    FeatureSpec('Sent_MA_7', 'mean', 'News_Sentiment', 7),
+    FeatureSpec('Sent_MA_14', 'mean', 'News_Sentiment', 14),
+    FeatureSpec('Sent_Vol_5', 'mean', 'News_Volatility', 5),
+    FeatureSpec('News_Vol_Rel', 'rel_to_mean', 'News_Volume', 20),
+    FeatureSpec('Sent_Impact', 'product', 'News_Sentiment', other='News_Vol_Rel'),
+]
+
+DEFAULT_FEATURES = MARKET_FEATURES + SENTIMENT_FEATURES
+
+# Need the whole (date x ticker) panel, so they are only available via compute_panel()
+CROSS_ASSET_FEATURES = [
+    FeatureSpec('RelStr_SPX_20', 'rel_strength', 'Close', 20, other='SPX'),
+    FeatureSpec('RelStr_NDX_20', 'rel_strength', 'Close', 20, other='NDX'),
+    FeatureSpec('Corr_SPX_60', 'corr', 'Return', 60, other='SPX'),
+    FeatureSpec('Dispersion_20', 'dispersion', 'Return', 20),
+]
+CROSS_ASSET_OPS = {'rel_strength', 'corr', 'dispersion'}
+
+
+def registry_fingerprint(specs=DEFAULT_FEATURES):
+    """Hash of the specs and this engine's source; changes whenever feature output could change."""
+    digest = hashlib.sha1(repr(list(specs)).encode())
+    digest.update(inspect.getsource(sys.modules[__name__]).encode())
+    return digest.hexdigest()[:16]
+
+
+class RollingSource:
+    """
+    Prefix sums for one series; answers rolling mean/std queries for any window.
+    `values` may be 1-D (dates) or 2-D (dates x tickers); windows run along axis 0.
+    """
+
+    def __init__(self, values):
+        x = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(x)
+        # Centering before accumulating keeps the x**2 prefix sums well conditioned
+        with np.errstate(invalid='ignore'):
+            self.offset = np.nan_to_num(np.nanmean(x, axis=0)) if len(x) else 0.0
+        xc = np.where(nan, 0.0, x - self.offset)
+        self.n = len(x)
+        self.cs1 = prefix_sum(xc)
+        self.cs2 = prefix_sum(xc * xc)
+        self.nans = prefix_sum(nan.astype(np.int64))
+
+    def _window_sums(self, window):
+        end = np.arange(1, self.n + 1)
+        start = np.maximum(end - window, 0)
+        s1 = self.cs1[end] - self.cs1[start]
+        s2 = self.cs2[end] - self.cs2[start]
+        # A full window with no NaNs, matching pandas' min_periods=window
+        full = along_rows(end >= window, s1.ndim)
+        valid = full & (self.nans[end] - self.nans[start] == 0)
+        return s1, s2, valid
+
+    def mean(self, window):
+        s1, _, valid = self._window_sums(window)
+        return np.where(valid, s1 / window + self.offset, np.nan)
+
+    def std(self, window):
+        if window < 2:
+            return np.full(self.cs1[1:].shape, np.nan)
+        s1, s2, valid = self._window_sums(window)
+        ss = s2 - s1 * s1 / window
+        # Differences of prefix sums carry rounding error proportional to the running
+        # total; anything below that is a constant window, which pandas reports as 0.
+        tol = 64 * np.finfo(np.float64).eps * self.cs2[1:]
+        ss = np.where(ss > tol, ss, 0.0)
+        var = ss / (window - 1)
+        return np.where(valid, np.sqrt(var), np.nan)
+
+
+def prefix_sum(x):
+    """Cumulative sum along axis 0 with a leading row of zeros."""
+    return np.concatenate((np.zeros((1,) + x.shape[1:], dtype=x.dtype), np.cumsum(x, axis=0)))
+
+
+def along_rows(mask, ndim):
+    """Reshapes a per-row mask so it broadcasts against (rows, ...) arrays."""
+    return mask.reshape((-1,) + (1,) * (ndim - 1))
+
+
+def rolling_corr(x, y, window):
+    """Rolling Pearson correlation along axis 0 (x and y broadcast against each other)."""
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    mean_x, mean_y = RollingSource(x).mean(window), RollingSource(y).mean(window)
+    mean_xy = RollingSource(x * y).mean(window)
+    std_x, std_y = RollingSource(x).std(window), RollingSource(y).std(window)
+    # Population moments from means, rescaled to the sample std used above
+    cov = (mean_xy - mean_x * mean_y) * window / (window - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return cov / (std_x * std_y)
+
+
+def shift(x, periods):
+    out = np.full(np.shape(x), np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def derived_source(df, source):
+    """Raw column, or a 'column:transform' series built from it."""
+    column, _, transform = source.partition(':')
+    x = np.asarray(df[column], dtype=np.float64)
+    if not transform:
+        return x
+    delta = x - shift(x, 1)
+    if transform == 'diff':
+        return delta
+    # Like pandas' delta.where(delta > 0, 0): the leading NaN counts as no move
+    if transform == 'gain':
+        return np.where(delta > 0, delta, 0.0)
+    if transform == 'loss':
+        return np.where(delta < 0, -delta, 0.0)
+    raise ValueError(f"Unknown source transform: {source}")
+
+
+def compute_features(df, specs=DEFAULT_FEATURES):
+    """
+    Evaluates specs against df and returns {feature name: ndarray}.
+    Sources are read once and shared; specs may reference earlier features via `other`.
+    """
+    raw, rolling, out = {}, {}, {}
+
+    def series(source):
+        if source not in raw:
+            raw[source] = derived_source(df, source)
+        return raw[source]
+
+    def roll(source):
+        if source not in rolling:
+            rolling[source] = RollingSource(series(source))
+        return rolling[source]
+
+    for spec in specs:
+        op, src, w = spec.op, spec.source, spec.window
+        if op == 'lag':
+            values = shift(series(src), w)
+        elif op == 'pct_change':
+            x = series(src)
+            values = x / shift(x, w) - 1
+        elif op == 'mean':
+            values = roll(src).mean(w)
+        elif op == 'std':
+            values = roll(src).std(w)
+        elif op == 'rel_to_mean':
+            values = series(src) / roll(src).mean(w)
+        elif op == 'trend':
+            values = series(src) / roll(src).mean(w) - 1
+        elif op == 'rsi':
+            gain = roll(f"{src}:gain").mean(w)
+            loss = roll(f"{src}:loss").mean(w)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = 100 - 100 / (1 + gain / loss)
+        elif op == 'spread':
+            if spec.other not in df.columns:
+                values = np.zeros_like(series(src))  # e.g. no Open column available
+            else:
+                other = series(spec.other)
+                values = (series(src) - other) / other
+        elif op == 'product':
+            other = out[spec.other] if spec.other in out else series(spec.other)
+            values = series(src) * other
+        elif op in CROSS_ASSET_OPS:
+            values = cross_asset_feature(df, spec, series)
+        else:
+            raise ValueError(f"Unknown feature op '{op}' for {spec.name}")
+        out[spec.name] = values
+    return out
+
+
+def add_features(df, specs=DEFAULT_FEATURES):
+    """Returns a copy of df with every spec's feature appended as a column."""
+    values = compute_features(df, specs)
+    return df.assign(**{name: pd.Series(col, index=df.index) for name, col in values.items()})
+
+
+class Panel:
+    """
+    The wide merged frame viewed as one (date x ticker) matrix per field.
+    Ticker fields come from '{ticker}_{field}' columns; ticker-independent
+    columns (News_*) are broadcast across tickers. Return and Target follow
+    load_and_process_data().
+    """
+
+    def __init__(self, wide, tickers):
+        self.index = wide.index
+        self.tickers = list(tickers)
+        self.fields = {}
+        for field in ['Open', 'Close', 'Volume']:
+            cols = [f"{t}_{field}" for t in self.tickers]
+            if all(c in wide.columns for c in cols):
+                self.fields[field] = wide[cols].to_numpy(dtype=np.float64)
+        shape = (len(wide), len(self.tickers))
+        for col in wide.columns:
+            if col.startswith('News_'):
+                self.fields[col] = np.broadcast_to(wide[col].to_numpy(dtype=np.float64)[:, None], shape)
+        close = self.fields['Close']
+        self.fields['Return'] = close / shift(close, 1) - 1
+        nxt = shift(self.fields['Return'][::-1], 1)[::-1]  # Return at t + 1
+        self.fields['Target'] = (nxt > 0).astype(np.float64)
+
+        # Drop dates on which no ticker has a Return (the first one), as
+        # load_and_process_data() does before any feature is computed, so rolling
+        # windows line up exactly. A ticker's own missing Returns stay NaN here and
+        # are dropped by ticker_frame(), so they never cost the other tickers a date.
+        keep = ~np.isnan(self.fields['Return']).all(axis=1)
+        self.index = self.index[keep]
+        self.fields = {name: values[keep] for name, values in self.fields.items()}
+
+    @property
+    def columns(self):
+        return list(self.fields)
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def ticker_column(self, ticker):
+        return self.tickers.index(ticker)
+
+
+def cross_asset_feature(panel, spec, series):
+    if not isinstance(panel, Panel):
+        raise ValueError(f"{spec.name} needs the multi-ticker panel (compute_panel)")
+    x = series(spec.source)
+    if spec.op == 'rel_strength':
+        mom = x / shift(x, spec.window) - 1
+        return mom - mom[:, [panel.ticker_column(spec.other)]]
+    if spec.op == 'corr':
+        return rolling_corr(x, x[:, [panel.ticker_column(spec.other)]], spec.window)
+    if spec.op == 'dispersion':
+        spread = np.nanstd(x, axis=1, ddof=1)[:, None]
+        return np.broadcast_to(RollingSource(spread).mean(spec.window), x.shape)
+    raise ValueError(f"Unknown cross-asset op: {spec.op}")
+
+
+def compute_panel(panel, specs=DEFAULT_FEATURES):
+    """
+    Computes every spec for every ticker in one vectorised pass over (date x ticker)
+    matrices. Returns (cube, columns) where cube has shape (tickers, dates, columns)
+    in C order, so cube[j] is a contiguous (dates x columns) matrix for ticker j.
+    The first columns are the panel's base fields, followed by the features.
+    Pass DEFAULT_FEATURES + CROSS_ASSET_FEATURES to include the cross-asset ones.
+    """
+    values = compute_features(panel, specs)
+    base = [f for f in ['Open', 'Close', 'Volume', 'News_Sentiment', 'News_Disagreement',
+                        'News_Volatility', 'News_Volume', 'Return', 'Target'] if f in panel.fields]
+    columns = base + [spec.name for spec in specs]
+    cube = np.empty((len(panel.tickers), len(panel.index), len(columns)), dtype=np.float64)
+    for k, name in enumerate(columns):
+        cube[:, :, k] = (panel[name] if name in panel.fields else values[name]).T
+    return cube, columns
+
+
+def ticker_frame(panel, cube, columns, ticker, required=None):
+    """
+    Per-ticker feature frame backed by a view of the cube (no copy), with the
+    warm-up rows removed as create_features()' dropna() would. Only NaNs in the
+    `required` columns (default: all) drop a row, so columns the model does not
+    use cannot trim the sample.
+    """
+    block = cube[panel.ticker_column(ticker)]
+    checked = block if required is None else block[:, [columns.index(c) for c in required]]
+    complete = ~np.isnan(checked).any(axis=1)
+    rows = np.flatnonzero(complete)
+    if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+        block, index = block[rows[0]:rows[-1] + 1], panel.index[rows[0]:rows[-1] + 1]
+    else:
+        block, index = block[complete], panel.index[complete]  # Gaps in the data: falls back to a copy
+    return pd.DataFrame(block, index=index, columns=columns, copy=False)
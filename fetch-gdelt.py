@@ -1,28 +1,47 @@
 #!/usr/bin/env python3
 """
-GDELT Data Fetching Script (Version 1.0 - Daily Data)
+GDELT Data Fetching Script (Version 1.0 - Daily Data, Version 2.0 - 15-Minute Updates)
 
 This script uses the gdelt Python library to fetch GDELT v1 data,
 which provides daily updates from 1979 onwards. The downloaded data
 is saved in tab-separated format compatible with collect-gdelt.py.
 
+With --v2 it downloads the raw GDELT 2.0 15-minute update files (GKG,
+events, mentions; 96 per day and table) straight from the GDELT server over a
+pooled keep-alive HTTP session with many parallel workers, into data/v2.
+intraday.py turns the GKG files into intraday sentiment bars.
+
 Usage:
     python fetch-gdelt.py --start 2025-12-01               # From start date to today
     python fetch-gdelt.py --end 2025-12-10                 # From beginning to end date
     python fetch-gdelt.py --start 2025-12-01 --end 2025-12-10  # Date range
     python fetch-gdelt.py --start 2025-12-01 --overwrite   # Overwrite existing files
+    python fetch-gdelt.py --start 2025-12-01 --trace       # Also write a per-stage JSON trace
+    python fetch-gdelt.py --v2 --start 2025-12-01 --tables gkg   # 15-minute GKG files -> data/v2
 """
 
 import gdelt
 import pandas as pd
 import argparse
+import io
+import shutil
 import sys
+import zipfile
 from pathlib import Path
 from datetime import datetime, timedelta
 import os
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from instrumentation import add_trace_arguments, tracer
+
+# GDELT 2.0 raw update files: <base>/<YYYYMMDDHHMMSS>.<suffix>.zip every 15 minutes
+GDELT_V2_BASE_URL = 'http://data.gdeltproject.org/gdeltv2'
+GDELT_V2_START = datetime(2015, 2, 19)
+GDELT_V2_SUFFIXES = {'gkg': 'gkg.csv', 'events': 'export.CSV', 'mentions': 'mentions.CSV'}
 
 
 class GDELTFetcher:
@@ -71,6 +90,7 @@ class GDELTFetcher:
         """Check if file exists and is not empty"""
         return filepath.exists() and filepath.stat().st_size > 0
     
+    @tracer.timed()
     def fetch_date(self, date, table='events'):
         """
         Fetch GDELT data for a specific date and table type
@@ -93,6 +113,7 @@ class GDELTFetcher:
             
             if df is not None and len(df) > 0:
                 tqdm.write(f"✓ ({len(df):,} rows)")
+                tracer.count('rows_fetched', len(df))
                 return df
             else:
                 tqdm.write(f"✗ No data returned")
@@ -102,6 +123,7 @@ class GDELTFetcher:
             tqdm.write(f"✗ Error: {e}")
             return None
     
+    @tracer.timed()
     def save_data(self, df, date, table='events'):
         """
         Save DataFrame to TSV format compatible with collect-gdelt.py
@@ -126,6 +148,8 @@ class GDELTFetcher:
             df.to_csv(filepath, sep='\t', index=False, header=False, encoding='utf-8')
             size_kb = filepath.stat().st_size / 1024
             tqdm.write(f"  💾 Saved: {filename} ({size_kb:.1f} KB)")
+            tracer.count('rows_written', len(df))
+            tracer.count('bytes_written', filepath.stat().st_size)
             with self.stats_lock:
                 self.stats['downloaded'] += 1
                 self.stats['total_rows'] += len(df)
@@ -245,6 +269,120 @@ class GDELTFetcher:
         print()
 
 
+class GDELTv2Fetcher:
+    """Fetch GDELT 2.0 15-minute update files over a pooled keep-alive HTTP session"""
+    
+    def __init__(self, data_dir='data/v2', overwrite=False, max_workers=32):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.overwrite = overwrite
+        self.max_workers = max_workers
+        
+        # One connection pool sized to the worker count; transient errors are retried with backoff
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.stats = {
+            'downloaded': 0,
+            'skipped': 0,
+            'missing': 0,
+            'failed': 0,
+            'total_bytes': 0
+        }
+        self.stats_lock = threading.Lock()
+    
+    def generate_timestamps(self, start_date, end_date):
+        """15-minute update timestamps from start_date 00:00 through end_date 23:45"""
+        return pd.date_range(start_date, end_date + timedelta(days=1), freq='15min', inclusive='left')
+    
+    def timestamp_to_filename(self, timestamp, table):
+        return f"{timestamp.strftime('%Y%m%d%H%M%S')}.{GDELT_V2_SUFFIXES[table]}"
+    
+    def _count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+    
+    @tracer.timed()
+    def fetch_file(self, timestamp, table):
+        """
+        Download and unzip one update file. The file is written under a .part name
+        and renamed when complete, so readers watching data/v2 never see partial files.
+        
+        Returns:
+            str: 'downloaded', 'skipped', 'missing' (no file published for that slot) or 'failed'
+        """
+        filename = self.timestamp_to_filename(timestamp, table)
+        filepath = self.data_dir / filename
+        if filepath.exists() and filepath.stat().st_size > 0 and not self.overwrite:
+            self._count('skipped')
+            return 'skipped'
+        
+        try:
+            response = self.session.get(f"{GDELT_V2_BASE_URL}/{filename}.zip", timeout=60)
+            if response.status_code == 404:
+                self._count('missing')
+                return 'missing'
+            response.raise_for_status()
+            tracer.count('bytes_downloaded', len(response.content))
+            
+            part = filepath.with_name(filepath.name + '.part')
+            with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+                with archive.open(archive.namelist()[0]) as src, open(part, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
+            os.replace(part, filepath)
+            self._count('downloaded')
+            self._count('total_bytes', filepath.stat().st_size)
+            return 'downloaded'
+        except Exception as e:
+            tqdm.write(f"  ❌ {filename}: {e}")
+            self._count('failed')
+            return 'failed'
+    
+    def fetch_range(self, start_date, end_date, tables=None):
+        """Fetch every 15-minute file of the given tables between start_date and end_date (inclusive)"""
+        tables = tables or ['gkg']
+        timestamps = self.generate_timestamps(start_date, end_date)
+        tasks = [(ts, table) for ts in timestamps for table in tables]
+        
+        print("=" * 70)
+        print("GDELT v2 15-Minute Fetcher (Parallel Mode)")
+        print("=" * 70)
+        print(f"Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+        print(f"Update Slots: {len(timestamps)}")
+        print(f"Tables: {', '.join(tables)}")
+        print(f"Output Directory: {self.data_dir.absolute()}")
+        print(f"Parallel Workers: {self.max_workers}")
+        print("=" * 70)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.fetch_file, ts, table) for ts, table in tasks]
+            with tqdm(total=len(tasks), desc="Downloading", unit="file") as pbar:
+                for _ in as_completed(futures):
+                    pbar.update(1)
+        
+        self.print_summary()
+    
+    def print_summary(self):
+        """Print download summary statistics"""
+        print("=" * 70)
+        print("Download Summary")
+        print("=" * 70)
+        print(f"Files Downloaded: {self.stats['downloaded']}")
+        print(f"Files Skipped: {self.stats['skipped']}")
+        print(f"Not Published: {self.stats['missing']}")
+        print(f"Failed Downloads: {self.stats['failed']}")
+        print(f"Total Size: {self.stats['total_bytes'] / (1024 * 1024):.1f} MB")
+        print("=" * 70)
+        print()
+        print("Next Steps:")
+        print(f"  1. Intraday bars: python intraday.py ingest -d {self.data_dir}")
+        print(f"  2. Session features: python intraday.py sessions")
+        print()
+
+
 def parse_date(date_str):
     """Parse date string in YYYY-MM-DD format"""
     try:
@@ -282,9 +420,12 @@ Examples:
   
   # Specify output directory
   python fetch-gdelt.py --start 2025-12-01 -d ./gdelt-data
+  
+  # GDELT 2.0 15-minute GKG and mentions files (default directory: data/v2)
+  python fetch-gdelt.py --v2 --start 2025-12-01 --tables gkg mentions --workers 32
 
 Notes:
-  - GDELT v1 provides daily aggregated data
+  - GDELT v1 provides daily aggregated data; --v2 fetches the 15-minute update files (from 2015-02-19)
   - Date range is inclusive (both start and end dates are fetched)
   - Default behavior is to skip existing files (use --overwrite to replace)
   - Downloaded files are compatible with collect-gdelt.py for merging
@@ -297,16 +438,20 @@ Notes:
                        help='End date (YYYY-MM-DD). If not specified, fetches until today.')
     parser.add_argument('--overwrite', action='store_true',
                        help='Overwrite existing files instead of skipping them')
-    parser.add_argument('-d', '--data-dir', type=str, default='data',
-                       help='Directory to save downloaded files (default: data)')
-    parser.add_argument('--tables', nargs='+', choices=['events', 'gkg'],
-                       help='Which tables to download (default: both events and gkg)')
+    parser.add_argument('-d', '--data-dir', type=str, default=None,
+                       help='Directory to save downloaded files (default: data, or data/v2 with --v2)')
+    parser.add_argument('--tables', nargs='+', choices=['events', 'gkg', 'mentions'],
+                       help='Which tables to download (default: both events and gkg; gkg with --v2; mentions needs --v2)')
     parser.add_argument('--filter', type=str, choices=['events', 'gkg', 'both'],
                        help='Filter which dataset to download: events, gkg, or both (default: both). Alias for --tables')
-    parser.add_argument('-w', '--workers', type=int, default=5,
-                       help='Number of parallel workers for downloading (default: 5)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                       help='Number of parallel workers for downloading (default: 5, or 32 with --v2)')
+    parser.add_argument('--v2', action='store_true',
+                       help='Fetch GDELT 2.0 15-minute update files instead of v1 daily data')
+    add_trace_arguments(parser)
     
     args = parser.parse_args()
+    tracer.configure(args.trace, args.profile)
     
     # If no arguments provided, show help
     if len(sys.argv) == 1:
@@ -320,7 +465,7 @@ Notes:
     # GDELT v1 starts from 1979-01-01
     gdelt_v1_start = datetime(1979, 1, 1)
     
-    start_date = args.start if args.start else gdelt_v1_start
+    start_date = args.start if args.start else (GDELT_V2_START if args.v2 else gdelt_v1_start)
     end_date = args.end if args.end else today
     
     # Validate date range
@@ -340,11 +485,23 @@ Notes:
         else:
             tables = [args.filter]
     
+    if tables and 'mentions' in tables and not args.v2:
+        print("Error: mentions files only exist in GDELT 2.0 (use --v2)")
+        sys.exit(1)
+    
     # Create fetcher and download data
-    fetcher = GDELTFetcher(data_dir=args.data_dir, overwrite=args.overwrite, max_workers=args.workers)
+    if args.v2:
+        fetcher = GDELTv2Fetcher(data_dir=args.data_dir or 'data/v2', overwrite=args.overwrite,
+                                 max_workers=args.workers or 32)
+    else:
+        fetcher = GDELTFetcher(data_dir=args.data_dir or 'data', overwrite=args.overwrite,
+                               max_workers=args.workers or 5)
     
     try:
-        fetcher.fetch_date_range(start_date, end_date, tables=tables)
+        if args.v2:
+            fetcher.fetch_range(start_date, end_date, tables=tables)
+        else:
+            fetcher.fetch_date_range(start_date, end_date, tables=tables)
     except KeyboardInterrupt:
         print("\n\nDownload interrupted by user.")
         fetcher.print_summary()
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter Search Engine
+
+Tunes the RF, LSTM and ARIMA settings that modelling.py reads from RF_PARAMS,
+LSTM_* / SEQ_LEN (lstm_config.py) and ARIMA_ORDER, using time-ordered cross-validation on the training
+part of each ticker (modelling.py's test split is never touched):
+
+  - Feature matrices are built once per study, saved as .npy files and
+    memory-mapped by every worker, so trials share one copy of the data.
+  - Folds are expanding windows in time order (train on rows [0, t), validate
+    on the next block). A trial's score is the mean Brier score over tickers
+    and folds (lower is better); accuracy is recorded alongside.
+  - 'halving' (successive halving, the default): every sampled configuration
+    is scored on the most recent fold only, the best 1/eta continue to eta
+    times as many folds, and so on until the survivors have seen every fold.
+  - 'random': every configuration runs fold by fold and is pruned as soon as
+    its running score is worse than the median of other trials at that fold.
+  - Trials run in a process pool. Studies, trials, per-fold scores and pruning
+    decisions are stored in SQLite (results/hpsearch/trials.db), which can be
+    queried with the commands below or any SQLite client.
+
+Usage:
+    python hyperparam_search.py run --model rf --trials 60                  # All tickers
+    python hyperparam_search.py run --model lstm --tickers SPX --trials 20 --jobs 4
+    python hyperparam_search.py run --model arima --method random --trials 30
+    python hyperparam_search.py studies                                     # List studies
+    python hyperparam_search.py top rf-20251216-093000 -k 10                # Best trials + modelling.py settings
+    sqlite3 results/hpsearch/trials.db "SELECT params, score FROM trials WHERE state = 'complete' ORDER BY score LIMIT 5"
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from instrumentation import add_trace_arguments, tracer
+from modelling import (
+    RANDOM_SEED, RESULTS_DIR, SEQ_LEN,
+    build_feature_matrix, detect_tickers, get_feature_sets, prepare_ticker_data, set_seeds,
+)
+
+SEARCH_DIR = os.path.join(RESULTS_DIR, 'hpsearch')
+DB_PATH = os.path.join(SEARCH_DIR, 'trials.db')
+
+N_FOLDS = 5                 # Expanding-window folds over the training rows
+HALVING_ETA = 3             # Successive halving keeps the best 1/eta per rung
+PRUNE_MIN_TRIALS = 5        # Median pruning starts once this many trials reached a fold
+SEARCH_LSTM_EPOCHS = 20     # Max epochs per LSTM fit (early stopping still applies)
+
+# Parameter -> (kind, low, high) or ('choice', options)
+SEARCH_SPACES = {
+    'rf': {
+        'n_estimators': ('int_log', 50, 800),
+        'max_depth': ('int', 2, 12),
+        'min_samples_leaf': ('int_log', 5, 200),
+        'max_features': ('choice', ['sqrt', 0.5, 1.0]),
+    },
+    'lstm': {
+        'hidden_dim': ('choice', [16, 32, 64, 128]),
+        'num_layers': ('int', 1, 3),
+        'dropout': ('float', 0.0, 0.5),
+        'seq_len': ('int', 5, 30),
+        'lr': ('float_log', 1e-4, 1e-2),
+        'batch_size': ('choice', [32, 64, 128]),
+    },
+    'arima': {
+        'p': ('int', 0, 6),
+        'd': ('int', 0, 1),
+        'q': ('int', 0, 3),
+    },
+}
+
+# Current modelling.py settings, always evaluated as trial 0 for reference
+DEFAULT_PARAMS = {
+    'rf': {'n_estimators': 300, 'max_depth': 4, 'min_samples_leaf': 20, 'max_features': 'sqrt'},
+    'lstm': {'hidden_dim': 64, 'num_layers': 2, 'dropout': 0.3, 'seq_len': SEQ_LEN, 'lr': 0.001, 'batch_size': 32},
+    'arima': {'p': 5, 'd': 1, 'q': 0},
+}
+
+
+# === Search space ===
+
+def sample_params(space, rng):
+    """Draws one configuration from a SEARCH_SPACES entry."""
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == 'choice':
+            params[name] = spec[1][rng.integers(len(spec[1]))]
+        elif kind == 'int':
+            params[name] = int(rng.integers(spec[1], spec[2] + 1))
+        elif kind == 'int_log':
+            params[name] = int(round(math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2])))))
+        elif kind == 'float':
+            params[name] = round(float(rng.uniform(spec[1], spec[2])), 4)
+        elif kind == 'float_log':
+            params[name] = float(f"{math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2]))):.3g}")
+        else:
+            raise ValueError(f"Unknown parameter kind: {kind}")
+    return params
+
+
+def sample_configs(model, n, seed=RANDOM_SEED):
+    """n distinct configurations, starting with the current defaults."""
+    rng = np.random.default_rng(seed)
+    configs, seen = [DEFAULT_PARAMS[model]], {json.dumps(DEFAULT_PARAMS[model], sort_keys=True)}
+    for _ in range(n * 20):
+        if len(configs) >= n:
+            break
+        params = sample_params(SEARCH_SPACES[model], rng)
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            configs.append(params)
+    return configs[:n]
+
+
+def modelling_settings(model, params):
+    """The configuration lines equivalent to a trial's params (LSTM ones go in lstm_config.py)."""
+    if model == 'rf':
+        return [f"RF_PARAMS = {params!r}"]
+    if model == 'lstm':
+        return [
+            f"LSTM_HIDDEN_DIM = {params['hidden_dim']}",
+            f"LSTM_NUM_LAYERS = {params['num_layers']}",
+            f"LSTM_DROPOUT = {params['dropout']}",
+            f"LSTM_BATCH_SIZE = {params['batch_size']}",
+            f"LSTM_BASE_LR = {params['lr']}",
+            f"LSTM_REF_BATCH_SIZE = {params['batch_size']}",
+            f"SEQ_LEN = {params['seq_len']}",
+        ]
+    return [f"ARIMA_ORDER = ({params['p']}, {params['d']}, {params['q']})"]
+
+
+# === Results store ===
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    name TEXT PRIMARY KEY, model TEXT, method TEXT, tickers TEXT, features TEXT,
+    n_folds INTEGER, config TEXT, created TEXT, finished TEXT
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, study TEXT, number INTEGER, params TEXT,
+    state TEXT, score REAL, accuracy REAL, n_folds INTEGER, seconds REAL, error TEXT,
+    started TEXT, finished TEXT
+);
+CREATE TABLE IF NOT EXISTS fold_scores (
+    trial_id INTEGER, step INTEGER, fold INTEGER, score REAL, accuracy REAL, seconds REAL,
+    PRIMARY KEY (trial_id, fold)
+);
+CREATE INDEX IF NOT EXISTS trials_by_study ON trials (study, state, score);
+"""
+
+
+def now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class TrialStore:
+    """SQLite store of studies, trials and per-fold scores (safe to share between processes)."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Studies ---
+
+    def create_study(self, name, model, method, tickers, features, n_folds, config):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO studies VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)',
+                (name, model, method, json.dumps(tickers), features, n_folds, json.dumps(config), now()),
+            )
+
+    def finish_study(self, name):
+        with self.conn:
+            self.conn.execute('UPDATE studies SET finished = ? WHERE name = ?', (now(), name))
+
+    def study(self, name):
+        row = self.conn.execute('SELECT * FROM studies WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"No study named {name!r} in {self.path}")
+        return row
+
+    def studies(self):
+        return self.conn.execute("""
+            SELECT s.name, s.model, s.method, s.tickers, s.created, s.finished,
+                   COUNT(t.id) AS trials, MIN(CASE WHEN t.state = 'complete' THEN t.score END) AS best
+            FROM studies s LEFT JOIN trials t ON t.study = s.name
+            GROUP BY s.name ORDER BY s.created
+        """).fetchall()
+
+    # --- Trials ---
+
+    def add_trial(self, study, number, params):
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO trials (study, number, params, state, n_folds, started) VALUES (?, ?, ?, 'running', 0, ?)",
+                (study, number, json.dumps(params), now()),
+            )
+        return cur.lastrowid
+
+    def trial(self, trial_id):
+        return self.conn.execute('SELECT * FROM trials WHERE id = ?', (trial_id,)).fetchone()
+
+    def record_fold(self, trial_id, step, fold, score, accuracy, seconds):
+        """Stores one fold result and refreshes the trial's running aggregates."""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO fold_scores VALUES (?, ?, ?, ?, ?, ?)',
+                              (trial_id, step, fold, score, accuracy, seconds))
+            self.conn.execute("""
+                UPDATE trials SET (score, accuracy, n_folds, seconds) =
+                    (SELECT AVG(score), AVG(accuracy), COUNT(*), SUM(seconds) FROM fold_scores WHERE trial_id = ?)
+                WHERE id = ?
+            """, (trial_id, trial_id))
+
+    def done_folds(self, trial_id):
+        return {row['fold'] for row in self.conn.execute('SELECT fold FROM fold_scores WHERE trial_id = ?', (trial_id,))}
+
+    def running_scores(self, study, steps, exclude):
+        """Mean score over the first `steps` evaluated folds of every other trial that got that far."""
+        rows = self.conn.execute("""
+            SELECT f.trial_id, AVG(f.score) AS score FROM fold_scores f JOIN trials t ON t.id = f.trial_id
+            WHERE t.study = ? AND f.step < ? AND f.trial_id != ?
+            GROUP BY f.trial_id HAVING COUNT(*) = ?
+        """, (study, steps, exclude, steps)).fetchall()
+        return [row['score'] for row in rows]
+
+    def set_state(self, trial_id, state, error=None):
+        with self.conn:
+            self.conn.execute('UPDATE trials SET state = ?, error = ?, finished = ? WHERE id = ?',
+                              (state, error, now(), trial_id))
+
+    def top(self, study, k=10, states=('complete',)):
+        marks = ','.join('?' * len(states))
+        return self.conn.execute(
+            f'SELECT * FROM trials WHERE study = ? AND state IN ({marks}) AND score IS NOT NULL '
+            f'ORDER BY n_folds DESC, score LIMIT ?',
+            (study, *states, k),
+        ).fetchall()
+
+    def state_counts(self, study):
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM trials WHERE study = ? GROUP BY state', (study,)))
+
+
+# === Shared data ===
+
+def time_series_folds(n_rows, n_folds=N_FOLDS):
+    """(train_end, val_end) row bounds of expanding-window folds, oldest first."""
+    val_size = n_rows // (n_folds + 1)
+    return [(n_rows - (n_folds - i) * val_size, n_rows - (n_folds - i - 1) * val_size) for i in range(n_folds)]
+
+
+def cache_matrices(tickers, feature_set, cache_dir, start=None, end=None):
+    """
+    Builds each ticker's training-split matrices once and saves them as .npy
+    (X float32 C-contiguous, y int8, Close float64) for workers to memory-map.
+    """
+    base_feats, sent_feats = get_feature_sets()
+    feats = base_feats if feature_set == 'base' else base_feats + sent_feats
+    for ticker in tickers:
+        train_df, _ = prepare_ticker_data(ticker, start, end)
+        path = os.path.join(cache_dir, ticker)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'X.npy'), build_feature_matrix(train_df, feats))
+        np.save(os.path.join(path, 'y.npy'), train_df['Target'].to_numpy(dtype=np.int8))
+        np.save(os.path.join(path, 'close.npy'), train_df['Close'].to_numpy(dtype=np.float64))
+        print(f"  {ticker}: {len(train_df)} training rows, {len(feats)} features")
+
+
+_MATRICES = {}
+
+
+def load_matrices(cache_dir, ticker):
+    """Memory-mapped (X, y, close) for a ticker, opened once per worker process."""
+    key = (cache_dir, ticker)
+    if key not in _MATRICES:
+        path = os.path.join(cache_dir, ticker)
+        _MATRICES[key] = tuple(np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                               for name in ('X', 'y', 'close'))
+    return _MATRICES[key]
+
+
+# === Objective ===
+
+def fit_predict(model, params, X, y, close, train_end, val_end, lstm_epochs):
+    """Fits on rows [0, train_end) and returns (probabilities, labels) for [train_end, val_end)."""
+    if model == 'rf':
+        from modelling import train_rf
+
+        _, probs, _ = train_rf(X[:train_end], y[:train_end], X[train_end:val_end], y[train_end:val_end],
+                               calibrate=True, params={**params, 'n_jobs': 1}, verbose=False)
+        return probs, y[train_end:val_end]
+
+    if model == 'lstm':
+        from lstm_models import train_lstm
+
+        # Validation windows start seq_len rows early so every validation row gets a prediction
+        seq_len = params['seq_len']
+        set_seeds(RANDOM_SEED)
+        _, probs, _ = train_lstm(
+            X[:train_end], y[:train_end], X[train_end - seq_len:val_end], y[train_end - seq_len:val_end],
+            input_dim=X.shape[1], epochs=lstm_epochs, batch_size=params['batch_size'], num_threads=1,
+            verbose=False, seq_len=seq_len, hidden_dim=params['hidden_dim'], num_layers=params['num_layers'],
+            dropout=params['dropout'] if params['num_layers'] > 1 else 0.0, lr=params['lr'],
+        )
+        return probs, y[train_end:val_end]
+
+    if model == 'arima':
+        from statsmodels.tsa.arima.model import ARIMA
+
+        # Parameters are fitted once per fold, then held fixed for one-step-ahead
+        # forecasts across the validation block (no per-step refit as in train_arima)
+        order = (params['p'], params['d'], params['q'])
+        fit = ARIMA(np.asarray(close[:train_end]), order=order).fit()
+        forecast = fit.apply(np.asarray(close[:val_end])).predict(start=train_end, end=val_end - 1)
+        previous = np.asarray(close[train_end - 1:val_end - 1])
+        change = (forecast - previous) / previous
+        probs = 1 / (1 + np.exp(-change * 10))  # Same mapping as train_arima
+        return probs, (np.asarray(close[train_end:val_end]) > previous).astype(np.int8)
+
+    raise ValueError(f"Unknown model: {model}")
+
+
+def score_fold(context, params, fold):
+    """Mean (Brier score, accuracy) over the study's tickers for one fold."""
+    scores, accuracies = [], []
+    for ticker in context['tickers']:
+        X, y, close = load_matrices(context['cache_dir'], ticker)
+        train_end, val_end = time_series_folds(len(y), context['n_folds'])[fold]
+        probs, labels = fit_predict(context['model'], params, X, y, close, train_end, val_end,
+                                    context['lstm_epochs'])
+        labels = np.asarray(labels, dtype=np.float64)
+        scores.append(float(np.mean((probs - labels) ** 2)))
+        accuracies.append(float(np.mean((probs > 0.5) == labels)))
+    return float(np.mean(scores)), float(np.mean(accuracies))
+
+
+def run_trial(context, trial_id, folds, prune=False):
+    """
+    Evaluates a trial on `folds` (in order), skipping folds it already has.
+    With prune=True the trial stops as soon as its running score is worse than
+    the median of other trials at the same number of folds.
+    Returns the trial's state: 'running' (more folds may follow), 'pruned' or 'failed'.
+    """
+    store = TrialStore(context['db_path'])
+    try:
+        params = json.loads(store.trial(trial_id)['params'])
+        done = store.done_folds(trial_id)
+        running = [row['score'] for row in store.conn.execute(
+            'SELECT score FROM fold_scores WHERE trial_id = ? ORDER BY step', (trial_id,))]
+        for step, fold in enumerate(folds):
+            if fold in done:
+                continue
+            start = time.perf_counter()
+            score, accuracy = score_fold(context, params, fold)
+            store.record_fold(trial_id, step, fold, score, accuracy, time.perf_counter() - start)
+            running.append(score)
+
+            if prune and step < len(folds) - 1:
+                others = store.running_scores(context['study'], step + 1, trial_id)
+                if len(others) >= PRUNE_MIN_TRIALS and np.mean(running) > np.median(others):
+                    store.set_state(trial_id, 'pruned')
+                    return 'pruned'
+        return 'running'
+    except Exception:
+        store.set_state(trial_id, 'failed', traceback.format_exc(limit=5))
+        return 'failed'
+    finally:
+        store.close()
+
+
+def run_batch(context, tasks, jobs):
+    """Runs (trial_id, folds, prune) tasks, in a process pool when jobs > 1; returns {trial_id: state}."""
+    if jobs <= 1:
+        return {trial_id: run_trial(context, trial_id, folds, prune) for trial_id, folds, prune in tasks}
+    states = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_trial, context, trial_id, folds, prune): trial_id
+                   for trial_id, folds, prune in tasks}
+        for future in as_completed(futures):
+            states[futures[future]] = future.result()
+    return states
+
+
+# === Search strategies ===
+
+def successive_halving(store, context, trial_ids, fold_order, eta=HALVING_ETA, jobs=1):
+    """Scores all trials on the first rung of folds, keeps the best 1/eta, grows the budget by eta."""
+    survivors, budget = list(trial_ids), 1
+    while True:
+        budget = min(budget, len(fold_order))
+        with tracer.stage('rung', folds=budget, trials=len(survivors)):
+            states = run_batch(context, [(t, fold_order[:budget], False) for t in survivors], jobs)
+        survivors = [t for t in survivors if states[t] != 'failed']
+        ranked = sorted(survivors, key=lambda t: store.trial(t)['score'])
+        print(f"  Rung with {budget} fold(s): {len(survivors)} trials, "
+              f"best Brier {store.trial(ranked[0])['score']:.4f}" if ranked else "  All trials failed")
+        if budget == len(fold_order) or not ranked:
+            break
+        keep = max(1, len(ranked) // eta)
+        for trial_id in ranked[keep:]:
+            store.set_state(trial_id, 'pruned')
+        survivors, budget = ranked[:keep], budget * eta
+    for trial_id in survivors:
+        store.set_state(trial_id, 'complete')
+
+
+def random_search(store, context, trial_ids, fold_order, jobs=1):
+    """Runs every trial on all folds with median pruning."""
+    with tracer.stage('trials', trials=len(trial_ids)):
+        states = run_batch(context, [(t, fold_order, True) for t in trial_ids], jobs)
+    for trial_id, state in states.items():
+        if state == 'running':
+            store.set_state(trial_id, 'complete')
+
+
+def run_search(model, tickers=None, method='halving', n_trials=30, jobs=1, n_folds=N_FOLDS,
+               feature_set='all', start=None, end=None, seed=RANDOM_SEED, lstm_epochs=SEARCH_LSTM_EPOCHS,
+               db_path=DB_PATH, name=None):
+    """Runs one study and returns its name."""
+    available = detect_tickers()
+    tickers = [t for t in available if t in tickers] if tickers else available
+    name = name or f"{model}-{time.strftime('%Y%m%d-%H%M%S')}"
+    cache_dir = os.path.join(SEARCH_DIR, 'cache', name)
+
+    store = TrialStore(db_path)
+    config = {'n_trials': n_trials, 'seed': seed, 'start': start, 'end': end,
+              'lstm_epochs': lstm_epochs, 'eta': HALVING_ETA}
+    store.create_study(name, model, method, tickers, feature_set, n_folds, config)
+    print(f"Study {name}: {model}, {method}, {n_trials} trials, {n_folds} folds, tickers {tickers}")
+
+    try:
+        with tracer.stage('cache_matrices'):
+            cache_matrices(tickers, feature_set, cache_dir, start, end)
+
+        context = {'study': name, 'db_path': db_path, 'model': model, 'tickers': tickers,
+                   'cache_dir': cache_dir, 'n_folds': n_folds, 'lstm_epochs': lstm_epochs}
+        trial_ids = [store.add_trial(name, i, params) for i, params in enumerate(sample_configs(model, n_trials, seed))]
+        # Most recent fold first: rungs with a small budget score on the data closest to the test period
+        fold_order = list(reversed(range(n_folds)))
+
+        start_time = time.perf_counter()
+        if method == 'halving':
+            successive_halving(store, context, trial_ids, fold_order, jobs=jobs)
+        elif method == 'random':
+            random_search(store, context, trial_ids, fold_order, jobs=jobs)
+        else:
+            raise ValueError(f"Unknown search method: {method}")
+        store.finish_study(name)
+
+        counts = store.state_counts(name)
+        print(f"Finished in {time.perf_counter() - start_time:.1f}s: "
+              + ", ".join(f"{n} {state}" for state, n in sorted(counts.items())))
+        print_top(store, name, k=5)
+    finally:
+        store.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return name
+
+
+# === Reporting ===
+
+def print_top(store, study, k=10):
+    info = store.study(study)
+    rows = store.top(study, k)
+    print(f"\nTop {len(rows)} trials of {study} ({info['model']}, {info['method']}, "
+          f"tickers {', '.join(json.loads(info['tickers']))})")
+    print(f"  {'#':>4}  {'Brier':>8}  {'Acc':>7}  {'Folds':>5}  {'Time':>7}  Params")
+    for row in rows:
+        print(f"  {row['number']:>4}  {row['score']:8.4f}  {row['accuracy']:7.2%}  {row['n_folds']:>5}  "
+              f"{row['seconds']:6.1f}s  {row['params']}")
+    if rows:
+        target = 'lstm_config.py' if info['model'] == 'lstm' else 'modelling.py'
+        print(f"\n{target} settings for the best trial:")
+        for line in modelling_settings(info['model'], json.loads(rows[0]['params'])):
+            print(f"  {line}")
+
+
+def print_studies(store):
+    print(f"{'Study':<28} {'Model':<6} {'Method':<8} {'Trials':>6} {'Best':>8}  Created")
+    for row in store.studies():
+        best = f"{row['best']:.4f}" if row['best'] is not None else '-'
+        print(f"{row['name']:<28} {row['model']:<6} {row['method']:<8} {row['trials']:>6} {best:>8}  {row['created']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hyperparameter search for the RF, LSTM and ARIMA models')
+    parser.add_argument('--db', default=DB_PATH, help=f'SQLite results store (default: {DB_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run a new study')
+    run.add_argument('--model', choices=sorted(SEARCH_SPACES), required=True)
+    run.add_argument('--method', choices=['halving', 'random'], default='halving',
+                     help='Successive halving or random search with median pruning (default: halving)')
+    run.add_argument('--trials', type=int, default=30, help='Configurations to sample (default: 30)')
+    run.add_argument('--jobs', type=int, default=os.cpu_count(), help='Worker processes (default: all cores)')
+    run.add_argument('--folds', type=int, default=N_FOLDS, help=f'Time-ordered CV folds (default: {N_FOLDS})')
+    run.add_argument('--tickers', nargs='+', help='Tickers to tune on (default: all)')
+    run.add_argument('--features', choices=['all', 'base'], default='all',
+                     help='Base + sentiment features or base only (default: all)')
+    run.add_argument('--start', help='First date of the sample')
+    run.add_argument('--end', help='Last date of the sample')
+    run.add_argument('--seed', type=int, default=RANDOM_SEED, help='Sampling seed')
+    run.add_argument('--lstm-epochs', type=int, default=SEARCH_LSTM_EPOCHS, help='Max epochs per LSTM fit')
+    run.add_argument('--name', help='Study name (default: <model>-<timestamp>)')
+    add_trace_arguments(run)
+
+    top = commands.add_parser('top', help='Best trials of a study')
+    top.add_argument('study')
+    top.add_argument('-k', type=int, default=10, help='Trials to show (default: 10)')
+
+    commands.add_parser('studies', help='List studies')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        tracer.configure(args.trace, args.profile, name='hpsearch')
+        run_search(
+            args.model, tickers=args.tickers, method=args.method, n_trials=args.trials, jobs=args.jobs,
+            n_folds=args.folds, feature_set=args.features, start=args.start, end=args.end,
+            seed=args.seed, lstm_epochs=args.lstm_epochs, db_path=args.db, name=args.name,
+        )
+        return
+
+    store = TrialStore(args.db)
+    try:
+        if args.command == 'top':
+            print_top(store, args.study, args.k)
+        else:
+            print_studies(store)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
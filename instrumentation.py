@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Pipeline instrumentation: per-stage timers, peak RSS, row/byte counters,
+optional cProfile dumps and a structured JSON trace per run.
+
+Stages are recorded by a process-wide tracer, which is a no-op until a
+script enables it (--trace / --profile, or the PIPELINE_TRACE /
+PIPELINE_PROFILE environment variables):
+
+    from instrumentation import tracer
+
+    @tracer.timed('train_rf')
+    def train_rf(...): ...
+
+    with tracer.stage('backtest', ticker=ticker):
+        ...
+        tracer.count('rows', len(test_df))   # counted on the open stage and globally
+
+Each stage event records wall and CPU seconds, RSS at start/end, the peak RSS
+sampled while it ran (background sampler, 20 Hz), counters, tags and its
+parent stage. Stages in Pool workers are collected with run_traced() and
+merged into the parent's trace.
+
+Outputs:
+    trace JSON      run metadata, every stage event, per-stage summary, counters
+    <trace>.folded  stage self-times as folded stacks ("a;b;c <ms>"), the format
+                    py-spy --format raw writes, for flamegraph.pl / speedscope
+    <dir>/*.prof    cProfile dumps per stage (pstats, snakeviz), with --profile
+
+Compare two traces:
+    python instrumentation.py compare results/traces/old.json results/traces/new.json
+"""
+
+import argparse
+import atexit
+import cProfile
+import functools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+TRACE_DIR = os.path.join('results', 'traces')
+SAMPLE_INTERVAL = 0.05  # Seconds between RSS samples
+WORKER_ENV = 'PIPELINE_TRACE_WORKER'  # Tracer settings inherited by worker processes
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak RSS of this process so far in bytes (ru_maxrss is KB on Linux, bytes on macOS)."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Stage:
+    """One open stage; becomes an event dict when it closes."""
+
+    def __init__(self, tracer, name, parent, tags):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.id = tracer._next_id()
+        self.tags = tags
+        self.counters = defaultdict(int)
+        self.profiler = None
+
+    def __enter__(self):
+        self.rss_start = current_rss()
+        self.peak = self.rss_start
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.tracer._push(self)
+        if self.tracer._should_profile(self.name):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Another profiler is already active (nested stage or other thread)
+                self.profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.tracer._dump_profile(self.name, self.profiler)
+        seconds = time.perf_counter() - self.start
+        rss_end = current_rss()
+        self.tracer._pop(self)
+        self.tracer._record({
+            'id': self.id,
+            'name': self.name,
+            'parent': self.parent.name if self.parent else None,
+            'parent_id': self.parent.id if self.parent else None,
+            'start': self.wall_start - self.tracer.started_at,
+            'seconds': seconds,
+            'cpu_seconds': time.process_time() - self.cpu_start,
+            'rss_start_mb': self.rss_start / 2**20,
+            'rss_end_mb': rss_end / 2**20,
+            'peak_rss_mb': max(self.peak, rss_end) / 2**20,
+            'counters': dict(self.counters),
+            'tags': self.tags,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'error': exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+
+class NullStage:
+    """Stand-in for Stage while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Tracer:
+    """Collects stage events and counters for one process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.profile_dir = None
+        self.profile_stages = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.events = []
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open_stages = set()
+        self.sampler = None
+        self.profile_count = 0
+        self.stage_count = 0
+
+    # --- Setup ---
+
+    def configure(self, trace=None, profile=None, profile_stages=None, name=None):
+        """
+        Enables tracing. trace: JSON output path ('auto' -> results/traces/<name>-<time>.json);
+        profile: directory for per-stage cProfile dumps; profile_stages: stage names to
+        profile (default: every stage that is not nested in a profiled one).
+        Defaults come from PIPELINE_TRACE / PIPELINE_PROFILE.
+        """
+        trace = trace or os.environ.get('PIPELINE_TRACE')
+        profile = profile or os.environ.get('PIPELINE_PROFILE')
+        if not trace and not profile:
+            return self
+        name = name or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        if trace == 'auto' or (profile and not trace):
+            trace = os.path.join(TRACE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        self.name = name
+        self.trace_path = trace
+        self.profile_dir = profile
+        self.profile_stages = set(profile_stages) if profile_stages else None
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.cpu_started = time.process_time()
+        self._start_sampler()
+        os.environ[WORKER_ENV] = json.dumps({
+            'started_at': self.started_at, 'profile': profile, 'profile_stages': profile_stages,
+        })
+        atexit.register(self.finish)
+        return self
+
+    def configure_worker(self):
+        """Enables recording (no trace file) in a worker process started by a traced parent."""
+        if self.enabled or WORKER_ENV not in os.environ:
+            return
+        settings = json.loads(os.environ[WORKER_ENV])
+        self.started_at = settings['started_at']
+        self.profile_dir = settings['profile']
+        self.profile_stages = set(settings['profile_stages']) if settings['profile_stages'] else None
+        self.enabled = True
+        self._start_sampler()
+
+    # --- Recording API ---
+
+    def stage(self, name, **tags):
+        """Context manager timing one stage; tags (e.g. ticker=...) are stored on the event."""
+        if not self.enabled:
+            return NULL_STAGE
+        stack = self._stack()
+        return Stage(self, name, stack[-1] if stack else None, tags)
+
+    def timed(self, name=None):
+        """Decorator form of stage(); the stage name defaults to the function name."""
+        def decorator(fn):
+            stage_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.stage(stage_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        """Adds n to a counter, both globally and on the innermost open stage of this thread."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        if stack:
+            stack[-1].counters[name] += n
+        with self.lock:
+            self.counters[name] += n
+
+    # --- Worker processes ---
+
+    def drain(self):
+        """Removes and returns this process's events and counters (see run_traced)."""
+        with self.lock:
+            payload = {'events': self.events, 'counters': dict(self.counters)}
+            self.events, self.counters = [], defaultdict(int)
+        return payload
+
+    def merge(self, payload):
+        """Adds events and counters drained in a worker process."""
+        if not self.enabled or not payload:
+            return
+        with self.lock:
+            self.events.extend(payload['events'])
+            for name, n in payload['counters'].items():
+                self.counters[name] += n
+
+    # --- Output ---
+
+    def summary(self):
+        """Per-stage aggregates: calls, total/mean/max seconds, CPU seconds, peak RSS and counters."""
+        stages = {}
+        for event in self.events:
+            s = stages.setdefault(event['name'], {
+                'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'cpu_seconds': 0.0,
+                'peak_rss_mb': 0.0, 'counters': defaultdict(int),
+            })
+            s['calls'] += 1
+            s['total_seconds'] += event['seconds']
+            s['max_seconds'] = max(s['max_seconds'], event['seconds'])
+            s['cpu_seconds'] += event['cpu_seconds']
+            s['peak_rss_mb'] = max(s['peak_rss_mb'], event['peak_rss_mb'])
+            for name, n in event['counters'].items():
+                s['counters'][name] += n
+        for s in stages.values():
+            s['mean_seconds'] = s['total_seconds'] / s['calls']
+            s['counters'] = dict(s['counters'])
+        return stages
+
+    def folded(self):
+        """Stage self-times (ms) as folded stacks: each stage's time minus its children's."""
+        by_id = {event['id']: event for event in self.events}
+        child_seconds = defaultdict(float)
+        for event in self.events:
+            if event['parent_id'] in by_id:
+                child_seconds[event['parent_id']] += event['seconds']
+        totals = defaultdict(float)
+        for event in self.events:
+            path, parent = [event['name']], by_id.get(event['parent_id'])
+            while parent is not None:
+                path.append(parent['name'])
+                parent = by_id.get(parent['parent_id'])
+            totals[';'.join(reversed(path))] += max(event['seconds'] - child_seconds[event['id']], 0.0) * 1000
+        return dict(totals)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'argv': sys.argv,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'wall_seconds': time.perf_counter() - self.started,
+            'cpu_seconds': time.process_time() - self.cpu_started,
+            'peak_rss_mb': peak_rss() / 2**20,
+            'git_commit': git_commit(),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'summary': self.summary(),
+            'counters': dict(self.counters),
+            'stages': self.events,
+        }
+
+    def finish(self):
+        """Writes the JSON trace and folded stacks (once); prints a per-stage table."""
+        if not self.enabled or self.trace_path is None:
+            return
+        path, self.trace_path = self.trace_path, None
+        trace = self.to_dict()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=2, default=str)
+        with open(f"{os.path.splitext(path)[0]}.folded", 'w') as f:
+            for stack, ms in self.folded().items():
+                f.write(f"{stack} {int(round(ms))}\n")
+        print_summary(trace)
+        print(f"Trace saved to {path}")
+
+    # --- Internals ---
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def _push(self, stage):
+        self._stack().append(stage)
+        with self.lock:
+            self.open_stages.add(stage)
+
+    def _pop(self, stage):
+        stack = self._stack()
+        if stack and stack[-1] is stage:
+            stack.pop()
+        with self.lock:
+            self.open_stages.discard(stage)
+
+    def _next_id(self):
+        with self.lock:
+            self.stage_count += 1
+            return f"{os.getpid()}-{self.stage_count}"
+
+    def _record(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def _start_sampler(self):
+        if self.sampler is None or not self.sampler.is_alive():
+            self.sampler = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+            self.sampler.start()
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            with self.lock:
+                for stage in self.open_stages:
+                    stage.peak = max(stage.peak, rss)
+            time.sleep(SAMPLE_INTERVAL)
+
+    def _should_profile(self, name):
+        if not self.profile_dir:
+            return False
+        if self.profile_stages is not None:
+            return name in self.profile_stages
+        # By default only profile stages not nested inside another stage of this thread
+        return len(self._stack()) == 1
+
+    def _dump_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self.lock:
+            self.profile_count += 1
+            n = self.profile_count
+        profiler.dump_stats(os.path.join(self.profile_dir, f"{name}-{os.getpid()}-{n}.prof"))
+
+
+tracer = Tracer()
+
+
+def run_traced(fn, *args):
+    """
+    Runs fn(*args) in a worker process and returns (result, trace payload);
+    the parent passes the payload to tracer.merge(). Use with
+    functools.partial(run_traced, fn) as the Pool task.
+    """
+    tracer.configure_worker()
+    tracer.drain()  # Drop events inherited from the parent on fork
+    result = fn(*args)
+    return result, tracer.drain()
+
+
+def add_trace_arguments(parser):
+    """Adds --trace / --profile options to a script's argument parser."""
+    parser.add_argument('--trace', nargs='?', const='auto', default=None, metavar='PATH',
+                        help=f'Write a JSON stage trace (default path: {TRACE_DIR}/<script>-<time>.json)')
+    parser.add_argument('--profile', metavar='DIR', default=None,
+                        help='Write cProfile dumps per top-level stage to DIR')
+
+
+class LatencyTracker:
+    """Keeps recent latencies (serving requests, watched files) and reports percentiles."""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds * 1000)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'requests': self.count}
+        import numpy as np  # Only needed once there are samples; keeps tracer imports stdlib-only
+        arr = np.fromiter(self.samples, dtype=np.float64)
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        return {'requests': self.count, 'p50_ms': float(p50), 'p95_ms': float(p95),
+                'p99_ms': float(p99), 'max_ms': float(arr.max())}
+
+
+def print_summary(trace):
+    print("\n=== Stage Timings ===")
+    print(f"{'Stage':<28}{'Calls':>7}{'Total s':>10}{'Mean s':>10}{'CPU s':>10}{'Peak MB':>10}")
+    rows = sorted(trace['summary'].items(), key=lambda kv: kv[1]['total_seconds'], reverse=True)
+    for name, s in rows:
+        print(f"{name:<28}{s['calls']:>7}{s['total_seconds']:>10.3f}{s['mean_seconds']:>10.4f}"
+              f"{s['cpu_seconds']:>10.3f}{s['peak_rss_mb']:>10.1f}")
+    print(f"Wall {trace['wall_seconds']:.2f}s, CPU {trace['cpu_seconds']:.2f}s, peak RSS {trace['peak_rss_mb']:.1f} MB")
+    if trace['counters']:
+        print("Counters: " + ", ".join(f"{k}={v:,}" for k, v in sorted(trace['counters'].items())))
+
+
+def compare(old_path, new_path):
+    """Prints per-stage total time of two traces and the relative change."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"Old: {old_path} ({old.get('git_commit')}, {old['started']})")
+    print(f"New: {new_path} ({new.get('git_commit')}, {new['started']})\n")
+    print(f"{'Stage':<28}{'Old s':>10}{'New s':>10}{'Change':>10}")
+    for name in sorted(set(old['summary']) | set(new['summary'])):
+        a = old['summary'].get(name, {}).get('total_seconds')
+        b = new['summary'].get(name, {}).get('total_seconds')
+        change = f"{(b - a) / a:+.1%}" if a and b is not None else 'n/a'
+        print(f"{name:<28}{a if a is not None else float('nan'):>10.3f}"
+              f"{b if b is not None else float('nan'):>10.3f}{change:>10}")
+    print(f"{'(wall)':<28}{old['wall_seconds']:>10.3f}{new['wall_seconds']:>10.3f}"
+          f"{(new['wall_seconds'] - old['wall_seconds']) / old['wall_seconds']:>+10.1%}")
+    print(f"{'(peak RSS MB)':<28}{old['peak_rss_mb']:>10.1f}{new['peak_rss_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect pipeline traces')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help='Print the stage table of a trace')
+    show.add_argument('trace')
+    cmp_parser = sub.add_parser('compare', help='Compare stage timings of two traces')
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        with open(args.trace) as f:
+            print_summary(json.load(f))
+    else:
+        compare(args.old, args.new)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Intraday GKG sentiment bars from the GDELT 2.0 15-minute update files, and
+per-exchange session features aligned to each market's close.
+
+ingest() reads every *.gkg.csv in V2_DATA_DIR (as written by
+`fetch-gdelt.py --v2`) in a process pool, keeping only DATE, Themes and V2Tone
+and the economic records (KEEP_THEMES), and reduces each file to 15-minute
+sums (records, tone, tone squared, polarity). The sums are appended to
+INTRADAY_PARTIALS_PATH and every finished file is logged, so re-running after
+each fetch only reads the new files. A GKG record's DATE is the end of the
+15-minute batch it was published in; bars are labelled by that end time in UTC.
+
+session_signals() assigns every bar to the trading session of each exchange in
+EXCHANGE_CLOSES. A bar published strictly before that day's close (local wall
+clock, DST-aware) counts towards that day, later bars roll to the next
+business day. The row for trading day D therefore holds only news available
+before D's close, and it lines up with modelling's next-day Target. Exchange
+holidays are not modelled; news on a holiday lands on the holiday's date.
+
+Usage:
+    python intraday.py ingest                     # New v2 GKG files -> 15-minute partial sums
+    python intraday.py bars --freq 1h             # 15m/1h bars -> results/intraday_bars_1h.csv
+    python intraday.py sessions                   # Per-ticker session columns -> results/session_sentiment.csv
+"""
+
+import argparse
+import csv
+import glob
+import os
+import time
+from datetime import time as clock
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from instrumentation import run_traced, tracer
+
+V2_DATA_DIR = os.path.join('data', 'v2')
+INTRADAY_PARTIALS_PATH = os.path.join('results', 'intraday_partials.csv')
+INTRADAY_LOG = 'processed_intraday_log.txt'
+SESSION_SENTIMENT_PATH = os.path.join('results', 'session_sentiment.csv')
+CPU_CORES = max(1, cpu_count() - 1)
+CHUNK_SIZE = 8            # 15-minute files handed to a worker at a time (they are small)
+
+BAR = pd.Timedelta('15min')
+
+# Economic themes counted in the bars (same substrings as process-gdelt.py's KEEP_THEMES)
+KEEP_THEMES = [
+    "ECON_", "TAX_", "BUS_",
+    "WB_470", "WB_325", "WB_1104", "WB_698", "WB_2433",
+    "IMF", "WORLD_BANK", "FED", "CENTRAL_BANK"
+]
+
+# Ticker -> (exchange time zone, regular-session close in local time)
+EXCHANGE_CLOSES = {
+    'SPX': ('America/New_York', clock(16, 0)),
+    'NDX': ('America/New_York', clock(16, 0)),
+    'DJI': ('America/New_York', clock(16, 0)),
+    'AAPL': ('America/New_York', clock(16, 0)),
+    'MSFT': ('America/New_York', clock(16, 0)),
+    'NVDA': ('America/New_York', clock(16, 0)),
+    'DAX': ('Europe/Berlin', clock(17, 30)),
+    'NKX': ('Asia/Tokyo', clock(15, 30)),
+}
+
+# GKG 2.0 positions of DATE, Themes and V2Tone
+GKG_V2_COLUMNS = {1: 'DATE', 7: 'Themes', 15: 'V2Tone'}
+SUMS = ['count', 'tone_sum', 'tone_sq', 'polarity_sum']
+
+
+@tracer.timed()
+def aggregate_file(file_path):
+    """Worker: one 15-minute GKG file -> (file_path, per-bar sums or None)."""
+    try:
+        tracer.count('bytes_read', os.path.getsize(file_path))
+        df = pd.read_csv(
+            file_path,
+            sep='\t',
+            header=None,
+            usecols=list(GKG_V2_COLUMNS),
+            dtype=str,
+            on_bad_lines='skip',
+            encoding='utf-8',
+            encoding_errors='replace',
+            quoting=csv.QUOTE_NONE,
+        ).rename(columns=GKG_V2_COLUMNS)
+        tracer.count('rows_read', len(df))
+
+        pattern = '|'.join(KEEP_THEMES)
+        df = df[df['Themes'].str.contains(pattern, regex=True, na=False)]
+        tone = df['V2Tone'].str.split(',', n=4, expand=True)
+        if df.empty or tone.shape[1] < 4:
+            return (file_path, None)
+        avg = pd.to_numeric(tone[0], errors='coerce')
+        polarity = pd.to_numeric(tone[3], errors='coerce')
+        bar_end = pd.to_datetime(df['DATE'], format='%Y%m%d%H%M%S', errors='coerce').dt.ceil(BAR)
+        valid = avg.notna() & bar_end.notna()
+        tracer.count('rows_kept', int(valid.sum()))
+        if not valid.any():
+            return (file_path, None)
+
+        sums = pd.DataFrame({
+            'bar_end': bar_end[valid],
+            'count': 1,
+            'tone_sum': avg[valid],
+            'tone_sq': avg[valid] ** 2,
+            'polarity_sum': polarity[valid].fillna(0.0),
+        }).groupby('bar_end')[SUMS].sum().reset_index()
+        return (file_path, sums)
+
+    except Exception as e:
+        return (file_path, None)
+
+
+def ingest(data_dir=V2_DATA_DIR, partials_path=INTRADAY_PARTIALS_PATH, log_path=INTRADAY_LOG,
+           processes=CPU_CORES):
+    """Aggregates every not-yet-logged v2 GKG file into the 15-minute partial sums."""
+    processed = set()
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            processed = set(f.read().splitlines())
+    files = sorted(glob.glob(os.path.join(data_dir, '*.gkg.csv')))
+    todo = [f for f in files if os.path.basename(f) not in processed]
+    print(f"Total files: {len(files)}")
+    print(f"Already processed: {len(processed)}")
+    print(f"Remaining: {len(todo)}")
+    if not todo:
+        return 0
+
+    os.makedirs(os.path.dirname(partials_path) or '.', exist_ok=True)
+    if not os.path.exists(partials_path):
+        with open(partials_path, 'w') as f:
+            f.write(','.join(['bar_end', *SUMS]) + "\n")
+
+    start = time.perf_counter()
+    with open(partials_path, 'a') as out, open(log_path, 'a') as log, Pool(processes=processes) as pool:
+        iterator = pool.imap_unordered(partial(run_traced, aggregate_file), todo, chunksize=CHUNK_SIZE)
+        for (file_path, sums), trace in tqdm(iterator, total=len(todo), unit="file"):
+            tracer.merge(trace)
+            if sums is not None:
+                sums.to_csv(out, header=False, index=False, date_format='%Y-%m-%d %H:%M:%S')
+                out.flush()
+            log.write(os.path.basename(file_path) + "\n")
+            log.flush()  # Right after its partials, so an interrupted run does not re-add the file
+    elapsed = time.perf_counter() - start
+    print(f"Aggregated {len(todo)} files in {elapsed:.1f}s ({len(todo) / max(elapsed, 1e-9):.1f} files/s)")
+    return len(todo)
+
+
+def load_partials(partials_path=INTRADAY_PARTIALS_PATH):
+    """15-minute sums indexed by bar end (UTC); files split across runs are summed."""
+    partials = pd.read_csv(partials_path, parse_dates=['bar_end'])
+    sums = partials.groupby('bar_end')[SUMS].sum().sort_index()
+    sums.index = sums.index.tz_localize('UTC')
+    return sums
+
+
+def bar_stats(sums):
+    """Tone mean/std, mean polarity and record count from summed statistics."""
+    count = sums['count'].to_numpy(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums['tone_sum'].to_numpy() / count
+        var = (sums['tone_sq'].to_numpy() - count * mean ** 2) / (count - 1)
+    return pd.DataFrame({
+        'Sentiment': mean,
+        'Disagreement': np.sqrt(np.clip(var, 0, None)),
+        'Volatility': sums['polarity_sum'].to_numpy() / count,
+        'Volume': sums['count'].to_numpy(np.int64),
+    }, index=sums.index)
+
+
+def build_bars(sums, freq='15min'):
+    """Bars of the given frequency, labelled by their end time (UTC)."""
+    grouped = sums.groupby(sums.index.ceil(freq)).sum()
+    grouped.index.name = 'bar_end'
+    return bar_stats(grouped)
+
+
+def session_dates(bar_end, tz, close):
+    """Trading date (datetime64[D]) whose close is the first one strictly after each bar end."""
+    local = bar_end.tz_convert(tz).tz_localize(None)  # Wall clock, so DST shifts need no special case
+    day = local.normalize()
+    close_offset = pd.Timedelta(hours=close.hour, minutes=close.minute)
+    after_close = (local - day) >= close_offset
+    dates = (day + pd.to_timedelta(after_close.astype(int), unit='D')).values.astype('datetime64[D]')
+    return np.busday_offset(dates, 0, roll='forward')
+
+
+def session_signals(sums, closes=EXCHANGE_CLOSES):
+    """Wide daily frame with <ticker>_Session_Sentiment/_Disagreement/_Volume per exchange close."""
+    frames = []
+    for ticker, (tz, close) in closes.items():
+        dates = session_dates(sums.index, tz, close)
+        daily = bar_stats(sums.groupby(dates).sum())[['Sentiment', 'Disagreement', 'Volume']]
+        frames.append(daily.add_prefix(f"{ticker}_Session_"))
+    wide = pd.concat(frames, axis=1).sort_index()
+    volume = [c for c in wide.columns if c.endswith('_Volume')]
+    wide[volume] = wide[volume].fillna(0).astype(np.int64)
+    wide.index = pd.DatetimeIndex(wide.index, name='Date')
+    return wide
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Intraday GKG sentiment bars and exchange-session features')
+    parser.add_argument('--partials', default=INTRADAY_PARTIALS_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('ingest', help='Aggregate new 15-minute GKG files')
+    run.add_argument('-d', '--data-dir', default=V2_DATA_DIR)
+    run.add_argument('-w', '--workers', type=int, default=CPU_CORES)
+    bars = commands.add_parser('bars', help='Write sentiment bars')
+    bars.add_argument('--freq', default='15min', help='Bar length, e.g. 15min or 1h (default: 15min)')
+    bars.add_argument('--output', default=None)
+    sessions = commands.add_parser('sessions', help='Write per-ticker session sentiment')
+    sessions.add_argument('--output', default=SESSION_SENTIMENT_PATH)
+    args = parser.parse_args()
+    tracer.configure()
+
+    if args.command == 'ingest':
+        ingest(args.data_dir, args.partials, processes=args.workers)
+    elif args.command == 'bars':
+        out = args.output or os.path.join('results', f"intraday_bars_{args.freq}.csv")
+        bars = build_bars(load_partials(args.partials), args.freq)
+        bars.to_csv(out)
+        print(f"Saved {out}: {len(bars)} bars ({bars.index.min()} to {bars.index.max()})")
+    else:
+        wide = session_signals(load_partials(args.partials))
+        wide.to_csv(args.output)
+        print(f"Saved {args.output}: {len(wide)} sessions, tickers {sorted(EXCHANGE_CLOSES)}")
+
+
+if __name__ == '__main__':
+    main()
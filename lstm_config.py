@@ -0,0 +1,26 @@
+"""
+LSTM settings read by lstm_models.py (modelling.py only needs SEQ_LEN).
+
+Kept in their own module so lstm_models does not import modelling: with
+`python modelling.py` that import would execute modelling.py a second time
+(as `modelling`, next to `__main__`). Edit the values here; lstm_models binds
+them as function defaults when it is first imported, so setting them on
+another module at runtime has no effect.
+"""
+
+SEQ_LEN = 10  # Sequence length for LSTM
+
+LSTM_HIDDEN_DIM = 64
+LSTM_NUM_LAYERS = 2
+LSTM_DROPOUT = 0.3
+
+# LSTM training engine
+LSTM_MAX_EPOCHS = 50
+LSTM_BATCH_SIZE = 32
+LSTM_BASE_LR = 0.001        # Learning rate at LSTM_REF_BATCH_SIZE
+LSTM_REF_BATCH_SIZE = 32    # LR is scaled by sqrt(batch_size / LSTM_REF_BATCH_SIZE)
+LSTM_VAL_RATIO = 0.1        # Chronological tail of training windows used for early stopping
+LSTM_PATIENCE = 5           # Epochs without val-loss improvement before stopping
+LSTM_MIN_DELTA = 1e-4
+LSTM_NUM_THREADS = None     # None keeps torch's default intra-op thread count
+LSTM_COMPILE = None         # None, 'compile' (torch.compile) or 'script' (TorchScript)
@@ -0,0 +1,405 @@
+"""
+LSTM models and training loops used by modelling.py.
+
+Kept in their own module so torch is only imported when an LSTM is actually
+trained or loaded: modelling.py imports this lazily (and re-exports its names),
+so RF/ARIMA-only runs, the feature tooling and serving.py's RF path start
+without torch.
+"""
+
+import copy
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import StandardScaler
+from torch.utils.data import DataLoader, Dataset, BatchSampler, SubsetRandomSampler
+
+from instrumentation import tracer
+from lstm_config import (
+    LSTM_BASE_LR, LSTM_BATCH_SIZE, LSTM_COMPILE, LSTM_DROPOUT, LSTM_HIDDEN_DIM, LSTM_MAX_EPOCHS,
+    LSTM_MIN_DELTA, LSTM_NUM_LAYERS, LSTM_NUM_THREADS, LSTM_PATIENCE, LSTM_REF_BATCH_SIZE,
+    LSTM_VAL_RATIO, SEQ_LEN,
+)
+
+
+class LSTMModel(nn.Module):
+    def __init__(self, input_dim, hidden_dim=LSTM_HIDDEN_DIM, num_layers=LSTM_NUM_LAYERS, dropout=LSTM_DROPOUT):
+        super(LSTMModel, self).__init__()
+        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True, dropout=dropout)
+        self.fc = nn.Linear(hidden_dim, 1)
+        self.sigmoid = nn.Sigmoid()
+        
+    def forward(self, x):
+        out, _ = self.lstm(x)
+        out = self.fc(out[:, -1, :]) # Last time step
+        return self.sigmoid(out)
+
+def create_sequences(X, y, seq_len=SEQ_LEN):
+    """
+    Builds LSTM input windows as a zero-copy strided view.
+    Window i covers X[i:i + seq_len] and is paired with target y[i + seq_len],
+    giving arrays of shape (N - seq_len, seq_len, F) and (N - seq_len,), both float32.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    if len(X) <= seq_len:
+        return np.empty((0, seq_len, X.shape[1]), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+    # sliding_window_view yields (N - seq_len + 1, F, seq_len); drop the last window
+    # (it has no next-step target) and swap axes to (batch, time, features).
+    windows = sliding_window_view(X, seq_len, axis=0)[:-1].transpose(0, 2, 1)
+    return windows, y[seq_len:]
+
+class WindowDataset(Dataset):
+    """
+    Lazy sequence dataset over strided windows.
+    Indexed with a list of positions (via BatchSampler), so only the requested
+    batch is ever materialised as a contiguous tensor.
+    """
+    def __init__(self, X, y, seq_len=SEQ_LEN):
+        self.windows, self.targets = create_sequences(X, y, seq_len)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        idx = np.atleast_1d(idx)
+        return torch.from_numpy(self.windows[idx]), torch.from_numpy(self.targets[idx])
+
+def make_window_loader(dataset, batch_size=LSTM_BATCH_SIZE, indices=None, shuffle=False):
+    """
+    DataLoader yielding whole batches from a WindowDataset.
+    `indices` restricts it to a subset of windows (e.g. the training part of a
+    chronological split); order is chronological unless shuffle=True.
+    """
+    indices = range(len(dataset)) if indices is None else indices
+    sampler = SubsetRandomSampler(indices) if shuffle else indices
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False), batch_size=None)
+
+def compile_lstm(model, mode=LSTM_COMPILE):
+    """
+    Optionally wraps the model with torch.compile or TorchScript.
+    Both share parameters with `model`, so the original module can still be
+    used for state_dict snapshots and is what train_lstm returns.
+    """
+    if mode is None:
+        return model
+    if mode == 'compile':
+        return torch.compile(model)
+    if mode == 'script':
+        return torch.jit.script(model)
+    raise ValueError(f"Unknown compile mode: {mode}")
+
+def evaluate_loss(net, loader, criterion):
+    """Mean loss over every window in loader (no gradient)."""
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for X_batch, y_batch in loader:
+            total += criterion(net(X_batch), y_batch.unsqueeze(1)).item() * len(y_batch)
+            count += len(y_batch)
+    return total / count if count else float('nan')
+
+@tracer.timed()
+def train_lstm(X_train, y_train, X_test, y_test, input_dim,
+               epochs=LSTM_MAX_EPOCHS, batch_size=LSTM_BATCH_SIZE, val_ratio=LSTM_VAL_RATIO,
+               patience=LSTM_PATIENCE, shuffle=False, num_threads=LSTM_NUM_THREADS,
+               compile_mode=LSTM_COMPILE, verbose=True, seq_len=SEQ_LEN, hidden_dim=LSTM_HIDDEN_DIM,
+               num_layers=LSTM_NUM_LAYERS, dropout=LSTM_DROPOUT, lr=None):
+    """
+    Trains an LSTMModel on sliding windows of the (scaled) training features.
+    The last `val_ratio` of training windows is held out in time order for
+    early stopping; the best-validation weights are restored before predicting.
+    Predictions cover test windows only, i.e. they align with y_test.iloc[seq_len:].
+    lr=None scales LSTM_BASE_LR with the batch size.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    # Scale data (float32 in, float32 out)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(np.asarray(X_train, dtype=np.float32))
+    X_test_scaled = scaler.transform(np.asarray(X_test, dtype=np.float32))
+    
+    train_data = WindowDataset(X_train_scaled, np.asarray(y_train), seq_len)
+    test_data = WindowDataset(X_test_scaled, np.asarray(y_test), seq_len)
+
+    # Chronological validation tail (no shuffling across the split)
+    n_val = int(len(train_data) * val_ratio) if patience else 0
+    n_fit = len(train_data) - n_val
+    train_loader = make_window_loader(train_data, batch_size, indices=range(n_fit), shuffle=shuffle)
+    val_loader = make_window_loader(train_data, 1024, indices=range(n_fit, len(train_data))) if n_val else None
+    
+    model = LSTMModel(input_dim, hidden_dim, num_layers, dropout)
+    net = compile_lstm(model, compile_mode)
+    criterion = nn.BCELoss()
+    if lr is None:
+        lr = LSTM_BASE_LR * np.sqrt(batch_size / LSTM_REF_BATCH_SIZE)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    
+    # Train
+    best_loss, best_state, best_epoch, stale = float('inf'), None, 0, 0
+    epoch = -1  # Reported as 0 epochs when epochs=0
+    train_start = time.perf_counter()
+    for epoch in range(epochs):
+        model.train()
+        epoch_start = time.perf_counter()
+        running, seen = 0.0, 0
+        for X_batch, y_batch in train_loader:
+            optimizer.zero_grad()
+            y_pred = net(X_batch)
+            loss = criterion(y_pred, y_batch.unsqueeze(1))
+            loss.backward()
+            optimizer.step()
+            running += loss.item() * len(y_batch)
+            seen += len(y_batch)
+        train_loss = running / max(seen, 1)
+
+        # Early stopping monitors val loss, or train loss when there is no val tail
+        if val_loader is not None:
+            model.eval()
+            monitor = evaluate_loss(net, val_loader, criterion)
+        else:
+            monitor = train_loss
+        elapsed = time.perf_counter() - epoch_start
+
+        if verbose:
+            print(f"  Epoch {epoch + 1:>3}/{epochs} - loss {train_loss:.4f}"
+                  + (f" - val_loss {monitor:.4f}" if val_loader is not None else "")
+                  + f" - {elapsed:.2f}s ({seen / elapsed:,.0f} samples/s)")
+
+        if monitor < best_loss - LSTM_MIN_DELTA:
+            best_loss, best_epoch, stale = monitor, epoch + 1, 0
+            if patience:
+                best_state = copy.deepcopy(model.state_dict())
+        else:
+            stale += 1
+            if patience and stale >= patience:
+                break
+
+    if patience and best_state is not None:
+        model.load_state_dict(best_state)
+    if verbose:
+        print(f"LSTM trained {epoch + 1} epochs in {time.perf_counter() - train_start:.2f}s "
+              f"(best epoch {best_epoch}, batch {batch_size}, lr {lr:.5f})")
+            
+    # Predict
+    model.eval()
+    probs = []
+    with torch.no_grad():
+        for X_batch, _ in make_window_loader(test_data, batch_size=1024):
+            probs.append(net(X_batch).numpy().flatten())
+    probs = np.concatenate(probs) if probs else np.empty(0, dtype=np.float32)
+    preds = (probs > 0.5).astype(int)
+        
+    model.scaler = scaler  # Needed to score new windows outside train_lstm (serving.py)
+    return preds, probs, model
+
+class GroupedLSTMModel(nn.Module):
+    """
+    A stack of independent LSTMModel-equivalents, one per group (ticker),
+    evaluated together with batched matmuls. Each group has its own weights,
+    so gradients never mix between groups; only the compute is shared.
+    Input shape is (groups, batch, seq_len, features).
+    """
+    def __init__(self, n_groups, input_dim, hidden_dim=LSTM_HIDDEN_DIM, num_layers=LSTM_NUM_LAYERS,
+                 dropout=LSTM_DROPOUT):
+        super(GroupedLSTMModel, self).__init__()
+        self.hidden_dim = hidden_dim
+        self.num_layers = num_layers
+        self.dropout = nn.Dropout(dropout)
+        bound = 1 / np.sqrt(hidden_dim)
+
+        def uniform(*shape):
+            return nn.Parameter(torch.empty(*shape).uniform_(-bound, bound))
+
+        # Gate order follows nn.LSTM: input, forget, cell, output
+        self.w_ih = nn.ParameterList([uniform(n_groups, input_dim if l == 0 else hidden_dim, 4 * hidden_dim)
+                                      for l in range(num_layers)])
+        self.w_hh = nn.ParameterList([uniform(n_groups, hidden_dim, 4 * hidden_dim) for _ in range(num_layers)])
+        self.b = nn.ParameterList([uniform(n_groups, 1, 4 * hidden_dim) for _ in range(num_layers)])
+        self.fc_w = uniform(n_groups, hidden_dim, 1)
+        self.fc_b = uniform(n_groups, 1, 1)
+
+    def forward(self, x):
+        n_groups, batch, seq_len, _ = x.shape
+        out = x
+        for layer in range(self.num_layers):
+            # Input projection for every time step at once: (G, B, T, 4H)
+            x_proj = torch.einsum('gbtf,gfh->gbth', out, self.w_ih[layer]) + self.b[layer].unsqueeze(1)
+            h = x.new_zeros(n_groups, batch, self.hidden_dim)
+            c = x.new_zeros(n_groups, batch, self.hidden_dim)
+            steps = []
+            for t in range(seq_len):
+                gates = x_proj[:, :, t] + torch.bmm(h, self.w_hh[layer])
+                i, f, g, o = gates.chunk(4, dim=-1)
+                c = torch.sigmoid(f) * c + torch.sigmoid(i) * torch.tanh(g)
+                h = torch.sigmoid(o) * torch.tanh(c)
+                steps.append(h)
+            out = torch.stack(steps, dim=2)
+            if layer < self.num_layers - 1:
+                out = self.dropout(out)
+        return torch.sigmoid(torch.bmm(out[:, :, -1], self.fc_w) + self.fc_b)
+
+def stack_group_batch(datasets, index_lists):
+    """
+    Gathers one batch per group into a padded (G, B, T, F) tensor.
+    Returns inputs, targets (G, B) and a float mask marking real (non-padded) windows.
+    """
+    width = max((len(idx) for idx in index_lists), default=0)
+    ref = datasets[0].windows
+    X = np.zeros((len(datasets), width) + ref.shape[1:], dtype=np.float32)
+    y = np.zeros((len(datasets), width), dtype=np.float32)
+    mask = np.zeros((len(datasets), width), dtype=np.float32)
+    for g, (ds, idx) in enumerate(zip(datasets, index_lists)):
+        X[g, :len(idx)] = ds.windows[idx]
+        y[g, :len(idx)] = ds.targets[idx]
+        mask[g, :len(idx)] = 1.0
+    return torch.from_numpy(X), torch.from_numpy(y), torch.from_numpy(mask)
+
+def masked_group_loss(probs, y, mask):
+    """Per-group mean BCE over real windows, shape (G,)."""
+    eps = 1e-7
+    probs = probs.clamp(eps, 1 - eps)
+    bce = -(y * torch.log(probs) + (1 - y) * torch.log(1 - probs)) * mask
+    return bce.sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+class GroupAdam:
+    """
+    Adam with its moments and step count kept per group (dim 0 of every
+    parameter). step(active) moves only the active groups, so a group whose
+    batch is all padding, or that has stopped early, is not stepped by its
+    leftover momentum; each group follows torch.optim.Adam on its own.
+    """
+    def __init__(self, params, n_groups, lr, betas=(0.9, 0.999), eps=1e-8):
+        self.params = list(params)
+        self.lr, self.betas, self.eps = lr, betas, eps
+        self.exp_avg = [torch.zeros_like(p) for p in self.params]
+        self.exp_avg_sq = [torch.zeros_like(p) for p in self.params]
+        self.steps = torch.zeros(n_groups)
+
+    def zero_grad(self):
+        for p in self.params:
+            p.grad = None
+
+    @torch.no_grad()
+    def step(self, active):
+        beta1, beta2 = self.betas
+        self.steps += active
+        steps = self.steps.clamp(min=1)  # Groups that never stepped are inactive and left untouched
+        step_size = self.lr / (1 - beta1 ** steps)
+        bias_correction2_sqrt = (1 - beta2 ** steps).sqrt()
+        for p, exp_avg, exp_avg_sq in zip(self.params, self.exp_avg, self.exp_avg_sq):
+            if p.grad is None:
+                continue
+            shape = (-1,) + (1,) * (p.dim() - 1)
+            a = active.view(shape)
+            exp_avg.copy_(torch.where(a, exp_avg * beta1 + p.grad * (1 - beta1), exp_avg))
+            exp_avg_sq.copy_(torch.where(a, exp_avg_sq * beta2 + p.grad * p.grad * (1 - beta2), exp_avg_sq))
+            denom = exp_avg_sq.sqrt() / bias_correction2_sqrt.view(shape) + self.eps
+            p.sub_(torch.where(a, step_size.view(shape) * exp_avg / denom, torch.zeros_like(p)))
+
+@tracer.timed()
+def train_lstm_multi(datasets, input_dim, epochs=LSTM_MAX_EPOCHS, batch_size=LSTM_BATCH_SIZE,
+                     val_ratio=LSTM_VAL_RATIO, patience=LSTM_PATIENCE, num_threads=LSTM_NUM_THREADS,
+                     verbose=True):
+    """
+    Trains one independent LSTM per ticker in a single batched job.
+    `datasets` maps ticker -> (X_train, y_train, X_test, y_test), as for train_lstm.
+    Every step takes the next chronological batch of each ticker, so each group
+    sees the same batches it would see on its own. GroupAdam steps a group only
+    while it has real windows in the batch and has not run out of patience, so
+    its updates follow its standalone training (init and dropout draws differ).
+    Early stopping keeps the best-validation weights per group.
+    Returns {ticker: (preds, probs)} and the model.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    tickers = list(datasets)
+    train_sets, test_sets, fit_idx, val_idx = [], [], [], []
+    for ticker in tickers:
+        X_train, y_train, X_test, y_test = datasets[ticker]
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(np.asarray(X_train, dtype=np.float32))
+        X_test_scaled = scaler.transform(np.asarray(X_test, dtype=np.float32))
+        train_data = WindowDataset(X_train_scaled, y_train.values, SEQ_LEN)
+        n_val = int(len(train_data) * val_ratio) if patience else 0
+        n_fit = len(train_data) - n_val
+        train_sets.append(train_data)
+        test_sets.append(WindowDataset(X_test_scaled, y_test.values, SEQ_LEN))
+        fit_idx.append(np.arange(n_fit))
+        val_idx.append(np.arange(n_fit, len(train_data)))
+
+    model = GroupedLSTMModel(len(tickers), input_dim)
+    lr = LSTM_BASE_LR * np.sqrt(batch_size / LSTM_REF_BATCH_SIZE)
+    optimizer = GroupAdam(model.parameters(), len(tickers), lr=lr)
+    n_steps = int(np.ceil(max(len(idx) for idx in fit_idx) / batch_size))
+    val_batch = stack_group_batch(train_sets, val_idx) if patience else None
+
+    best_loss = torch.full((len(tickers),), float('inf'))
+    best_params = {name: p.detach().clone() for name, p in model.named_parameters()}
+    stale = torch.zeros(len(tickers), dtype=torch.long)
+    stopped = torch.zeros(len(tickers), dtype=torch.bool)  # Groups out of patience stay frozen
+    epoch = -1  # Reported as 0 epochs when epochs=0
+    train_start = time.perf_counter()
+    for epoch in range(epochs):
+        model.train()
+        epoch_start = time.perf_counter()
+        running, seen = torch.zeros(len(tickers)), 0
+        for step in range(n_steps):
+            batch_idx = [idx[step * batch_size:(step + 1) * batch_size] for idx in fit_idx]
+            X_batch, y_batch, mask = stack_group_batch(train_sets, batch_idx)
+            optimizer.zero_grad()
+            group_loss = masked_group_loss(model(X_batch).squeeze(-1), y_batch, mask)
+            # Groups have separate weights, so the summed loss gives each one its own gradient
+            group_loss.sum().backward()
+            optimizer.step((mask.sum(dim=1) > 0) & ~stopped)
+            running += group_loss.detach() * mask.sum(dim=1)
+            seen += int(mask.sum())
+        train_loss = running / torch.tensor([max(len(idx), 1) for idx in fit_idx], dtype=torch.float32)
+
+        if val_batch is not None:
+            model.eval()
+            with torch.no_grad():
+                monitor = masked_group_loss(model(val_batch[0]).squeeze(-1), val_batch[1], val_batch[2])
+        else:
+            monitor = train_loss
+        elapsed = time.perf_counter() - epoch_start
+
+        if verbose:
+            print(f"  Epoch {epoch + 1:>3}/{epochs} - mean loss {train_loss.mean():.4f}"
+                  + (f" - mean val_loss {monitor.mean():.4f}" if val_batch is not None else "")
+                  + f" - {elapsed:.2f}s ({seen / elapsed:,.0f} samples/s)")
+
+        improved = (monitor < best_loss - LSTM_MIN_DELTA) & ~stopped
+        best_loss = torch.where(improved, monitor, best_loss)
+        stale = torch.where(improved, torch.zeros_like(stale), stale + 1)
+        with torch.no_grad():
+            for name, p in model.named_parameters():
+                best_params[name][improved] = p[improved]
+        if patience:
+            stopped |= stale >= patience
+            if bool(stopped.all()):
+                break
+
+    if patience:
+        with torch.no_grad():
+            for name, p in model.named_parameters():
+                p.copy_(best_params[name])
+    if verbose:
+        print(f"Grouped LSTM ({len(tickers)} tickers) trained {epoch + 1} epochs "
+              f"in {time.perf_counter() - train_start:.2f}s")
+
+    # Predict: all tickers' test windows in one pass, then unpad per ticker
+    model.eval()
+    X_test_batch, _, _ = stack_group_batch(test_sets, [np.arange(len(ds)) for ds in test_sets])
+    with torch.no_grad():
+        all_probs = model(X_test_batch).squeeze(-1).numpy()
+    results = {}
+    for g, ticker in enumerate(tickers):
+        probs = all_probs[g, :len(test_sets[g])]
+        results[ticker] = ((probs > 0.5).astype(int), probs)
+    return results, model
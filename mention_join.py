@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Mention-weighted GDELT sentiment: joins the mentions table to event
+attributes on GLOBALEVENTID without materializing the joined table.
+
+build_index() streams the export files once and spills the few event
+attributes needed (GLOBALEVENTID, QuadClass, GoldsteinScale) into one
+Parquet part per (export file, DATEADDED day) under EVENT_INDEX_DIR. A
+mention's EventTimeDate is the DATEADDED of the event it refers to, so every
+mention knows which day partition holds its event. join_mentions() streams the
+mentions files in chunks and probes a hash index (pandas Index) over that
+partition. At most MAX_PARTITIONS partitions are held in memory (LRU), which
+bounds memory whatever the history length. Per MentionTimeDate day it
+accumulates:
+
+    Mentions_Tone          confidence-weighted mean MentionDocTone (sum tone*conf / sum conf)
+    Mentions_Goldstein     confidence-weighted mean Goldstein of the mentioned events
+    Mentions_Conflict      confidence-weighted share of mentions of QuadClass 3-4 events
+    Mentions_Cooperation   confidence-weighted share of mentions of QuadClass 1-2 events
+    Mentions_Count         mentions read
+    Mentions_Join_Rate     share of mentions whose event was found in the index
+
+Every mention is one article about an event, so an event covered by many
+articles weighs proportionally more than in the export's per-event AvgTone.
+The output has one row per Date (YYYYMMDD) and merges alongside
+gdelt_economic_signals.csv.
+
+Usage:
+    python mention_join.py -d data                 # Index events, join mentions, write signals
+    python mention_join.py -d data --rebuild       # Re-index every export file
+    python collect-gdelt.py --join-mentions        # Same, from the collection script
+"""
+
+import argparse
+import glob
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+EVENT_INDEX_DIR = os.path.join('results', 'event_index')
+MENTION_SIGNALS_PATH = os.path.join('results', 'gdelt_mention_signals.csv')
+
+MAX_PARTITIONS = 8        # Day partitions of the event index held in memory at once
+CHUNK_SIZE = 500_000      # Mentions rows per streamed chunk
+
+# Column positions (GDELT 2.0; see EXPORT_COLUMNS / MENTIONS_COLUMNS in collect-gdelt.py)
+EVENT_COLUMNS = {0: 'GLOBALEVENTID', 29: 'QuadClass', 30: 'GoldsteinScale', 59: 'DATEADDED'}
+MENTION_COLUMNS = {0: 'GLOBALEVENTID', 1: 'EventTimeDate', 2: 'MentionTimeDate',
+                   11: 'Confidence', 13: 'MentionDocTone'}
+
+SUMS = ['Count', 'Joined', 'Conf', 'Tone', 'Joined_Conf', 'Goldstein', 'Conflict', 'Cooperation']
+
+
+def build_index(export_files, index_dir=EVENT_INDEX_DIR, rebuild=False, verbose=True):
+    """
+    Spills (GLOBALEVENTID, QuadClass, GoldsteinScale) into <index_dir>/<DATEADDED day>/<file>.parquet.
+    Files that already have parts are skipped unless rebuild is set.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    done_path = os.path.join(index_dir, 'indexed_files.txt')
+    done = set()
+    if os.path.exists(done_path) and not rebuild:
+        with open(done_path) as f:
+            done = set(f.read().splitlines())
+    todo = [f for f in export_files if os.path.basename(f) not in done]
+
+    n_events = 0
+    with open(done_path, 'w' if rebuild else 'a') as log:
+        for file in todo:
+            try:
+                events = pd.read_csv(file, sep='\t', header=None, usecols=list(EVENT_COLUMNS),
+                                     dtype={59: str}, on_bad_lines='skip', encoding_errors='replace')
+            except Exception as e:
+                print(f"  ✗ {os.path.basename(file)}: {e}")
+                continue
+            events = events.rename(columns=EVENT_COLUMNS).dropna(subset=['GLOBALEVENTID', 'DATEADDED'])
+            day = events.pop('DATEADDED').str[:8]
+            events = events.astype({'GLOBALEVENTID': np.int64})
+            events['QuadClass'] = pd.to_numeric(events['QuadClass'], errors='coerce').fillna(0).astype(np.int8)
+            events['GoldsteinScale'] = pd.to_numeric(events['GoldsteinScale'], errors='coerce').astype(np.float32)
+            for d, part in events.groupby(day, sort=False):
+                os.makedirs(os.path.join(index_dir, d), exist_ok=True)
+                part.to_parquet(os.path.join(index_dir, d, f"{os.path.basename(file)}.parquet"), index=False)
+            log.write(os.path.basename(file) + "\n")
+            n_events += len(events)
+
+    if verbose:
+        print(f"Event index: {len(todo)} files indexed ({n_events:,} events), "
+              f"{len(export_files) - len(todo)} already present -> {index_dir}")
+    return index_dir
+
+
+class EventIndex:
+    """GLOBALEVENTID -> event attributes, loaded one DATEADDED day at a time (LRU-bounded)."""
+
+    def __init__(self, index_dir=EVENT_INDEX_DIR, max_partitions=MAX_PARTITIONS):
+        self.index_dir = index_dir
+        self.max_partitions = max_partitions
+        self._partitions = OrderedDict()
+        self.loads = 0
+
+    def partition(self, day):
+        """(hash index over ids, QuadClass array, Goldstein array) for one day, or None if not indexed."""
+        if day in self._partitions:
+            self._partitions.move_to_end(day)
+            return self._partitions[day]
+        path = os.path.join(self.index_dir, day)
+        if os.path.isdir(path):
+            events = pd.read_parquet(path).drop_duplicates('GLOBALEVENTID')
+            part = (pd.Index(events['GLOBALEVENTID'].to_numpy()),
+                    events['QuadClass'].to_numpy(), events['GoldsteinScale'].to_numpy())
+            self.loads += 1
+        else:
+            part = None
+        self._partitions[day] = part
+        if len(self._partitions) > self.max_partitions:
+            self._partitions.popitem(last=False)
+        return part
+
+    def probe(self, ids, days):
+        """QuadClass (0 = not found) and Goldstein (NaN) for each (id, EventTimeDate day)."""
+        quad = np.zeros(len(ids), dtype=np.int8)
+        goldstein = np.full(len(ids), np.nan, dtype=np.float32)
+        # Sorting by day probes each partition once per chunk and keeps LRU hits high
+        for day, rows in pd.Series(np.arange(len(ids))).groupby(days, sort=True):
+            part = self.partition(day)
+            if part is None:
+                continue
+            index, quads, golds = part
+            pos = index.get_indexer(ids[rows.to_numpy()])
+            found = pos >= 0
+            quad[rows.to_numpy()[found]] = quads[pos[found]]
+            goldstein[rows.to_numpy()[found]] = golds[pos[found]]
+        return quad, goldstein
+
+
+def join_chunk(chunk, index):
+    """Per-MentionTimeDate-day sums for one chunk of mentions."""
+    chunk = chunk.rename(columns=MENTION_COLUMNS).dropna(subset=['GLOBALEVENTID', 'EventTimeDate',
+                                                                  'MentionTimeDate', 'MentionDocTone'])
+    ids = chunk['GLOBALEVENTID'].to_numpy(np.int64)
+    event_day = chunk['EventTimeDate'].astype(str).str[:8].to_numpy()
+    quad, goldstein = index.probe(ids, event_day)
+
+    conf = chunk['Confidence'].fillna(0).to_numpy(np.float64) / 100.0
+    joined = quad > 0
+    joined_conf = np.where(joined, conf, 0.0)
+    sums = pd.DataFrame({
+        'Count': 1,
+        'Joined': joined.astype(np.int64),
+        'Conf': conf,
+        'Tone': conf * chunk['MentionDocTone'].to_numpy(np.float64),
+        'Joined_Conf': joined_conf,
+        'Goldstein': np.where(joined, conf * np.nan_to_num(goldstein), 0.0),
+        'Conflict': np.where(quad >= 3, conf, 0.0),
+        'Cooperation': np.where(joined & (quad <= 2), conf, 0.0),
+    })
+    return sums.groupby(chunk['MentionTimeDate'].astype(str).str[:8].to_numpy()).sum()
+
+
+def join_mentions(mention_files, index_dir=EVENT_INDEX_DIR, out_path=MENTION_SIGNALS_PATH,
+                  max_partitions=MAX_PARTITIONS, chunk_size=CHUNK_SIZE, verbose=True):
+    """Streams mentions files through the event index and writes the daily Mentions_* table."""
+    index = EventIndex(index_dir, max_partitions)
+    daily = []
+    start = time.perf_counter()
+    for i, file in enumerate(mention_files, 1):
+        try:
+            reader = pd.read_csv(file, sep='\t', header=None, usecols=list(MENTION_COLUMNS),
+                                 dtype={1: str, 2: str}, chunksize=chunk_size,
+                                 on_bad_lines='skip', encoding_errors='replace')
+            parts = [join_chunk(chunk, index) for chunk in reader]
+        except Exception as e:
+            print(f"  ✗ {os.path.basename(file)}: {e}")
+            continue
+        # Collapse per file so the accumulator stays one row per day
+        if parts:
+            daily = [pd.concat(daily + parts).groupby(level=0).sum()]
+        if verbose and (i % 100 == 0 or i == len(mention_files)):
+            print(f"  [{i}/{len(mention_files)}] mentions files joined "
+                  f"({index.loads} partition loads, {time.perf_counter() - start:.1f}s)")
+    if not daily:
+        print("No mentions joined!")
+        return None
+
+    sums = daily[0].sort_index()
+    conf = sums['Conf'].replace(0, np.nan)
+    joined_conf = sums['Joined_Conf'].replace(0, np.nan)
+    signals = pd.DataFrame({
+        'Mentions_Tone': sums['Tone'] / conf,
+        'Mentions_Goldstein': sums['Goldstein'] / joined_conf,
+        'Mentions_Conflict': sums['Conflict'] / joined_conf,
+        'Mentions_Cooperation': sums['Cooperation'] / joined_conf,
+        'Mentions_Count': sums['Count'].astype(np.int64),
+        'Mentions_Join_Rate': sums['Joined'] / sums['Count'],
+    })
+    signals.index.name = 'Date'
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    signals.to_csv(out_path)
+    if verbose:
+        print(f"Saved {out_path}: {len(signals)} days, {int(sums['Count'].sum()):,} mentions, "
+              f"{sums['Joined'].sum() / max(1, sums['Count'].sum()):.1%} joined")
+    return signals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mention-weighted sentiment via a GLOBALEVENTID hash join')
+    parser.add_argument('-d', '--data-dir', default='.', help='Directory containing GDELT files')
+    parser.add_argument('--index-dir', default=EVENT_INDEX_DIR)
+    parser.add_argument('--output', default=MENTION_SIGNALS_PATH)
+    parser.add_argument('--max-partitions', type=int, default=MAX_PARTITIONS,
+                        help=f'Day partitions held in memory (default: {MAX_PARTITIONS})')
+    parser.add_argument('--rebuild', action='store_true', help='Re-index all export files')
+    args = parser.parse_args()
+
+    export_files = sorted(glob.glob(os.path.join(args.data_dir, '*.export.CSV')))
+    mention_files = sorted(glob.glob(os.path.join(args.data_dir, '*.mentions.CSV')))
+    build_index(export_files, args.index_dir, rebuild=args.rebuild)
+    join_mentions(mention_files, args.index_dir, args.output, args.max_partitions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Model registry for fitted per-ticker models.
+
+Layout (one directory per training run, one per ticker inside it):
+
+    results/models/
+        LATEST                      run id of the most recent finished run
+        <run_id>/<ticker>/
+            meta.json               training window, feature sets, artifact index
+            base_rf.joblib          sklearn estimators (joblib, mmap-able arrays)
+            sent_rf.joblib
+            base_lstm.pt            LSTM state_dict + architecture
+            base_lstm_scaler.npz    StandardScaler mean/scale
+            arima.json              ARIMA order and last fitted parameters
+
+Loading is lazy and per artifact: reading meta or an RF only needs joblib and
+sklearn; torch is imported only when an LSTM artifact is requested, and
+statsmodels is never needed (ARIMA parameters are plain JSON). Other tickers'
+files are never touched.
+
+With run='latest', each (ticker, artifact) resolves to the newest run that
+saved it, so a partial run (e.g. `--models rf --tickers SPX`) only replaces
+what it trained; the other tickers and models keep coming from earlier runs.
+A run becomes LATEST only when finish_run() is called after its saves.
+
+Usage:
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry()
+    rf = registry.load('SPX', 'sent_rf')             # newest run with SPX's sent_rf
+    meta = registry.meta('SPX', run='20251216-093000')
+"""
+
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+DEFAULT_MODELS_DIR = os.path.join('results', 'models')
+
+
+def load_scaler(path):
+    """Rebuilds a fitted StandardScaler from its saved mean/scale/var."""
+    from sklearn.preprocessing import StandardScaler
+
+    data = np.load(path)
+    scaler = StandardScaler()
+    scaler.mean_, scaler.scale_, scaler.var_ = data['mean'], data['scale'], data['var']
+    scaler.n_features_in_ = len(data['mean'])
+    return scaler
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """Saves and lazily loads per-ticker model artifacts grouped by run."""
+
+    def __init__(self, root=DEFAULT_MODELS_DIR):
+        self.root = root
+        self._cache = {}
+
+    # --- Runs ---
+
+    def new_run(self, run_id=None):
+        """Creates a run directory; it becomes LATEST only once finish_run() is called."""
+        run_id = run_id or time.strftime('%Y%m%d-%H%M%S')
+        os.makedirs(os.path.join(self.root, run_id), exist_ok=True)
+        return run_id
+
+    def finish_run(self, run_id):
+        """Marks a run whose artifacts are all saved as the latest run."""
+        _write_atomic(os.path.join(self.root, 'LATEST'), run_id)
+
+    def runs(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def resolve(self, run='latest', ticker=None, artifact=None):
+        """
+        Run id for `run`. For 'latest' with a ticker: the newest run that has the
+        ticker's meta (and `artifact`, if given); without one: the LATEST run.
+        """
+        if run != 'latest':
+            return run
+        if ticker is not None:
+            for run_id in reversed(self.runs()):
+                artifacts = self._artifacts(run_id, ticker)
+                if artifacts is not None and (artifact is None or artifact in artifacts):
+                    return run_id
+            raise FileNotFoundError(f"No run in {self.root} has {ticker} {artifact or 'models'}")
+        latest = os.path.join(self.root, 'LATEST')
+        if os.path.exists(latest):
+            with open(latest) as f:
+                return f.read().strip()
+        runs = self.runs()
+        if not runs:
+            raise FileNotFoundError(f"No model runs in {self.root}")
+        return runs[-1]
+
+    def tickers(self, run='latest', artifact=None):
+        """Tickers with saved models (with `artifact`, if given); 'latest' spans every run."""
+        run_ids = self.runs() if run == 'latest' else [run]
+        found = set()
+        for run_id in run_ids:
+            path = os.path.join(self.root, run_id)
+            for ticker in os.listdir(path):
+                artifacts = self._artifacts(run_id, ticker)
+                if artifacts is not None and (artifact is None or artifact in artifacts):
+                    found.add(ticker)
+        return sorted(found)
+
+    def ticker_dir(self, ticker, run='latest', artifact=None):
+        return os.path.join(self.root, self.resolve(run, ticker, artifact), ticker)
+
+    def _artifacts(self, run_id, ticker):
+        """Artifact index of a ticker in a run, or None when it has no meta.json."""
+        try:
+            with open(os.path.join(self.root, run_id, ticker, 'meta.json')) as f:
+                return json.load(f)['artifacts']
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    # --- Metadata ---
+
+    def meta(self, ticker, run='latest', artifact=None):
+        """meta.json of the run resolve() picks for (ticker, artifact)."""
+        with open(os.path.join(self.ticker_dir(ticker, run, artifact), 'meta.json')) as f:
+            return json.load(f)
+
+    def update_meta(self, run_id, ticker, **fields):
+        """Merges fields into the ticker's meta.json (creating it if needed)."""
+        path = self.ticker_dir(ticker, run_id)
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'meta.json')
+        meta = {'ticker': ticker, 'run_id': run_id, 'artifacts': {}}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        artifacts = fields.pop('artifacts', {})
+        meta.update(fields)
+        meta['artifacts'].update(artifacts)
+        meta['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        _write_atomic(meta_path, json.dumps(meta, indent=2, default=str))
+
+    # --- Save ---
+
+    def save_sklearn(self, run_id, ticker, name, model, features, compress=0):
+        """
+        Saves a fitted sklearn-style model. Uncompressed (the default) keeps the
+        arrays memory-mappable on load; compress > 0 trades that for smaller files.
+        """
+        filename = f"{name}.joblib"
+        os.makedirs(self.ticker_dir(ticker, run_id), exist_ok=True)
+        joblib.dump(model, os.path.join(self.ticker_dir(ticker, run_id), filename), compress=compress)
+        self.update_meta(run_id, ticker, artifacts={
+            name: {'kind': 'sklearn', 'file': filename, 'features': list(features), 'compressed': bool(compress)}
+        })
+
+    def save_lstm(self, run_id, ticker, name, model, features, seq_len, scaler=None):
+        import torch
+
+        path = self.ticker_dir(ticker, run_id)
+        os.makedirs(path, exist_ok=True)
+        torch.save({
+            'state_dict': model.state_dict(),
+            'input_dim': model.lstm.input_size,
+            'hidden_dim': model.lstm.hidden_size,
+            'num_layers': model.lstm.num_layers,
+            'dropout': model.lstm.dropout,
+        }, os.path.join(path, f"{name}.pt"))
+        entry = {'kind': 'lstm', 'file': f"{name}.pt", 'features': list(features), 'seq_len': seq_len}
+        if scaler is not None:
+            np.savez(os.path.join(path, f"{name}_scaler.npz"), mean=scaler.mean_, scale=scaler.scale_, var=scaler.var_)
+            entry['scaler'] = f"{name}_scaler.npz"
+        self.update_meta(run_id, ticker, artifacts={name: entry})
+
+    def save_arima(self, run_id, ticker, name, order, params=None):
+        path = self.ticker_dir(ticker, run_id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{name}.json"), 'w') as f:
+            json.dump({'order': list(order), 'params': None if params is None else list(map(float, params))}, f)
+        self.update_meta(run_id, ticker, artifacts={name: {'kind': 'arima', 'file': f"{name}.json"}})
+
+    # --- Load ---
+
+    def load(self, ticker, name, run='latest', mmap_mode='r'):
+        """
+        Loads one artifact, caching it per (run, ticker, name).
+        sklearn -> the estimator; lstm -> LSTMModel in eval mode with .scaler;
+        arima -> {'order': [...], 'params': [...]}.
+        """
+        run_id = self.resolve(run, ticker, name)
+        key = (run_id, ticker, name)
+        if key not in self._cache:
+            path = self.ticker_dir(ticker, run_id)
+            entry = self.meta(ticker, run_id)['artifacts'][name]
+            loader = {'sklearn': self._load_sklearn, 'lstm': self._load_lstm, 'arima': self._load_arima}
+            self._cache[key] = loader[entry['kind']](path, entry, mmap_mode)
+        return self._cache[key]
+
+    def scaler(self, ticker, name, run='latest'):
+        """StandardScaler for an LSTM artifact, without importing torch."""
+        run_id = self.resolve(run, ticker, name)
+        entry = self.meta(ticker, run_id)['artifacts'][name]
+        return load_scaler(os.path.join(self.ticker_dir(ticker, run_id), entry['scaler']))
+
+    def _load_sklearn(self, path, entry, mmap_mode):
+        mmap = None if entry.get('compressed') else mmap_mode
+        return joblib.load(os.path.join(path, entry['file']), mmap_mode=mmap)
+
+    def _load_lstm(self, path, entry, mmap_mode):
+        import torch
+        from lstm_models import LSTMModel
+
+        state = torch.load(os.path.join(path, entry['file']), weights_only=False)
+        model = LSTMModel(state['input_dim'], state['hidden_dim'], state['num_layers'], state['dropout'])
+        model.load_state_dict(state['state_dict'])
+        model.eval()
+        if 'scaler' in entry:
+            model.scaler = load_scaler(os.path.join(path, entry['scaler']))
+        return model
+
+    def _load_arima(self, path, entry, mmap_mode):
+        with open(os.path.join(path, entry['file'])) as f:
+            return json.load(f)
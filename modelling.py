@@ -1,52 +1,155 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report, precision_score, confusion_matrix, brier_score_loss
-from sklearn.calibration import CalibratedClassifierCV, calibration_curve
-from sklearn.model_selection import TimeSeriesSplit
-from sklearn.preprocessing import StandardScaler
-import torch
-import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
-from statsmodels.tsa.arima.model import ARIMA
-import warnings
+"""
+Sentiment vs. market experiment: per-ticker RF, LSTM and ARIMA models,
+backtests, plots and metrics.
+
+Heavy dependencies are imported only where they are used (torch via
+lstm_models for LSTMs, statsmodels for ARIMA, sklearn models/metrics when a
+run starts, matplotlib with the headless Agg backend only when plots are
+written), so `--help`, RF-only runs and tools that import this module start
+quickly. See benchmark-startup.py.
+
+Usage:
+    python modelling.py                                   # All tickers, all models
+    python modelling.py --tickers SPX NDX --models rf     # Subset of tickers / models
+    python modelling.py --start 2016-01-01 --end 2024-12-31
+    python modelling.py --format csv json --no-plots
+    python modelling.py --lstm-mode batched
+    python modelling.py --trace                           # Per-stage JSON trace in results/traces/
+"""
+
+import argparse
 import os
+import sys
 import traceback
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from feature_store import FeatureStore
+from instrumentation import add_trace_arguments, tracer
+from lstm_config import SEQ_LEN
+from model_registry import ModelRegistry
+from features import (
+    CROSS_ASSET_FEATURES, DEFAULT_FEATURES, Panel, add_features, compute_features, compute_panel,
+    registry_fingerprint, ticker_frame,
+)
 
 warnings.filterwarnings("ignore")
 
 # === Configuration ===
 DATA_PATH = 'results/merged_stooq_gdelt.csv'
 RESULTS_DIR = 'results'
-SEQ_LEN = 10  # Sequence length for LSTM
 TEST_SIZE_RATIO = 0.2
 RANDOM_SEED = 42
 
-# Ensure results directory exists
-os.makedirs(RESULTS_DIR, exist_ok=True)
+# Fitted models per ticker are saved to a ModelRegistry run here (read by serving.py)
+SAVE_MODELS = True
+MODELS_DIR = os.path.join(RESULTS_DIR, 'models')
+
+# Per-ticker organization sentiment (entity_index.py signals); joined by load_and_process_data when present
+ENTITY_SENTIMENT_PATH = os.path.join(RESULTS_DIR, 'entity_sentiment.csv')
+# Per-ticker news published before each exchange close (intraday.py sessions); joined when present
+SESSION_SENTIMENT_PATH = os.path.join(RESULTS_DIR, 'session_sentiment.csv')
+
+# Memory layout: float32 inputs and features (only the ticker's own columns are parsed), model
+# features assembled into one C-contiguous float32 matrix. Close and Return stay float64 because
+# Target and the backtest P&L are derived from them. False restores the all-float64 frames.
+COMPACT_DTYPES = True
+
+# Feature store: cache create_features() output keyed by ticker, input hash and feature version
+USE_FEATURE_STORE = True
+FEATURE_STORE_DIR = os.path.join(RESULTS_DIR, 'feature_store')
+
+# Feature computation: 'per_ticker' (create_features per ticker) or 'panel'
+# (all tickers as date x ticker matrices in one pass, enabling cross-asset features)
+FEATURE_MODE = 'per_ticker'
+USE_CROSS_ASSET_FEATURES = False  # Append features.CROSS_ASSET_FEATURES to the base set (panel mode)
+
+# RF probability calibration (forest is fitted once; see SingleFitCalibratedClassifier)
+RF_CALIBRATION = 'oob'         # 'oob' (out-of-bag) or 'holdout' (time-ordered tail of train)
+RF_CALIBRATION_METHOD = 'sigmoid'  # 'sigmoid' (Platt) or 'isotonic'
+RF_CALIBRATION_HOLDOUT = 0.2   # Fraction of training rows held out when RF_CALIBRATION='holdout'
+
+# Model hyperparameters (tune with hyperparam_search.py)
+RF_PARAMS = {
+    'n_estimators': 300,
+    'max_depth': 4,           # Shallower tree to capture broad trends
+    'min_samples_leaf': 20,
+}
+ARIMA_ORDER = (5, 1, 0)
+
+# ARIMA engine (see arima_engine.py)
+ARIMA_ORDER_SELECTION = False  # True: per-ticker AIC/BIC order search (cached) instead of ARIMA_ORDER
+ARIMA_CRITERION = 'aic'        # 'aic' or 'bic'
+ARIMA_ENGINE = 'statsmodels'   # 'statsmodels' or 'ar_ls' (closed-form least-squares AR, for large universes)
+ARIMA_REFIT_EVERY = 1          # Walk-forward steps between parameter re-estimations
+ARIMA_N_JOBS = -1              # Tickers fitted in parallel (1 = sequentially inside the ticker loop)
+ARIMA_ORDER_CACHE_PATH = os.path.join(RESULTS_DIR, 'arima_orders.json')
+
+# LSTM architecture, training engine and SEQ_LEN are set in lstm_config.py (read by lstm_models)
+LSTM_MODE = 'per_ticker'    # 'per_ticker' or 'batched' (one grouped-weight job across all tickers)
+
+# Bootstrap CI/p-value of Delta Sharpe and a Diebold-Mariano test for each Base vs Sent pair
+# (significance.py settings); added to the Sent rows of model_metrics
+SIGNIFICANCE_TESTS = True
+
+# Experiment CLI defaults
+MODEL_CHOICES = ['rf', 'lstm', 'arima']
+OUTPUT_FORMATS = ['csv', 'json', 'parquet']
+SAVE_PLOTS = True
+
+# LSTM code lives in lstm_models (imports torch); these names stay importable
+# from modelling but are only loaded on first access.
+LSTM_EXPORTS = {
+    'LSTMModel', 'GroupedLSTMModel', 'WindowDataset', 'create_sequences', 'make_window_loader',
+    'compile_lstm', 'evaluate_loss', 'train_lstm', 'train_lstm_multi',
+    'stack_group_batch', 'masked_group_loss',
+}
+
+def __getattr__(name):
+    if name in LSTM_EXPORTS:
+        import lstm_models
+        return getattr(lstm_models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # === Helper Functions ===
 
-def set_seeds(seed=RANDOM_SEED):
+def set_seeds(seed=RANDOM_SEED, torch_seed=True):
     """
     Resets all random seeds to ensure reproducibility for EACH ticker iteration.
     This is critical: without this, the second ticker in the loop gets a 
     different random state than the first, leading to different LSTM weights.
+    torch_seed=False skips torch (and its import) for runs without an LSTM.
     """
     np.random.seed(seed)
+    if not torch_seed:
+        return
+    import torch
     torch.manual_seed(seed)
     if torch.cuda.is_available():
         torch.cuda.manual_seed_all(seed)
     # optional: torch.backends.cudnn.deterministic = True
 
+def get_pyplot():
+    """
+    Imports pyplot on first use. Plots are only ever written to files, so the
+    headless Agg backend is selected unless pyplot was already set up (e.g. in a notebook).
+    """
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 def save_plot(fig, filename):
     path = os.path.join(RESULTS_DIR, filename)
     fig.savefig(path)
     print(f"Plot saved to {path}")
-    plt.close(fig)
+    get_pyplot().close(fig)
 
 def plot_equity_curves(equity_curves, ticker, title="Equity Curves"):
+    plt = get_pyplot()
     plt.figure(figsize=(12, 6))
     for name, equity in equity_curves.items():
         plt.plot(equity, label=name)
@@ -59,6 +162,7 @@ def plot_equity_curves(equity_curves, ticker, title="Equity Curves"):
     save_plot(plt.gcf(), f"equity_curves_{ticker}.png")
 
 def plot_feature_importance(importances, ticker, title="Feature Importance"):
+    plt = get_pyplot()
     plt.figure(figsize=(10, 8))
     # Sort for better visualization
     importances = importances.sort_values(ascending=True)
@@ -69,6 +173,8 @@ def plot_feature_importance(importances, ticker, title="Feature Importance"):
     save_plot(plt.gcf(), f"feature_importance_{ticker}.png")
 
 def plot_calibration_curve_func(y_true, probs, ticker, title="Calibration Curve"):
+    from sklearn.calibration import calibration_curve
+    plt = get_pyplot()
     fraction_of_positives, mean_predicted_value = calibration_curve(y_true, probs, n_bins=10)
     
     plt.figure(figsize=(8, 6))
@@ -120,11 +226,31 @@ def calculate_trading_metrics(equity_curve):
         'ProfitFactor': profit_factor
     }
 
+def load_ticker_signals(path, ticker, kind):
+    """
+    The ticker's <ticker>_<kind>_* columns from a wide daily file renamed to
+    <kind>_*, or None if the file or the ticker is missing.
+    """
+    if not os.path.exists(path):
+        return None
+    prefix = f"{ticker}_{kind}_"
+    cols = [c for c in pd.read_csv(path, nrows=0).columns if c.startswith(prefix)]
+    if not cols:
+        return None
+    signals = pd.read_csv(path, usecols=['Date', *cols], parse_dates=['Date']).set_index('Date')
+    return signals.rename(columns=lambda c: f"{kind}_" + c[len(prefix):])
+
+def load_entity_sentiment(ticker):
+    """Entity_Sentiment, Entity_Disagreement and Entity_Volume for the ticker, or None."""
+    return load_ticker_signals(ENTITY_SENTIMENT_PATH, ticker, 'Entity')
+
+def load_session_sentiment(ticker):
+    """Session_Sentiment, Session_Disagreement and Session_Volume (news before the ticker's close), or None."""
+    return load_ticker_signals(SESSION_SENTIMENT_PATH, ticker, 'Session')
+
 def load_and_process_data(filepath, ticker='SPX'):
     print(f"Loading data from {filepath} for {ticker}...")
-    df = pd.read_csv(filepath)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values('Date').set_index('Date')
+    header = pd.read_csv(filepath, nrows=0).columns
     
     # Select columns for the specific ticker
     # Expected columns: {ticker}_Open, {ticker}_Close, {ticker}_Volume
@@ -137,19 +263,38 @@ def load_and_process_data(filepath, ticker='SPX'):
     }
     
     # Check if columns exist
-    missing_cols = [c for c in cols_map.keys() if c not in df.columns]
+    missing_cols = [c for c in cols_map.keys() if c not in header]
     if missing_cols:
         raise ValueError(f"Missing columns for ticker {ticker}: {missing_cols}")
-        
-    # Rename columns
-    df = df.rename(columns=cols_map)
     
     # Keep only relevant columns to avoid dropping rows due to NaNs in unrelated columns
     keep_cols = ['Open', 'Close', 'Volume', 'News_Sentiment', 'News_Disagreement', 'News_Volatility', 'News_Volume']
     
-    # Verify all keep_cols exist (News columns might be missing if GDELT data is missing)
+    # Only these columns are parsed (News columns might be missing if GDELT data is missing),
+    # straight into their final dtypes; the other tickers' columns are never materialised
+    news_cols = [c for c in keep_cols if c.startswith('News_') and c in header]
+    dtype = None
+    if COMPACT_DTYPES:
+        dtype = {c: np.float32 for c in [*cols_map, *news_cols]}
+        dtype[f'{ticker}_Close'] = np.float64
+    df = pd.read_csv(filepath, usecols=['Date', *cols_map, *news_cols], dtype=dtype)
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop('Date'), format='ISO8601'), name='Date')
+    df.columns = [cols_map.get(c, c) for c in df.columns]  # Rename in place
     existing_cols = [c for c in keep_cols if c in df.columns]
-    df = df[existing_cols]
+    if list(df.columns) != existing_cols:
+        df = df[existing_cols]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    
+    # Organization-level sentiment for this ticker; days without mentions get zero volume and neutral tone
+    entity = load_entity_sentiment(ticker)
+    if entity is not None:
+        df = df.join(entity).fillna({'Entity_Sentiment': 0.0, 'Entity_Disagreement': 0.0, 'Entity_Volume': 0})
+    
+    # Intraday news aligned to this exchange's close (same neutral fill for sessions without records)
+    session = load_session_sentiment(ticker)
+    if session is not None:
+        df = df.join(session).fillna({'Session_Sentiment': 0.0, 'Session_Disagreement': 0.0, 'Session_Volume': 0})
     
     # Calculate Returns - USE SIMPLE RETURNS FOR CORRECT BACKTEST
     df['Return'] = df['Close'].pct_change()  # Simple returns instead of log returns
@@ -161,55 +306,44 @@ def load_and_process_data(filepath, ticker='SPX'):
     df = df.dropna()
     return df
 
+@tracer.timed()
 def create_features(df):
-    data = df.copy()
-    
-    # === Base Market Features ===
-    # Lags
-    for lag in [1, 2, 3, 5, 10]:
-        data[f'Ret_Lag{lag}'] = data['Return'].shift(lag)
-    
-    # Volatility
-    data['Vol_5'] = data['Return'].rolling(5).std()
-    data['Vol_20'] = data['Return'].rolling(20).std()
-    
-    # Momentum / Intraday
-    if 'Open' in data.columns:
-        data['Intraday_Move'] = (data['Close'] - data['Open']) / data['Open']
-    else:
-        data['Intraday_Move'] = 0 # Fallback if Open not available
-
-    # Trend (Price relative to MA)
-    data['MA_50'] = data['Close'].rolling(50).mean()
-    data['Trend_50'] = data['Close'] / data['MA_50'] - 1
-    
-    # Longer Momentum
-    data['Mom_20'] = data['Close'].pct_change(20)
-    data['Mom_60'] = data['Close'].pct_change(60)
-
-    # RSI (14-day)
-    delta = data['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    data['RSI'] = 100 - (100 / (1 + rs))
-    
-    # === Sentiment Features ===
-    # Moving Averages of Sentiment
-    data['Sent_MA_3'] = data['News_Sentiment'].rolling(3).mean()
-    data['Sent_MA_7'] = data['News_Sentiment'].rolling(7).mean()
-    data['Sent_MA_14'] = data['News_Sentiment'].rolling(14).mean()
-    
-    # Sentiment Volatility
-    data['Sent_Vol_5'] = data['News_Volatility'].rolling(5).mean()
-    
-    # Interaction: Sentiment * Volume (Normalized)
-    vol_ma = data['News_Volume'].rolling(20).mean()
-    data['News_Vol_Rel'] = data['News_Volume'] / vol_ma
-    data['Sent_Impact'] = data['News_Sentiment'] * data['News_Vol_Rel']
-    
-    # Drop NaNs generated by rolling/shifting
-    data = data.dropna()
+    """
+    Appends every feature declared in features.DEFAULT_FEATURES (market and
+    sentiment) via the fused rolling engine, then drops warm-up rows.
+    With COMPACT_DTYPES the model features (get_feature_sets() order) are
+    written into one preallocated C-contiguous float32 matrix that backs those
+    columns of the returned frame, so build_feature_matrix() and chronological
+    row splits of the frame are views of it rather than copies.
+    """
+    if not COMPACT_DTYPES:
+        data = add_features(df, DEFAULT_FEATURES)
+        
+        # Drop NaNs generated by rolling/shifting
+        data = data.dropna()
+        tracer.count('feature_rows', len(data))
+        return data
+    
+    values = compute_features(df, DEFAULT_FEATURES)
+    columns = {**{c: df[c].to_numpy() for c in df.columns}, **values}
+    base_feats, sent_feats = get_feature_sets()
+    model_feats = [f for f in base_feats + sent_feats if f in columns]
+    
+    # Warm-up rows (NaN in any column, as dropna) are skipped while copying into the matrix
+    keep = np.ones(len(df), dtype=bool)
+    for col in columns.values():
+        if col.dtype.kind == 'f':
+            keep &= ~np.isnan(col)
+    X = np.empty((int(keep.sum()), len(model_feats)), dtype=np.float32)
+    for j, name in enumerate(model_feats):
+        X[:, j] = columns[name][keep]
+    
+    # Assembled positionally: the index can repeat dates, so nothing may align on it
+    data = pd.DataFrame(X, index=df.index[keep], columns=model_feats, copy=False)
+    rest = [c for c in columns if c not in model_feats]
+    for i, c in enumerate(rest):
+        data.insert(i, c, columns[c][keep].astype(np.float32, copy=False) if c in values else columns[c][keep])
+    tracer.count('feature_rows', len(data))
     return data
 
 def get_feature_sets():
@@ -224,28 +358,65 @@ def get_feature_sets():
         'Sent_Vol_5', 'Sent_Impact', 'News_Disagreement'
     ]
     
+    if FEATURE_MODE == 'panel' and USE_CROSS_ASSET_FEATURES:
+        base_features += [spec.name for spec in CROSS_ASSET_FEATURES]
+    
     return base_features, sentiment_features
 
+def get_feature_groups():
+    """Related features grouped for leave-one-group-out ablations (covers get_feature_sets())."""
+    return {
+        'Lags': ['Ret_Lag1', 'Ret_Lag2', 'Ret_Lag3', 'Ret_Lag5', 'Ret_Lag10'],
+        'Volatility': ['Vol_5', 'Vol_20'],
+        'Trend': ['Intraday_Move', 'Trend_50', 'RSI', 'Mom_20', 'Mom_60'],
+        'Sent_Level': ['Sent_MA_3', 'Sent_MA_7', 'Sent_MA_14'],
+        'Sent_Dispersion': ['Sent_Vol_5', 'News_Disagreement'],
+        'Sent_Volume': ['Sent_Impact'],
+    }
+
+def build_feature_matrix(df, feats):
+    """
+    Returns df[feats] as a single float32, C-contiguous array (read-only when
+    it is a view). When feats are adjacent float32 columns in the same order
+    (create_features' model matrix, or a row slice of it) this is a view of
+    the frame's own storage; otherwise the columns are gathered once. Any
+    contiguous run of columns (e.g. the base-feature prefix of base +
+    sentiment features) is a zero-copy view X[:, i:j]. Frames served by the
+    feature store hold one memory-mapped array per column, so for those the
+    matrix is always gathered (one copy per call).
+    """
+    cols = df.columns.get_indexer(feats)
+    if len(cols) and (cols >= 0).all() and (np.diff(cols) == 1).all():
+        X = df.iloc[:, cols[0]:cols[-1] + 1].to_numpy(dtype=np.float32, copy=False)
+        if X.flags['C_CONTIGUOUS']:
+            return X
+    return np.ascontiguousarray(df[feats].to_numpy(dtype=np.float32))
+
 # === Models ===
 
-def train_rf(X_train, y_train, X_test, y_test, calibrate=False):
-    print(f"Class Balance (Train): {y_train.value_counts(normalize=True).to_dict()}")
+@tracer.timed()
+def train_rf(X_train, y_train, X_test, y_test, calibrate=False, params=None, verbose=True):
+    """
+    calibrate: False for the raw forest, True for RF_CALIBRATION, or an
+    explicit 'holdout' / 'oob' mode. The forest is always fitted exactly once.
+    params: RandomForestClassifier arguments overriding RF_PARAMS.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from rf_calibration import SingleFitCalibratedClassifier
+
+    if verbose:
+        print(f"Class Balance (Train): {y_train.value_counts(normalize=True).to_dict()}")
     base_model = RandomForestClassifier(
-        n_estimators=300,
-        max_depth=4, # Shallower tree to capture broad trends
-        min_samples_leaf=20, 
-        random_state=RANDOM_SEED,
-        n_jobs=-1
+        **{**RF_PARAMS, 'random_state': RANDOM_SEED, 'n_jobs': -1, **(params or {})}
     )
     
     if calibrate:
-        # Use TimeSeriesSplit for calibration to respect temporal order if possible, 
-        # but CalibratedClassifierCV with cv=int does stratified k-fold.
-        # To respect time, we can just fit on training data if we assume stationarity within train,
-        # or use a custom CV. For simplicity and robustness, we'll use standard CV here 
-        # as it's a common practice even in finance for calibration, or we could use 'prefit' 
-        # if we had a validation set. Let's use standard CV=5.
-        model = CalibratedClassifierCV(base_model, method='sigmoid', cv=5)
+        # Time-ordered holdout (or OOB) calibration of a single forest instead of
+        # CalibratedClassifierCV's 5 stratified refits, which also ignored time order.
+        mode = RF_CALIBRATION if calibrate is True else calibrate
+        model = SingleFitCalibratedClassifier(
+            base_model, method=RF_CALIBRATION_METHOD, calibration=mode, holdout_ratio=RF_CALIBRATION_HOLDOUT
+        )
     else:
         model = base_model
         
@@ -254,104 +425,51 @@ def train_rf(X_train, y_train, X_test, y_test, calibrate=False):
     probs = model.predict_proba(X_test)[:, 1]
     return preds, probs, model
 
-class LSTMModel(nn.Module):
-    def __init__(self, input_dim, hidden_dim=64, num_layers=2, dropout=0.3):
-        super(LSTMModel, self).__init__()
-        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True, dropout=dropout)
-        self.fc = nn.Linear(hidden_dim, 1)
-        self.sigmoid = nn.Sigmoid()
-        
-    def forward(self, x):
-        out, _ = self.lstm(x)
-        out = self.fc(out[:, -1, :]) # Last time step
-        return self.sigmoid(out)
-
-def train_lstm(X_train, y_train, X_test, y_test, input_dim):
-    # Convert to sequences
-    def create_sequences(X, y, seq_len):
-        xs, ys = [], []
-        for i in range(len(X) - seq_len):
-            xs.append(X[i:(i + seq_len)])
-            ys.append(y[i + seq_len])
-        return np.array(xs), np.array(ys)
-
-    # Scale data
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
-    X_train_seq, y_train_seq = create_sequences(X_train_scaled, y_train.values, SEQ_LEN)
-    X_test_seq, y_test_seq = create_sequences(X_test_scaled, y_test.values, SEQ_LEN)
-    
-    # Tensors
-    train_data = TensorDataset(torch.FloatTensor(X_train_seq), torch.FloatTensor(y_train_seq))
-    train_loader = DataLoader(train_data, batch_size=32, shuffle=False)
-    
-    model = LSTMModel(input_dim)
-    criterion = nn.BCELoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-    
-    # Train
-    model.train()
-    for epoch in range(50): 
-        for X_batch, y_batch in train_loader:
-            optimizer.zero_grad()
-            y_pred = model(X_batch)
-            loss = criterion(y_pred, y_batch.unsqueeze(1))
-            loss.backward()
-            optimizer.step()
-            
-    # Predict
-    model.eval()
-    with torch.no_grad():
-        probs = model(torch.FloatTensor(X_test_seq)).numpy().flatten()
-        preds = (probs > 0.5).astype(int)
-        
-    return preds, probs, model
+@tracer.timed()
+def train_arima(price_train, price_test, order=ARIMA_ORDER, return_params=False, engine=ARIMA_ENGINE,
+                refit_every=ARIMA_REFIT_EVERY):
+    """
+    Train ARIMA model for price prediction (walk-forward, one step ahead).
+    Returns predictions (1=up, 0=down) and probabilities, plus the parameters
+    of the last walk-forward fit when return_params=True.
+    """
+    import arima_engine
+
+    print(f"Training ARIMA with order {order} ({engine})...")
+    preds, probs, params = arima_engine.forecast_ticker(price_train, price_test, order, engine, refit_every)
+    if return_params:
+        return preds, probs, params
+    return preds, probs
 
-def train_arima(price_train, price_test, order=(5, 1, 0)):
+def run_batched_arima(tickers, start=None, end=None):
     """
-    Train ARIMA model for price prediction.
-    Returns predictions (1=up, 0=down) and probabilities.
+    Walk-forward ARIMA for all tickers in parallel (ARIMA_N_JOBS processes),
+    with per-ticker order selection when ARIMA_ORDER_SELECTION is set.
+    Returns {ticker: (preds, probs, order, params)}; tickers whose data cannot
+    be prepared are left out (the ticker loop reports them).
     """
-    print(f"Training ARIMA with order {order}...")
-    
-    preds = []
-    probs = []
-    
-    # Walk-forward validation
-    history = list(price_train)
-    
-    for i in range(len(price_test)):
+    import arima_engine
+
+    splits = {}
+    for ticker in tickers:
         try:
-            # Fit ARIMA model
-            model = ARIMA(history, order=order)
-            model_fit = model.fit()
-            
-            # Forecast next value
-            forecast = model_fit.forecast(steps=1)[0]
-            
-            # Predict direction (1=up, 0=down)
-            current_price = history[-1]
-            pred = 1 if forecast > current_price else 0
-            preds.append(pred)
-            
-            # Calculate probability based on forecast magnitude
-            price_change = (forecast - current_price) / current_price
-            prob = 1 / (1 + np.exp(-price_change * 10))  # Sigmoid transformation
-            probs.append(prob)
-            
-            # Update history with actual value
-            history.append(price_test.iloc[i])
-            
+            train_df, test_df = prepare_ticker_data(ticker, start, end)
         except Exception as e:
-            print(f"ARIMA forecast error at step {i}: {e}")
-            # Use previous prediction or default
-            preds.append(0)
-            probs.append(0.5)
-            history.append(price_test.iloc[i])
-    
-    return np.array(preds), np.array(probs)
+            print(f"Skipping {ticker} in batched ARIMA: {e}")
+            continue
+        splits[ticker] = (train_df['Close'], test_df['Close'])
+    if not splits:
+        return {}
+    if ARIMA_ORDER_SELECTION:
+        orders = arima_engine.select_orders({t: s[0] for t, s in splits.items()},
+                                            ARIMA_ENGINE, ARIMA_CRITERION, ARIMA_N_JOBS,
+                                            cache_path=ARIMA_ORDER_CACHE_PATH)
+    else:
+        orders = {t: ARIMA_ORDER for t in splits}
+    print(f"\nTraining ARIMA ({ARIMA_ENGINE}) for {len(splits)} tickers in parallel: {orders}")
+    with tracer.stage('train_arima_batched', tickers=len(splits)):
+        results = arima_engine.forecast_tickers(splits, orders, ARIMA_ENGINE, ARIMA_REFIT_EVERY, ARIMA_N_JOBS)
+    return {t: (preds, probs, orders[t], params) for t, (preds, probs, params) in results.items()}
 
 def backtest_with_alignment(returns, preds, align_next_day=True):
     """
@@ -428,26 +546,184 @@ def save_presentation_data(test_df, equity_curves, ticker):
     eq_df.to_csv(path_equity)
     print(f"Saved {path_equity}")
 
-def save_metrics_to_csv(metrics):
+def save_ticker_models(registry, run_id, ticker, train_df, test_df, base_feats, all_feats, models):
+    """
+    Saves one ticker's fitted models to the registry run, with the training
+    window and feature sets in its metadata. models maps artifact name
+    ('base_rf', 'sent_rf', 'base_lstm', 'sent_lstm', 'arima') to the fitted
+    model (ARIMA: (order, params)); None entries are skipped.
+    """
+    registry.update_meta(
+        run_id, ticker,
+        train_start=train_df.index.min(), train_end=train_df.index.max(),
+        test_start=test_df.index.min(), test_end=test_df.index.max(),
+        base_features=base_feats, all_features=all_feats, seq_len=SEQ_LEN,
+        feature_mode=FEATURE_MODE,
+    )
+    for name, model in models.items():
+        if model is None:
+            continue
+        feats = base_feats if name.startswith('base') else all_feats
+        if name.endswith('_rf'):
+            registry.save_sklearn(run_id, ticker, name, model, feats)
+        elif name.endswith('_lstm'):
+            registry.save_lstm(run_id, ticker, name, model, feats, SEQ_LEN, scaler=model.scaler)
+        elif name == 'arima':
+            registry.save_arima(run_id, ticker, name, *model)
+    print(f"Saved models to {registry.ticker_dir(ticker, run_id)}")
+
+def save_metrics(metrics, formats=('csv',)):
+    """Writes the combined metrics table as results/model_metrics.<fmt> for each format."""
     df = pd.DataFrame(metrics)
-    path = os.path.join(RESULTS_DIR, 'model_metrics.csv')
-    df.to_csv(path, index=False)
-    print(f"Saved {path}")
+    for fmt in formats:
+        path = os.path.join(RESULTS_DIR, f'model_metrics.{fmt}')
+        if fmt == 'csv':
+            df.to_csv(path, index=False)
+        elif fmt == 'json':
+            df.to_json(path, orient='records', indent=2)
+        elif fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            raise ValueError(f"Unknown output format: {fmt}")
+        print(f"Saved {path}")
+
+_feature_store = None
+
+def get_feature_store():
+    """Process-wide FeatureStore, created on first use."""
+    global _feature_store
+    if _feature_store is None:
+        _feature_store = FeatureStore(FEATURE_STORE_DIR)
+    return _feature_store
 
-def run_experiment():
-    # Detect tickers
-    df_raw = pd.read_csv(DATA_PATH)
-    tickers = set()
-    for col in df_raw.columns:
-        if '_Open' in col:
-            tickers.add(col.replace('_Open', ''))
+_panel = None
+
+def load_panel():
+    """
+    Loads every ticker as a features.Panel and computes all features (plus the
+    cross-asset ones when USE_CROSS_ASSET_FEATURES) in one pass. Cached for the
+    lifetime of the process.
+    Returns (panel, cube, columns); see features.compute_panel.
+    """
+    global _panel
+    if _panel is None:
+        print(f"Loading panel from {DATA_PATH}...")
+        wide = pd.read_csv(DATA_PATH)
+        wide['Date'] = pd.to_datetime(wide['Date'])
+        wide = wide.sort_values('Date', kind='stable').set_index('Date')
+        tickers = sorted(c.replace('_Open', '') for c in wide.columns if c.endswith('_Open'))
+        panel = Panel(wide, tickers)
+        specs = DEFAULT_FEATURES + (CROSS_ASSET_FEATURES if USE_CROSS_ASSET_FEATURES else [])
+        cube, columns = compute_panel(panel, specs)
+        _panel = (panel, cube, columns)
+    return _panel
+
+@tracer.timed()
+def load_features(ticker, use_store=None):
+    """
+    load_and_process_data + create_features, served from the feature store when unchanged.
+    use_store defaults to USE_FEATURE_STORE.
+    """
+    if use_store is None:
+        use_store = USE_FEATURE_STORE
+    if FEATURE_MODE == 'panel':
+        # Zero-copy view into the shared (ticker x date x feature) cube; only the
+        # model features and the ticker's own Return decide which rows are kept
+        base_feats, sent_feats = get_feature_sets()
+        return ticker_frame(*load_panel(), ticker, required=base_feats + sent_feats + ['Return'])
+    
+    df = load_and_process_data(DATA_PATH, ticker=ticker)
+    if not use_store:
+        return create_features(df)
+    return get_feature_store().get_or_compute(ticker, df, create_features, get_feature_sets,
+                                              version_salt=registry_fingerprint(DEFAULT_FEATURES))
+
+def prepare_ticker_data(ticker, start=None, end=None):
+    """
+    Loads one ticker, builds features and returns the chronological (train_df, test_df) split.
+    start/end restrict the sample to a date range; features are computed on the full
+    history first, so rolling windows at the start of the range are fully warmed up.
+    """
+    df = load_features(ticker)
+    if start is not None or end is not None:
+        df = df.loc[start:end]
+    train_size = int(len(df) * (1 - TEST_SIZE_RATIO))
+    return df.iloc[:train_size], df.iloc[train_size:]
+
+def run_batched_lstm(tickers, start=None, end=None):
+    """
+    Trains the base and sentiment LSTMs for every ticker as two grouped jobs.
+    Returns {ticker: {'base': (preds, probs), 'sent': (preds, probs)}}; tickers
+    whose data cannot be prepared are left out and fall back to train_lstm().
+    """
+    base_feats, sent_feats = get_feature_sets()
+    all_feats = base_feats + sent_feats
+    splits = {}
+    for ticker in tickers:
+        try:
+            splits[ticker] = prepare_ticker_data(ticker, start, end)
+        except Exception as e:
+            print(f"Skipping {ticker} in batched LSTM: {e}")
+    if not splits:
+        return {}
+
+    results = {ticker: {} for ticker in splits}
+    for key, feats in [('base', base_feats), ('sent', all_feats)]:
+        print(f"\n--- Running {key.title()} LSTM for {len(splits)} tickers (batched) ---")
+        set_seeds()
+        datasets = {
+            ticker: (train_df[feats], train_df['Target'], test_df[feats], test_df['Target'])
+            for ticker, (train_df, test_df) in splits.items()
+        }
+        from lstm_models import train_lstm_multi
+        group_results, _ = train_lstm_multi(datasets, input_dim=len(feats))
+        for ticker, preds_probs in group_results.items():
+            results[ticker][key] = preds_probs
+    return results
+
+def detect_tickers():
+    """Tickers with an {ticker}_Open column in DATA_PATH (header only)."""
+    columns = pd.read_csv(DATA_PATH, nrows=0).columns
+    return sorted(c.replace('_Open', '') for c in columns if '_Open' in c)
+
+def run_experiment(lstm_mode=LSTM_MODE, tickers=None, models=MODEL_CHOICES, start=None, end=None,
+                   plots=SAVE_PLOTS, save_models=SAVE_MODELS, output_formats=('csv',)):
+    """
+    Runs the Base vs Base + Sentiment comparison for each ticker with the chosen
+    models ('rf', 'lstm', 'arima'), backtests them and writes metrics, equity
+    curves and (optionally) plots and fitted models. Model libraries are
+    imported only for the models requested.
+    """
+    from sklearn.metrics import accuracy_score, brier_score_loss
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    
+    # Detect tickers (sorted to ensure consistent iteration order if we re-run)
+    available = detect_tickers()
+    print(f"Detected tickers: {available}")
+    sorted_tickers = available
+    if tickers:
+        missing = sorted(set(tickers) - set(available))
+        if missing:
+            print(f"Skipping unknown tickers: {missing}")
+        sorted_tickers = [t for t in available if t in tickers]
     
-    print(f"Detected tickers: {tickers}")
+    run_rf, run_lstm, run_arima = ('rf' in models), ('lstm' in models), ('arima' in models)
+    if run_lstm:
+        from lstm_models import train_lstm
     
     all_metrics = []
     
-    # Convert to sorted list to ensure consistent iteration order if we re-run
-    sorted_tickers = sorted(list(tickers))
+    registry, run_id = None, None
+    if save_models:
+        registry = ModelRegistry(MODELS_DIR)
+        run_id = registry.new_run()
+        print(f"Model run: {run_id}")
+    
+    # Optionally train all tickers' LSTMs up front in one grouped job
+    lstm_results = run_batched_lstm(sorted_tickers, start, end) if run_lstm and lstm_mode == 'batched' else {}
+    # ARIMA walk-forwards of all tickers run in parallel up front
+    arima_results = run_batched_arima(sorted_tickers, start, end) if run_arima and ARIMA_N_JOBS != 1 else {}
     
     for ticker in sorted_tickers:
         print(f"\n{'='*30}")
@@ -457,189 +733,178 @@ def run_experiment():
         # === CRITICAL FIX: RESET SEEDS HERE ===
         # This ensures that 'SPX' gets the exact same random initialization 
         # as it did in the single-file version, regardless of iteration order.
-        np.random.seed(RANDOM_SEED)
-        torch.manual_seed(RANDOM_SEED)
-        if torch.cuda.is_available():
-            torch.cuda.manual_seed_all(RANDOM_SEED)
+        set_seeds(torch_seed=run_lstm)
         
         try:
-            # 1. Load
-            df = load_and_process_data(DATA_PATH, ticker=ticker)
-            df = create_features(df)
+            # 1. Load & 2. Split
+            train_df, test_df = prepare_ticker_data(ticker, start, end)
             
             base_feats, sent_feats = get_feature_sets()
             all_feats = base_feats + sent_feats
             
-            # 2. Split
-            train_size = int(len(df) * (1 - TEST_SIZE_RATIO))
-            train_df = df.iloc[:train_size]
-            test_df = df.iloc[train_size:]
-            
             print(f"Train samples: {len(train_df)}, Test samples: {len(test_df)}")
             print(f"Test Date Range: {test_df.index.min()} to {test_df.index.max()}")
             
-            results = []
-            
-            # === Experiment 1: Base Model (RF) ===
-            print("\n--- Running Base Model (RF) ---")
-            preds_base_rf, probs_base_rf, _ = train_rf(
-                train_df[base_feats], train_df['Target'],
-                test_df[base_feats], test_df['Target'],
-                calibrate=True
-            )
-            acc_base_rf = accuracy_score(test_df['Target'], preds_base_rf)
-            print(f"Base RF Accuracy: {acc_base_rf:.2%}")
+            # Feature matrices are built once; base features are a column view of them
+            X_train_all = build_feature_matrix(train_df, all_feats)
+            X_test_all = build_feature_matrix(test_df, all_feats)
+            X_train_base = X_train_all[:, :len(base_feats)]
+            X_test_base = X_test_all[:, :len(base_feats)]
             
-            # === Experiment 2: Sentiment Model (RF) ===
-            print("\n--- Running Sentiment Model (RF) ---")
-            preds_sent_rf, probs_sent_rf, model_sent_rf = train_rf(
-                train_df[all_feats], train_df['Target'],
-                test_df[all_feats], test_df['Target'],
-                calibrate=True
-            )
-            acc_sent_rf = accuracy_score(test_df['Target'], preds_sent_rf)
-            print(f"Sentiment RF Accuracy: {acc_sent_rf:.2%}")
+            # Model name -> (preds, accuracy, first test row the preds cover)
+            model_preds = {}
+            fitted = {}
             
-            # Calibration & Brier Score (Sentiment RF)
-            brier_sent_rf = brier_score_loss(test_df['Target'], probs_sent_rf)
-            print(f"Sentiment RF Brier Score: {brier_sent_rf:.4f}")
-            plot_calibration_curve_func(test_df['Target'], probs_sent_rf, ticker, title="Calibration Curve (RF Sentiment)")
-            
-            # Feature Importance
-            # CalibratedClassifierCV wraps the base estimator.
-            # We need to access the base estimator to get feature importances.
-            # In newer sklearn, 'calibrated_classifiers_' holds the fitted classifiers.
-            if hasattr(model_sent_rf, 'calibrated_classifiers_'):
-                 # Average importances across folds
-                 imps = []
-                 for clf in model_sent_rf.calibrated_classifiers_:
-                     # clf is a CalibratedClassifierCV._CalibratedClassifier in some versions or just the estimator
-                     # In recent sklearn, clf has 'estimator' attribute which is the fitted base estimator
-                     if hasattr(clf, 'estimator') and hasattr(clf.estimator, 'feature_importances_'):
-                         imps.append(clf.estimator.feature_importances_)
-                     elif hasattr(clf, 'base_estimator') and hasattr(clf.base_estimator, 'feature_importances_'):
-                         imps.append(clf.base_estimator.feature_importances_)
-                         
-                 if imps:
-                     avg_imps = np.mean(imps, axis=0)
-                     importances = pd.Series(avg_imps, index=all_feats).sort_values(ascending=False)
-                     print("\nTop 5 Features (Sentiment RF):")
-                     print(importances.head(5))
-                     plot_feature_importance(importances, ticker)
-            else:
-                # Fallback if not calibrated or standard RF
-                if hasattr(model_sent_rf, 'feature_importances_'):
-                    importances = pd.Series(model_sent_rf.feature_importances_, index=all_feats).sort_values(ascending=False)
-                    print("\nTop 5 Features (Sentiment RF):")
-                    print(importances.head(5))
+            if run_rf:
+                # === Experiment 1: Base Model (RF) ===
+                print("\n--- Running Base Model (RF) ---")
+                preds_base_rf, probs_base_rf, fitted['base_rf'] = train_rf(
+                    X_train_base, train_df['Target'],
+                    X_test_base, test_df['Target'],
+                    calibrate=True
+                )
+                acc_base_rf = accuracy_score(test_df['Target'], preds_base_rf)
+                print(f"Base RF Accuracy: {acc_base_rf:.2%}")
+                model_preds['Base RF'] = (preds_base_rf, acc_base_rf, 0)
+                
+                # === Experiment 2: Sentiment Model (RF) ===
+                print("\n--- Running Sentiment Model (RF) ---")
+                preds_sent_rf, probs_sent_rf, fitted['sent_rf'] = train_rf(
+                    X_train_all, train_df['Target'],
+                    X_test_all, test_df['Target'],
+                    calibrate=True
+                )
+                acc_sent_rf = accuracy_score(test_df['Target'], preds_sent_rf)
+                print(f"Sentiment RF Accuracy: {acc_sent_rf:.2%}")
+                model_preds['Sent RF'] = (preds_sent_rf, acc_sent_rf, 0)
+                
+                # Calibration & Brier Score (Sentiment RF)
+                brier_sent_rf = brier_score_loss(test_df['Target'], probs_sent_rf)
+                print(f"Sentiment RF Brier Score: {brier_sent_rf:.4f}")
+                if plots:
+                    plot_calibration_curve_func(test_df['Target'], probs_sent_rf, ticker, title="Calibration Curve (RF Sentiment)")
+                
+                # Feature Importance (the calibrated wrapper exposes the single forest's importances)
+                importances = pd.Series(fitted['sent_rf'].feature_importances_, index=all_feats).sort_values(ascending=False)
+                print("\nTop 5 Features (Sentiment RF):")
+                print(importances.head(5))
+                if plots:
                     plot_feature_importance(importances, ticker)
 
-            # === Experiment 3: Base Model (LSTM) ===
-            print("\n--- Running Base Model (LSTM) ---")
-            # Note: LSTM predictions will be shorter by SEQ_LEN
-            preds_base_lstm, probs_base_lstm, _ = train_lstm(
-                train_df[base_feats], train_df['Target'],
-                test_df[base_feats], test_df['Target'],
-                input_dim=len(base_feats)
-            )
-            # Align targets for LSTM
-            y_test_lstm = test_df['Target'].iloc[SEQ_LEN:].values
-            acc_base_lstm = accuracy_score(y_test_lstm, preds_base_lstm)
-            print(f"Base LSTM Accuracy: {acc_base_lstm:.2%}")
-
-            # === Experiment 4: Sentiment Model (LSTM) ===
-            print("\n--- Running Sentiment Model (LSTM) ---")
-            preds_sent_lstm, probs_sent_lstm, _ = train_lstm(
-                train_df[all_feats], train_df['Target'],
-                test_df[all_feats], test_df['Target'],
-                input_dim=len(all_feats)
-            )
-            acc_sent_lstm = accuracy_score(y_test_lstm, preds_sent_lstm)
-            print(f"Sentiment LSTM Accuracy: {acc_sent_lstm:.2%}")
-
-            # === Experiment 5: ARIMA ===
-            print("\n--- Running ARIMA Model ---")
-            preds_arima, probs_arima = train_arima(
-                train_df['Close'], 
-                test_df['Close'],
-                order=(5, 1, 0)
-            )
-            acc_arima = accuracy_score(test_df['Target'], preds_arima)
-            print(f"ARIMA Accuracy: {acc_arima:.2%}")
+            if run_lstm:
+                # === Experiment 3: Base Model (LSTM) ===
+                print("\n--- Running Base Model (LSTM) ---")
+                # Note: LSTM predictions will be shorter by SEQ_LEN
+                if ticker in lstm_results:
+                    preds_base_lstm, probs_base_lstm = lstm_results[ticker]['base']
+                    # Grouped weights are not saved per ticker
+                else:
+                    preds_base_lstm, probs_base_lstm, fitted['base_lstm'] = train_lstm(
+                        X_train_base, train_df['Target'],
+                        X_test_base, test_df['Target'],
+                        input_dim=len(base_feats)
+                    )
+                # Align targets for LSTM
+                y_test_lstm = test_df['Target'].iloc[SEQ_LEN:].values
+                acc_base_lstm = accuracy_score(y_test_lstm, preds_base_lstm)
+                print(f"Base LSTM Accuracy: {acc_base_lstm:.2%}")
+                model_preds['Base LSTM'] = (preds_base_lstm, acc_base_lstm, SEQ_LEN)
+
+                # === Experiment 4: Sentiment Model (LSTM) ===
+                print("\n--- Running Sentiment Model (LSTM) ---")
+                if ticker in lstm_results:
+                    preds_sent_lstm, probs_sent_lstm = lstm_results[ticker]['sent']
+                else:
+                    preds_sent_lstm, probs_sent_lstm, fitted['sent_lstm'] = train_lstm(
+                        X_train_all, train_df['Target'],
+                        X_test_all, test_df['Target'],
+                        input_dim=len(all_feats)
+                    )
+                acc_sent_lstm = accuracy_score(y_test_lstm, preds_sent_lstm)
+                print(f"Sentiment LSTM Accuracy: {acc_sent_lstm:.2%}")
+                model_preds['Sent LSTM'] = (preds_sent_lstm, acc_sent_lstm, SEQ_LEN)
+            
+            if run_arima:
+                # === Experiment 5: ARIMA ===
+                print("\n--- Running ARIMA Model ---")
+                if ticker in arima_results:
+                    preds_arima, probs_arima, arima_order, arima_params = arima_results[ticker]
+                else:
+                    arima_order = ARIMA_ORDER
+                    if ARIMA_ORDER_SELECTION:
+                        import arima_engine
+                        arima_order = arima_engine.select_orders(
+                            {ticker: train_df['Close']}, ARIMA_ENGINE, ARIMA_CRITERION,
+                            cache_path=ARIMA_ORDER_CACHE_PATH
+                        )[ticker]
+                    preds_arima, probs_arima, arima_params = train_arima(
+                        train_df['Close'],
+                        test_df['Close'],
+                        order=arima_order,
+                        return_params=True,
+                        engine=ARIMA_ENGINE,
+                        refit_every=ARIMA_REFIT_EVERY
+                    )
+                acc_arima = accuracy_score(test_df['Target'], preds_arima)
+                print(f"ARIMA Accuracy: {acc_arima:.2%}")
+                model_preds['ARIMA'] = (preds_arima, acc_arima, 0)
+                fitted['arima'] = (arima_order, arima_params)
+
+            if save_models and fitted:
+                save_ticker_models(registry, run_id, ticker, train_df, test_df, base_feats, all_feats, fitted)
 
             # === Backtesting ===
-            print("\n=== Backtest Results (Cumulative Return) ===")
-            actual_returns = test_df['Return'].values
+            with tracer.stage('backtest', ticker=ticker):
+                print("\n=== Backtest Results (Cumulative Return) ===")
+                actual_returns = test_df['Return'].values
+                tracer.count('backtest_rows', len(actual_returns))
             
-            equity_curves = {}
-            metrics = []
-
-            # Buy & Hold
-            equity_bh = [1.0]
-            for r in actual_returns:
-                equity_bh.append(equity_bh[-1] * (1 + r))
-            bh_return = (equity_bh[-1] - 1) * 100
-            print(f"Buy & Hold: {bh_return:.2f}%")
-            equity_curves['Buy & Hold'] = equity_bh
+                equity_curves = {}
+                strategy_returns = {}
+                metrics = {}
+
+                # Buy & Hold
+                equity_bh = [1.0]
+                for r in actual_returns:
+                    equity_bh.append(equity_bh[-1] * (1 + r))
+                bh_return = (equity_bh[-1] - 1) * 100
+                print(f"Buy & Hold: {bh_return:.2f}%")
+                equity_curves['Buy & Hold'] = equity_bh
             
-            m_bh = calculate_trading_metrics(equity_bh)
-            m_bh.update({'Ticker': ticker, 'Model': 'Buy & Hold', 'Accuracy': np.nan, 'Return': bh_return})
-            metrics.append(m_bh)
+                m_bh = calculate_trading_metrics(equity_bh)
+                m_bh.update({'Ticker': ticker, 'Model': 'Buy & Hold', 'Accuracy': np.nan, 'Return': bh_return})
+                metrics['Buy & Hold'] = m_bh
             
-            # RF Base
-            equity_base_rf, ret_base_rf = backtest_strategy(actual_returns, preds_base_rf, "Base RF")
-            print(f"Base RF:    {ret_base_rf:.2f}%")
-            equity_curves['Base RF'] = equity_base_rf
+                # Model strategies (LSTM curves are padded for the SEQ_LEN days they don't cover)
+                for name, (preds, acc, offset) in model_preds.items():
+                    equity, ret = backtest_strategy(actual_returns[offset:], preds, name)
+                    strategy_returns[name] = backtest_with_alignment(actual_returns[offset:], preds)
+                    print(f"{name + ':':<12}{ret:.2f}%")
+                    equity_curves[name] = [np.nan] * offset + equity
+                
+                    m = calculate_trading_metrics(equity)
+                    m.update({'Ticker': ticker, 'Model': name, 'Accuracy': acc, 'Return': ret})
+                    metrics[name] = m
             
-            m_base_rf = calculate_trading_metrics(equity_base_rf)
-            m_base_rf.update({'Ticker': ticker, 'Model': 'Base RF', 'Accuracy': acc_base_rf, 'Return': ret_base_rf})
-            metrics.append(m_base_rf)
+                # === Incremental Value Test (Sentiment vs Base, per model) ===
+                import significance
+                for base_name, sent_name in significance.MODEL_PAIRS:
+                    if base_name not in metrics or sent_name not in metrics:
+                        continue
+                    delta_sharpe = metrics[sent_name]['Sharpe'] - metrics[base_name]['Sharpe']
+                    delta_pf = metrics[sent_name]['ProfitFactor'] - metrics[base_name]['ProfitFactor']
+                    print(f"\nIncremental Value ({sent_name} vs {base_name}):")
+                    print(f"Delta Sharpe: {delta_sharpe:.4f}")
+                    print(f"Delta Profit Factor: {delta_pf:.4f}")
+                    if SIGNIFICANCE_TESTS:
+                        test = significance.incremental_value(strategy_returns[base_name], strategy_returns[sent_name],
+                                                              seed=RANDOM_SEED)
+                        print(f"Delta Sharpe {significance.CONFIDENCE:.0%} CI: [{test['Delta_Sharpe_CI_Low']:.4f}, "
+                              f"{test['Delta_Sharpe_CI_High']:.4f}], p = {test['Delta_Sharpe_P']:.4f} ({test['Bootstrap']})")
+                        print(f"Diebold-Mariano: {test['DM_Stat']:.4f}, p = {test['DM_P']:.4f}")
+                        metrics[sent_name].update(test)
             
-            # RF Sentiment
-            equity_sent_rf, ret_sent_rf = backtest_strategy(actual_returns, preds_sent_rf, "Sent RF")
-            print(f"Sent RF:    {ret_sent_rf:.2f}%")
-            equity_curves['Sent RF'] = equity_sent_rf
-            
-            m_sent_rf = calculate_trading_metrics(equity_sent_rf)
-            m_sent_rf.update({'Ticker': ticker, 'Model': 'Sent RF', 'Accuracy': acc_sent_rf, 'Return': ret_sent_rf})
-            metrics.append(m_sent_rf)
-            
-            # LSTM Base
-            lstm_returns = actual_returns[SEQ_LEN:]
-            equity_base_lstm, ret_base_lstm = backtest_strategy(lstm_returns, preds_base_lstm, "Base LSTM")
-            print(f"Base LSTM:  {ret_base_lstm:.2f}%")
-            equity_curves['Base LSTM'] = [np.nan]*SEQ_LEN + equity_base_lstm
-            
-            m_base_lstm = calculate_trading_metrics(equity_base_lstm)
-            m_base_lstm.update({'Ticker': ticker, 'Model': 'Base LSTM', 'Accuracy': acc_base_lstm, 'Return': ret_base_lstm})
-            metrics.append(m_base_lstm)
-            
-            # LSTM Sentiment
-            equity_sent_lstm, ret_sent_lstm = backtest_strategy(lstm_returns, preds_sent_lstm, "Sent LSTM")
-            print(f"Sent LSTM:  {ret_sent_lstm:.2f}%")
-            equity_curves['Sent LSTM'] = [np.nan]*SEQ_LEN + equity_sent_lstm
-            
-            m_sent_lstm = calculate_trading_metrics(equity_sent_lstm)
-            m_sent_lstm.update({'Ticker': ticker, 'Model': 'Sent LSTM', 'Accuracy': acc_sent_lstm, 'Return': ret_sent_lstm})
-            metrics.append(m_sent_lstm)
-            
-            # ARIMA
-            equity_arima, ret_arima = backtest_strategy(actual_returns, preds_arima, "ARIMA")
-            print(f"ARIMA:      {ret_arima:.2f}%")
-            equity_curves['ARIMA'] = equity_arima
-            
-            m_arima = calculate_trading_metrics(equity_arima)
-            m_arima.update({'Ticker': ticker, 'Model': 'ARIMA', 'Accuracy': acc_arima, 'Return': ret_arima})
-            metrics.append(m_arima)
-            
-            # === Incremental Value Test (RF) ===
-            delta_sharpe = m_sent_rf['Sharpe'] - m_base_rf['Sharpe']
-            delta_pf = m_sent_rf['ProfitFactor'] - m_base_rf['ProfitFactor']
-            print(f"\nIncremental Value (RF Sentiment vs Base):")
-            print(f"Delta Sharpe: {delta_sharpe:.4f}")
-            print(f"Delta Profit Factor: {delta_pf:.4f}")
-            
-            all_metrics.extend(metrics)
+            all_metrics.extend(metrics.values())
 
             # === Reporting & Plotting ===
             print("\n=== Generating Reports ===")
@@ -648,14 +913,44 @@ def run_experiment():
             save_presentation_data(test_df, equity_curves, ticker)
             
             # 2. Plot Equity Curves
-            plot_equity_curves(equity_curves, ticker)
+            if plots:
+                plot_equity_curves(equity_curves, ticker)
 
         except Exception as e:
             print(f"Error processing {ticker}: {e}")
             traceback.print_exc()
 
+    # Served as the latest run only once every ticker's models are saved
+    if registry is not None:
+        registry.finish_run(run_id)
+    
     # Save all metrics
-    save_metrics_to_csv(all_metrics)
+    save_metrics(all_metrics, output_formats)
+    if USE_FEATURE_STORE:
+        get_feature_store().report()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the sentiment vs. market experiment')
+    parser.add_argument('--tickers', nargs='+', help='Tickers to run (default: all in DATA_PATH)')
+    parser.add_argument('--models', nargs='+', choices=MODEL_CHOICES, default=MODEL_CHOICES,
+                        help='Models to train (default: all)')
+    parser.add_argument('--start', help='First date of the sample, e.g. 2016-01-01 (default: all history)')
+    parser.add_argument('--end', help='Last date of the sample (default: all history)')
+    parser.add_argument('--format', nargs='+', choices=OUTPUT_FORMATS, default=['csv'], dest='formats',
+                        help='Output format(s) for model_metrics (default: csv)')
+    parser.add_argument('--no-plots', action='store_true', help='Skip PNG plots (matplotlib is not imported)')
+    parser.add_argument('--no-save-models', action='store_true', help='Do not write fitted models to the registry')
+    parser.add_argument('--lstm-mode', choices=['per_ticker', 'batched'], default=LSTM_MODE,
+                        help=f'LSTM training mode (default: {LSTM_MODE})')
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    tracer.configure(args.trace, args.profile)
+
+    run_experiment(
+        lstm_mode=args.lstm_mode, tickers=args.tickers, models=args.models,
+        start=args.start, end=args.end, plots=SAVE_PLOTS and not args.no_plots,
+        save_models=SAVE_MODELS and not args.no_save_models, output_formats=args.formats,
+    )
 
 if __name__ == "__main__":
-    run_experiment()
\ No newline at end of file
+    main()
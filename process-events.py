@@ -0,0 +1,195 @@
+"""
+GDELT Events (export) signal aggregator.
+
+Streams every *.export.CSV in INPUT_DIR through a process pool, reading only
+the date, EventRootCode, QuadClass, GoldsteinScale, NumMentions, AvgTone and
+ActionGeo_CountryCode columns. Each event is weighted by its mentions times a
+country weight, and every file is reduced in one pass to per-day weighted sums
+(appended to PARTIALS_FILE). Files are logged as they finish, so an
+interrupted run resumes where it stopped. GDELT 2.0 writes 96 files per day;
+the partial sums are combined into daily indices at the end of every run:
+
+    Events_Goldstein          weighted mean Goldstein scale (-10 conflict .. +10 cooperation)
+    Events_Tone               weighted mean AvgTone
+    Events_Cooperation        weighted share of QuadClass 1-2 (verbal/material cooperation)
+    Events_Conflict           weighted share of QuadClass 3-4 (verbal/material conflict)
+    Events_Material_Conflict  weighted share of QuadClass 4
+    Events_Net_Cooperation    Cooperation - Conflict
+    Events_Protest            weighted share of EventRootCode 14
+    Events_Violence           weighted share of EventRootCode 18-20
+    Events_Count, Events_Mentions
+
+The output has one row per Date (YYYYMMDD, as in gdelt_economic_signals.csv)
+and merges alongside it on Date.
+
+Usage:
+    python process-events.py
+"""
+
+import glob
+import os
+import time
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from instrumentation import run_traced, tracer
+
+# --- CONFIGURATION ---
+INPUT_DIR = "data"                                     # Folder containing *.export.CSV files
+FILE_PATTERN = "*.export.CSV"
+PARTIALS_FILE = "results/gdelt_event_partials.csv"     # Per-file daily sums (appended)
+OUTPUT_FILE = "results/gdelt_event_signals.csv"        # Final daily table
+LOG_FILE = "processed_events_log.txt"                  # Tracks finished files
+CPU_CORES = max(1, cpu_count() - 1)                    # Leave 1 core free for OS
+# Stage timings: set PIPELINE_TRACE=<path|auto> (and/or PIPELINE_PROFILE=<dir>) to write a JSON trace
+
+# 'SQLDATE' keys events by the day they happened; 'DATEADDED' (GDELT 2.0) by the day they
+# were published, which keeps late-reported events out of earlier days' signals
+DATE_COLUMN = 'SQLDATE'
+
+# Column positions (GDELT 1.0 daily files have 58 columns, 2.0 files 61; see collect-gdelt.py)
+COLUMNS_V1 = {1: 'SQLDATE', 28: 'EventRootCode', 29: 'QuadClass', 30: 'GoldsteinScale',
+              31: 'NumMentions', 34: 'AvgTone', 51: 'ActionGeo_CountryCode', 56: 'DATEADDED'}
+COLUMNS_V2 = {1: 'SQLDATE', 28: 'EventRootCode', 29: 'QuadClass', 30: 'GoldsteinScale',
+              31: 'NumMentions', 34: 'AvgTone', 53: 'ActionGeo_CountryCode', 59: 'DATEADDED'}
+
+# Event weight = NumMentions x country weight (FIPS 10-4 codes of the action location)
+COUNTRY_WEIGHTS = {
+    'US': 1.0, 'CH': 0.6, 'JA': 0.5, 'GM': 0.5, 'UK': 0.5, 'FR': 0.4,
+    'IN': 0.3, 'CA': 0.3, 'IT': 0.3, 'KS': 0.3, 'RS': 0.3, 'SA': 0.3, 'BR': 0.3,
+}
+DEFAULT_COUNTRY_WEIGHT = 0.1
+
+PROTEST_ROOT_CODES = {'14'}
+VIOLENCE_ROOT_CODES = {'18', '19', '20'}
+
+SUM_COLUMNS = ['Weight', 'Goldstein', 'Tone', 'Cooperation', 'Conflict', 'Material_Conflict',
+               'Protest', 'Violence', 'Events', 'Mentions']
+
+
+def detect_columns(file_path):
+    """Column map for the file's format, from the field count of its first line."""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        n_fields = len(f.readline().split('\t'))
+    return COLUMNS_V1 if n_fields <= 58 else COLUMNS_V2
+
+
+@tracer.timed()
+def process_file(file_path):
+    """
+    Worker function: reads one export file and returns (file_path, per-day weighted sums).
+    """
+    try:
+        tracer.count('bytes_read', os.path.getsize(file_path))
+        columns = detect_columns(file_path)
+        df = pd.read_csv(
+            file_path,
+            sep='\t',
+            header=None,
+            usecols=list(columns),
+            dtype={pos: str for pos, name in columns.items() if name in ('SQLDATE', 'EventRootCode',
+                                                                         'ActionGeo_CountryCode', 'DATEADDED')},
+            on_bad_lines='skip',
+            encoding='utf-8',
+            encoding_errors='replace',
+        ).rename(columns=columns)
+        tracer.count('rows_read', len(df))
+
+        date = df[DATE_COLUMN].str[:8]
+        quad = pd.to_numeric(df['QuadClass'], errors='coerce')
+        goldstein = pd.to_numeric(df['GoldsteinScale'], errors='coerce')
+        tone = pd.to_numeric(df['AvgTone'], errors='coerce')
+        mentions = pd.to_numeric(df['NumMentions'], errors='coerce').fillna(1).clip(lower=1)
+        valid = date.notna() & quad.notna() & goldstein.notna() & tone.notna()
+        tracer.count('rows_kept', int(valid.sum()))
+        if not valid.any():
+            return (file_path, None)
+
+        weight = mentions * df['ActionGeo_CountryCode'].map(COUNTRY_WEIGHTS).fillna(DEFAULT_COUNTRY_WEIGHT)
+        root = df['EventRootCode'].str.zfill(2)
+        sums = pd.DataFrame({
+            'Date': date,
+            'Weight': weight,
+            'Goldstein': weight * goldstein,
+            'Tone': weight * tone,
+            'Cooperation': weight * quad.isin([1, 2]),
+            'Conflict': weight * quad.isin([3, 4]),
+            'Material_Conflict': weight * (quad == 4),
+            'Protest': weight * root.isin(PROTEST_ROOT_CODES),
+            'Violence': weight * root.isin(VIOLENCE_ROOT_CODES),
+            'Events': 1,
+            'Mentions': mentions,
+        })[valid]
+        return (file_path, sums.groupby('Date', sort=False)[SUM_COLUMNS].sum().reset_index())
+
+    except Exception as e:
+        # Return nothing but don't crash the main process
+        return (file_path, None)
+
+
+def build_signals(partials_file=PARTIALS_FILE, output_file=OUTPUT_FILE):
+    """Combines the per-file partial sums into the daily signal table."""
+    partials = pd.read_csv(partials_file, dtype={'Date': str})
+    daily = partials.groupby('Date')[SUM_COLUMNS].sum().sort_index()
+    weight = daily['Weight'].replace(0, np.nan)
+    signals = pd.DataFrame({
+        'Events_Goldstein': daily['Goldstein'] / weight,
+        'Events_Tone': daily['Tone'] / weight,
+        'Events_Cooperation': daily['Cooperation'] / weight,
+        'Events_Conflict': daily['Conflict'] / weight,
+        'Events_Material_Conflict': daily['Material_Conflict'] / weight,
+        'Events_Net_Cooperation': (daily['Cooperation'] - daily['Conflict']) / weight,
+        'Events_Protest': daily['Protest'] / weight,
+        'Events_Violence': daily['Violence'] / weight,
+        'Events_Count': daily['Events'].astype(np.int64),
+        'Events_Mentions': daily['Mentions'].astype(np.int64),
+    })
+    signals.to_csv(output_file, index_label='Date')
+    print(f"Saved {output_file}: {len(signals)} days")
+    return signals
+
+
+if __name__ == "__main__":
+    tracer.configure()
+
+    # 1. Setup Resume Logic
+    processed_files = set()
+    if os.path.exists(LOG_FILE):
+        with open(LOG_FILE, 'r') as f:
+            processed_files = set(f.read().splitlines())
+
+    os.makedirs(os.path.dirname(PARTIALS_FILE), exist_ok=True)
+    if not os.path.exists(PARTIALS_FILE):
+        with open(PARTIALS_FILE, 'w') as f:
+            f.write(','.join(['Date', *SUM_COLUMNS]) + "\n")
+
+    # 2. Get File List
+    all_files = sorted(glob.glob(os.path.join(INPUT_DIR, FILE_PATTERN)))
+    files_to_process = [f for f in all_files if os.path.basename(f) not in processed_files]
+
+    print(f"Total files: {len(all_files)}")
+    print(f"Already processed: {len(processed_files)}")
+    print(f"Remaining: {len(files_to_process)}")
+
+    # 3. Parallel Processing (results are written as they arrive; the log follows the data)
+    start = time.perf_counter()
+    if files_to_process:
+        with open(PARTIALS_FILE, 'a') as partials_out, open(LOG_FILE, 'a') as log_out:
+            with Pool(processes=CPU_CORES) as pool:
+                iterator = pool.imap_unordered(partial(run_traced, process_file), files_to_process)
+                for (file_path, sums), trace in tqdm(iterator, total=len(files_to_process), unit="file"):
+                    tracer.merge(trace)
+                    if sums is not None:
+                        sums.to_csv(partials_out, header=False, index=False)
+                        partials_out.flush()
+                    log_out.write(os.path.basename(file_path) + "\n")
+                    log_out.flush()  # Right after its partials, so an interrupted run does not re-add the file
+        print(f"Processed {len(files_to_process)} files in {time.perf_counter() - start:.1f}s")
+
+    # 4. Daily signals from all partial sums (cheap; rebuilt on every run)
+    build_signals()
+    print("Processing Complete.")
@@ -1,16 +1,39 @@
+import numpy as np
 import pandas as pd
+import argparse
 import glob
 import os
 import csv
+import subprocess
 import time
+from functools import partial
 from multiprocessing import Pool, cpu_count
 from tqdm import tqdm  # Progress bar
+from instrumentation import run_traced, tracer
+import dedup
+import entity_index
+import theme_matrix
 
 # --- CONFIGURATION ---
 INPUT_DIR = "data"                  # Folder containing .gkg.csv files
 OUTPUT_FILE = "results/gdelt_economic_signals.csv"  # Final aggregated output
 LOG_FILE = "processed_log.txt"      # Tracks finished files
 CPU_CORES = max(1, cpu_count() - 1) # Leave 1 core free for OS
+# --watch: keep running and ingest new files as they land (see watcher.py for queue/backpressure settings)
+# Stage timings: set PIPELINE_TRACE=<path|auto> (and/or PIPELINE_PROFILE=<dir>) to write a JSON trace
+
+# Per-theme daily matrix (count, tone sum, tone sum of squares per date x theme), built in the
+# same pass; parts go to THEME_PARTS_DIR and are compacted into results/theme_matrix.npz
+THEME_MATRIX = True
+THEME_MATRIX_ALL_THEMES = False     # True: every theme, not only KEEP_THEMES matches + market themes
+
+# Organization -> daily tone index (entity_index.py), built in the same pass from ORGANIZATIONS
+ENTITY_INDEX = True
+
+# Near-duplicate suppression for the News_* signals (dedup.py): repeated URLs and syndicated copies
+# (same theme/organization SimHash and tone) within a file and across the last dedup.WINDOW_DAYS days.
+# Per-day duplicate counts are appended to dedup.DEDUP_STATS_PATH; the filter state persists between runs.
+DEDUP = True
 
 # GDELT V1 GKG Column Names (Files have no headers)
 COL_NAMES = [   
@@ -37,29 +60,48 @@ def is_relevant(theme_str):
             return True
     return False
 
+@tracer.timed()
 def process_file(file_path):
     """
     Worker function: Reads one CSV, filters, aggregates, returns result.
+    Returns (file_path, daily sums, signatures, per-theme aggregates, per-entity aggregates);
+    any may be None. Daily sums (daily_sums) exclude duplicates within the file. With DEDUP,
+    signatures holds the compact match data of the rows kept (plus Polarity), so the main
+    process can apply the cross-day filter and take its hits out of the sums (remove_rows).
     """
     try:
+        tracer.count('bytes_read', os.path.getsize(file_path))
         # 1. Read specific columns only to save RAM
         # quoted=csv.QUOTE_NONE is crucial because GDELT V1 is messy with quotes
         df = pd.read_csv(
             file_path, 
             sep='\t', 
             names=COL_NAMES, 
-            usecols=['DATE', 'THEMES', 'TONE'],
-            dtype={'DATE': str, 'THEMES': str, 'TONE': str},
+            usecols=['DATE', 'THEMES', 'ORGANIZATIONS', 'TONE', 'SOURCEURLS'],
+            dtype={'DATE': str, 'THEMES': str, 'ORGANIZATIONS': str, 'TONE': str, 'SOURCEURLS': str},
             on_bad_lines='skip',
             encoding='utf-8',
             quoting=csv.QUOTE_NONE
         )
+        tracer.count('rows_read', len(df))
+        
+        # Per-theme and per-organization aggregates over all rows (before the KEEP_THEMES filter)
+        theme_df, entity_df = None, None
+        if THEME_MATRIX or ENTITY_INDEX:
+            avg_tone = pd.to_numeric(df['TONE'].str.split(',', n=1).str[0], errors='coerce')
+        if THEME_MATRIX:
+            theme_df = theme_matrix.aggregate_themes(df, avg_tone, None if THEME_MATRIX_ALL_THEMES else KEEP_THEMES)
+            tracer.count('theme_cells', 0 if theme_df is None else len(theme_df))
+        if ENTITY_INDEX:
+            entity_df = entity_index.aggregate_entities(df, 'ORGANIZATIONS', avg_tone)
+            tracer.count('entity_cells', 0 if entity_df is None else len(entity_df))
         
         # 2. Filter Rows (Discard non-economic news immediately)
         df = df[df['THEMES'].apply(is_relevant)]
+        tracer.count('rows_kept', len(df))
         
         if df.empty:
-            return (file_path, None)
+            return (file_path, None, None, theme_df, entity_df)
 
         # 3. Parse TONE
         # Format: "AvgTone,Pos,Neg,Polarity,ARD,SGRD"
@@ -68,28 +110,207 @@ def process_file(file_path):
         
         # Safety check: ensure split worked
         if tone_data.shape[1] < 4:
-            return (file_path, None)
-
-        df['AvgTone'] = pd.to_numeric(tone_data[0], errors='coerce')
-        df['Polarity'] = pd.to_numeric(tone_data[3], errors='coerce')
+            return (file_path, None, None, theme_df, entity_df)
 
-        # 4. Aggregate to 1 Row Per Date
-        agg_df = df.groupby('DATE').agg({
-            'AvgTone': ['mean', 'std'],
-            'Polarity': 'mean',
-            'THEMES': 'count' # Volume
-        }).reset_index()
+        tone = pd.to_numeric(tone_data[0], errors='coerce').to_numpy(np.float64)
+        polarity = pd.to_numeric(tone_data[3], errors='coerce').to_numpy(np.float64)
+        dates = df['DATE'].astype(str).str[:8].to_numpy()
 
-        # Flatten MultiIndex columns
-        agg_df.columns = ['Date', 'News_Sentiment', 'News_Disagreement', 'News_Volatility', 'News_Volume']
+        # 4. Syndicated copies / repeated URLs within this file
+        sig, dup = None, None
+        if DEDUP:
+            sig = dedup.signatures(df, ['THEMES', 'ORGANIZATIONS'], 'SOURCEURLS', tone)
+            dup = dedup.mark_duplicates(sig)
+            tracer.count('rows_duplicate', int(dup.sum()))
+            sig = sig[~dup].reset_index(drop=True)
+            sig['DATE'] = sig['DATE'].astype('category')
+            sig['tokens'] = sig['tokens'].clip(upper=np.iinfo(np.int16).max).astype(np.int16)
+            sig['polarity'] = polarity[~dup]
         
-        return (file_path, agg_df)
+        return (file_path, daily_sums(dates, tone, polarity, dup), sig, theme_df, entity_df)
 
     except Exception as e:
         # Return the error but don't crash the main process
-        return (file_path, None)
+        return (file_path, None, None, None, None)
+
+def daily_sums(dates, tone, polarity, dup=None):
+    """
+    Additive per-day sums of relevant rows, indexed by date: the non-duplicate
+    row count, tone and polarity sums over those rows (NaN values are left out
+    of the sums but counted), and all records / duplicates for the stats.
+    """
+    keep = np.ones(len(dates), dtype=bool) if dup is None else ~np.asarray(dup, dtype=bool)
+    tone_ok, polarity_ok = keep & ~np.isnan(tone), keep & ~np.isnan(polarity)
+    return pd.DataFrame({
+        'count': keep.astype(np.int64),
+        'tone_n': tone_ok.astype(np.int64),
+        'tone_sum': np.where(tone_ok, tone, 0.0),
+        'tone_sq': np.where(tone_ok, tone * tone, 0.0),
+        'polarity_n': polarity_ok.astype(np.int64),
+        'polarity_sum': np.where(polarity_ok, polarity, 0.0),
+        'records': np.ones(len(dates), dtype=np.int64),
+        'duplicates': (~keep).astype(np.int64),
+    }).groupby(np.asarray(dates)).sum()
+
+def remove_rows(sums, dates, tone, polarity):
+    """Takes rows found to be duplicates after aggregation (cross-day) out of daily sums."""
+    removed = daily_sums(dates, tone, polarity)
+    signal_cols = ['count', 'tone_n', 'tone_sum', 'tone_sq', 'polarity_n', 'polarity_sum']
+    out = sums.copy()
+    out[signal_cols] = out[signal_cols].sub(removed[signal_cols], fill_value=0)
+    out['duplicates'] = out['duplicates'].add(removed['count'], fill_value=0)
+    return out.astype(sums.dtypes)
+
+def daily_signals(sums):
+    """News_* per date from daily sums; NaN tones are skipped by the means, counted in the volume."""
+    n = sums['tone_n'].to_numpy(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums['tone_sum'].to_numpy() / n
+        var = (sums['tone_sq'].to_numpy() - n * mean ** 2) / (n - 1)
+        polarity = sums['polarity_sum'].to_numpy() / sums['polarity_n'].to_numpy(np.float64)
+    daily = pd.DataFrame({
+        'Date': sums.index,
+        'News_Sentiment': mean,
+        'News_Disagreement': np.sqrt(np.clip(var, 0, None)),
+        'News_Volatility': polarity,
+        'News_Volume': sums['count'].astype(np.int64).to_numpy(),
+    })
+    return daily[daily['News_Volume'] > 0]
+
+class ResultWriter:
+    """
+    Writes each worker result: duplicate filtering, the daily aggregate, theme/entity
+    parts and the processed log. Batch runs append to OUTPUT_FILE; watch mode
+    (in_place=True) replaces the affected dates so a re-delivered file updates its day.
+    """
+
+    def __init__(self, in_place=False):
+        self.in_place = in_place
+        self.dedup_filter = dedup.RollingFilter.load() if DEDUP else None
+        if DEDUP and not os.path.exists(dedup.DEDUP_STATS_PATH):
+            with open(dedup.DEDUP_STATS_PATH, 'w') as f:
+                f.write("Date,Records,Duplicates\n")
+        self.csv_out = open(OUTPUT_FILE, 'a')
+        self.log_out = open(LOG_FILE, 'a')
+        self.dedup_out = open(dedup.DEDUP_STATS_PATH if DEDUP else os.devnull, 'a')
+
+    def write(self, file_path, sums, sig, theme_df, entity_df):
+        # Duplicates within the file are already out of the sums; take out matches of the last few days
+        if sums is not None and sig is not None:
+            dup = self.dedup_filter.check(sig)
+            if dup.any():
+                dups = sig[dup]
+                sums = remove_rows(sums, dups['DATE'].to_numpy(dtype=str), dups['tone'].to_numpy(),
+                                   dups['polarity'].to_numpy())
+        if sums is not None and DEDUP:
+            stats = sums[['records', 'duplicates']].rename(columns={'records': 'Records', 'duplicates': 'Duplicates'})
+            stats.rename_axis('Date').reset_index().to_csv(self.dedup_out, header=False, index=False)
+        
+        # Write Data (if valid)
+        daily = daily_signals(sums) if sums is not None else None
+        if daily is not None and not daily.empty:
+            if self.in_place:
+                upsert_daily(daily)
+            else:
+                daily.to_csv(self.csv_out, header=False, index=False)
+        if theme_df is not None:
+            theme_matrix.write_part(theme_df, file_path)
+        if entity_df is not None:
+            entity_index.write_part(entity_df, file_path)
+        
+        # Update Log (regardless of whether data was found, so we don't retry empties)
+        self.log_out.write(os.path.basename(file_path) + "\n")
+        if self.in_place:
+            self.dedup_out.flush()
+            self.log_out.flush()
+
+    def close(self):
+        for f in (self.csv_out, self.log_out, self.dedup_out):
+            f.close()
+
+def upsert_daily(agg_df, output_file=OUTPUT_FILE):
+    """Replaces (or adds) agg_df's dates in the output file; rewritten atomically."""
+    existing = pd.read_csv(output_file, dtype={'Date': str})
+    agg_df = agg_df.astype({'Date': str})
+    merged = pd.concat([existing[~existing['Date'].isin(agg_df['Date'])], agg_df], ignore_index=True)
+    tmp = output_file + '.tmp'
+    merged.sort_values('Date', kind='stable').to_csv(tmp, index=False)
+    os.replace(tmp, output_file)
+
+def update_downstream(dedup_filter, entity_signals=False, command=None):
+    """Persists the duplicate filter, compacts the theme/entity parts and runs follow-up updates."""
+    if DEDUP:
+        dedup_filter.save()
+    if THEME_MATRIX and os.path.isdir(theme_matrix.THEME_PARTS_DIR):
+        theme_matrix.compact()
+    if ENTITY_INDEX and os.path.isdir(entity_index.ENTITY_PARTS_DIR):
+        entity_index.compact()
+        if entity_signals:
+            entity_index.write_ticker_sentiment()
+    if command:
+        print(f"Running: {command}")
+        subprocess.run(command, shell=True, check=True)
+
+def run_batch(files_to_process):
+    writer = ResultWriter()
+    try:
+        # 3. Parallel Processing with TQDM
+        # We use 'imap' which yields results lazily, allowing tqdm to update.
+        with Pool(processes=CPU_CORES) as pool:
+            # imap (not imap_unordered) yields results in file order: the cross-day
+            # duplicate filter must see the days in date order
+            # (run_traced returns each worker's stage timings alongside its result)
+            iterator = pool.imap(partial(run_traced, process_file), files_to_process)
+            
+            # Wrap the iterator with tqdm for the progress bar
+            for result, trace in tqdm(iterator, total=len(files_to_process), unit="file"):
+                tracer.merge(trace)
+                writer.write(*result)
+    finally:
+        writer.close()
+    update_downstream(writer.dedup_filter)
+
+def run_watch(processed_files, args):
+    import watcher
+
+    writer = ResultWriter(in_place=True)
+
+    def handle(path, result):
+        result, trace = result
+        tracer.merge(trace)
+        writer.write(*result)
+
+    loop = watcher.WatchLoop(
+        watcher.DirectoryWatcher(INPUT_DIR, "*.gkg.csv", seen=processed_files, by_name=True),
+        task=partial(run_traced, process_file),
+        handle=handle,
+        downstream=lambda: update_downstream(writer.dedup_filter, entity_signals=True, command=args.on_update),
+        workers=args.workers,
+        max_queue=args.max_queue or watcher.MAX_QUEUE,
+        poll_interval=args.poll or watcher.POLL_INTERVAL,
+        ordered=True,  # The duplicate filter must see files in date (file name) order
+    )
+    try:
+        loop.run()
+    finally:
+        writer.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aggregate GDELT GKG files into daily economic news signals')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running: ingest new files in INPUT_DIR as they land and update outputs in place')
+    parser.add_argument('-w', '--workers', type=int, default=CPU_CORES,
+                        help=f'Worker processes (default: {CPU_CORES})')
+    parser.add_argument('--poll', type=float, default=None,
+                        help='Watch mode: seconds between scans (default: watcher.POLL_INTERVAL)')
+    parser.add_argument('--max-queue', type=int, default=None,
+                        help='Watch mode: queued files before intake pauses (default: watcher.MAX_QUEUE)')
+    parser.add_argument('--on-update', default=None, metavar='CMD',
+                        help='Watch mode: shell command run after each downstream update (e.g. a feature refresh)')
+    args = parser.parse_args()
+    CPU_CORES = args.workers
+    tracer.configure()
+    
     # 1. Setup Resume Logic
     processed_files = set()
     if os.path.exists(LOG_FILE):
@@ -101,8 +322,12 @@ if __name__ == "__main__":
         with open(OUTPUT_FILE, 'w') as f:
             f.write("Date,News_Sentiment,News_Disagreement,News_Volatility,News_Volume\n")
 
+    if args.watch:
+        run_watch(processed_files, args)
+        exit()
+
     # 2. Get File List
-    all_files = glob.glob(os.path.join(INPUT_DIR, "*.gkg.csv"))
+    all_files = sorted(glob.glob(os.path.join(INPUT_DIR, "*.gkg.csv")))  # Date order for the cross-day filter
     files_to_process = [f for f in all_files if os.path.basename(f) not in processed_files]
     
     print(f"Total files: {len(all_files)}")
@@ -113,25 +338,6 @@ if __name__ == "__main__":
         print("All files processed!")
         exit()
 
-    # 3. Parallel Processing with TQDM
-    # We use 'imap' (or imap_unordered) which yields results lazily, allowing tqdm to update.
-    with open(OUTPUT_FILE, 'a') as csv_out, open(LOG_FILE, 'a') as log_out:
-        with Pool(processes=CPU_CORES) as pool:
-            # imap_unordered is faster as it yields whoever finishes first
-            iterator = pool.imap_unordered(process_file, files_to_process)
-            
-            # Wrap the iterator with tqdm for the progress bar
-            for file_path, result_df in tqdm(iterator, total=len(files_to_process), unit="file"):
-                
-                # Write Data (if valid)
-                if result_df is not None:
-                    result_df.to_csv(csv_out, header=False, index=False)
-                
-                # Update Log (regardless of whether data was found, so we don't retry empties)
-                log_out.write(os.path.basename(file_path) + "\n")
-                
-                # Flush explicitly periodically if you are paranoid about crashes
-                # csv_out.flush()
-                # log_out.flush()
-
-    print("Processing Complete.")
\ No newline at end of file
+    run_batch(files_to_process)
+
+    print("Processing Complete.")
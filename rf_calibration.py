@@ -0,0 +1,74 @@
+"""
+Single-fit probability calibration for tree ensembles.
+
+Kept separate from modelling.py (and free of torch/statsmodels imports) so a
+pickled calibrated RF can be loaded and scored without the training stack.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.isotonic import IsotonicRegression
+from sklearn.linear_model import LogisticRegression
+
+
+class SingleFitCalibratedClassifier(ClassifierMixin, BaseEstimator):
+    """
+    Fits the base forest once and maps its probabilities through a 1-D
+    sigmoid or isotonic calibrator.
+    - 'holdout': the forest is trained on the first part of the (time-ordered)
+      training set and the calibrator on the remaining tail, so the map never
+      sees predictions on rows the forest was trained on.
+    - 'oob': the forest is trained on all rows and the calibrator on its
+      out-of-bag probabilities (requires bootstrap=True).
+    Exposes predict/predict_proba and the forest's feature_importances_, and is
+    a sklearn classifier so scorers (e.g. permutation_importance) accept it.
+    """
+    def __init__(self, estimator, method='sigmoid', calibration='oob', holdout_ratio=0.2):
+        self.estimator = estimator
+        self.method = method
+        self.calibration = calibration
+        self.holdout_ratio = holdout_ratio
+
+    def fit(self, X, y):
+        X, y = np.asarray(X), np.asarray(y)
+        if self.calibration == 'oob':
+            self.estimator.set_params(oob_score=True)
+            self.estimator.fit(X, y)
+            oob = self.estimator.oob_decision_function_
+            # Rows that were in-bag for every tree have no OOB votes; sklearn leaves
+            # them as an all-zero row (not NaN), which would read as P(up)=0
+            seen = oob.sum(axis=1) > 0
+            self._fit_calibrator(oob[seen, 1], y[seen])
+        elif self.calibration == 'holdout':
+            split = int(len(X) * (1 - self.holdout_ratio))
+            self.estimator.fit(X[:split], y[:split])
+            self._fit_calibrator(self.estimator.predict_proba(X[split:])[:, 1], y[split:])
+        else:
+            raise ValueError(f"Unknown calibration mode: {self.calibration}")
+        self.classes_ = self.estimator.classes_
+        return self
+
+    def _fit_calibrator(self, raw, y):
+        if self.method == 'sigmoid':
+            self.calibrator_ = LogisticRegression(C=1e6).fit(raw.reshape(-1, 1), y)
+        elif self.method == 'isotonic':
+            self.calibrator_ = IsotonicRegression(y_min=0, y_max=1, out_of_bounds='clip').fit(raw, y)
+        else:
+            raise ValueError(f"Unknown calibration method: {self.method}")
+
+    def calibrate(self, raw):
+        """Maps raw positive-class probabilities of the forest to calibrated ones."""
+        if self.method == 'sigmoid':
+            return self.calibrator_.predict_proba(raw.reshape(-1, 1))[:, 1]
+        return self.calibrator_.predict(raw)
+
+    def predict_proba(self, X):
+        pos = self.calibrate(self.estimator.predict_proba(np.asarray(X))[:, 1])
+        return np.column_stack([1 - pos, pos])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    @property
+    def feature_importances_(self):
+        return self.estimator.feature_importances_
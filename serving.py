@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Online Next-Day Signal Service
+
+Loads the sentiment RF/LSTM models of a modelling.py run (by default each
+ticker's newest saved models) from the model registry, warms a rolling
+feature state (the last few months per ticker) from DATA_PATH, and then
+accepts one new day at a time: each ticker's OHLCV plus the day's News_*
+aggregate. Features are updated incrementally (O(1) per feature, driven by
+the same FeatureSpec registry as create_features) and calibrated
+probabilities for every ticker come back in milliseconds.
+
+Usage:
+    python serving.py --port 8000            # HTTP service
+    python serving.py --stdin                # JSON lines on stdin -> JSON lines on stdout
+    python serving.py --once day.json        # Score a single payload and exit
+    python serving.py --run 20251216-093000  # Serve a specific model run
+
+Payload (POST /update, or one stdin line):
+    {"date": "2025-12-16",
+     "news": {"News_Sentiment": -2.1, "News_Disagreement": 3.8,
+              "News_Volatility": 6.6, "News_Volume": 11640},
+     "prices": {"SPX": {"Open": 6800.1, "Close": 6812.5, "Volume": 2.1e9}, ...}}
+
+HTTP endpoints:
+    POST /update   apply a new day and return signals
+    GET  /signals  signals for the latest day
+    GET  /metrics  request count and latency percentiles (ms)
+    GET  /health
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from features import DEFAULT_FEATURES
+from instrumentation import LatencyTracker
+from model_registry import ModelRegistry
+
+MODELS_DIR = os.path.join('results', 'models')
+DATA_PATH = 'results/merged_stooq_gdelt.csv'
+NEWS_COLUMNS = ['News_Sentiment', 'News_Disagreement', 'News_Volatility', 'News_Volume']
+WARMUP_ROWS = 250      # History replayed into the state at startup
+RESUM_EVERY = 1024     # Recompute running sums from the buffer this often to bound drift
+
+
+class RollingWindow:
+    """Fixed-size window with running sum and sum of squares (O(1) push)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self.nans = 0
+        self.pushes = 0
+
+    def push(self, x):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                self.s1 -= old
+                self.s2 -= old * old
+        self.values.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.s1 += x
+            self.s2 += x * x
+        self.pushes += 1
+        if self.pushes % RESUM_EVERY == 0:
+            finite = [v for v in self.values if not math.isnan(v)]
+            self.s1 = math.fsum(finite)
+            self.s2 = math.fsum(v * v for v in finite)
+
+    @property
+    def ready(self):
+        return len(self.values) == self.size and self.nans == 0
+
+    def mean(self):
+        return self.s1 / self.size if self.ready else math.nan
+
+    def std(self):
+        if not self.ready or self.size < 2:
+            return math.nan
+        mean = self.s1 / self.size
+        var = max((self.s2 - self.size * mean * mean) / (self.size - 1), 0.0)
+        return math.sqrt(var)
+
+
+class OnlineFeatureEngine:
+    """
+    Incremental counterpart of features.compute_features for one ticker.
+    Keeps short per-source histories (for lags and pct_change) and one
+    RollingWindow per (source, window) pair used by the specs.
+    """
+
+    def __init__(self, specs=DEFAULT_FEATURES):
+        self.specs = list(specs)
+        lookback = max((s.window or 0) for s in self.specs) + 1
+        self.history = {}
+        self.windows = {}
+        for spec in self.specs:
+            for source in self.sources_for(spec):
+                self.history.setdefault(source, deque(maxlen=lookback))
+            for key in self.windows_for(spec):
+                self.windows.setdefault(key, RollingWindow(key[1]))
+        self.prev_close = math.nan
+        self.latest = {}
+
+    @staticmethod
+    def sources_for(spec):
+        if spec.op == 'rsi':
+            return [f"{spec.source}:gain", f"{spec.source}:loss"]
+        if spec.op == 'spread':
+            return [spec.source, spec.other]
+        return [spec.source]
+
+    @staticmethod
+    def windows_for(spec):
+        if spec.op in ('mean', 'std', 'rel_to_mean', 'trend'):
+            return [(spec.source, spec.window)]
+        if spec.op == 'rsi':
+            return [(f"{spec.source}:gain", spec.window), (f"{spec.source}:loss", spec.window)]
+        return []
+
+    def update(self, row):
+        """
+        Pushes one day (dict with Open/Close/Volume/News_* and optionally Return)
+        and returns {feature name: value} for that day.
+        """
+        close = float(row['Close'])
+        values = dict(row)
+        if 'Return' not in values:
+            values['Return'] = close / self.prev_close - 1 if self.prev_close else math.nan
+        delta = close - self.prev_close
+        # Same convention as features.derived_source: no previous close counts as no move
+        values['Close:gain'] = delta if delta > 0 else 0.0
+        values['Close:loss'] = -delta if delta < 0 else 0.0
+        self.prev_close = close
+
+        for source, hist in self.history.items():
+            hist.append(float(values.get(source, math.nan)))
+        for (source, _), window in self.windows.items():
+            window.push(float(values.get(source, math.nan)))
+
+        out = {}
+        for spec in self.specs:
+            out[spec.name] = self.evaluate(spec, values, out)
+        self.latest = out
+        return out
+
+    def lagged(self, source, periods):
+        hist = self.history[source]
+        return hist[-1 - periods] if len(hist) > periods else math.nan
+
+    def evaluate(self, spec, values, out):
+        op, src, w = spec.op, spec.source, spec.window
+        x = float(values.get(src, math.nan))
+        if op == 'lag':
+            return self.lagged(src, w)
+        if op == 'pct_change':
+            return x / self.lagged(src, w) - 1
+        if op == 'mean':
+            return self.windows[(src, w)].mean()
+        if op == 'std':
+            return self.windows[(src, w)].std()
+        if op == 'rel_to_mean':
+            return x / self.windows[(src, w)].mean()
+        if op == 'trend':
+            return x / self.windows[(src, w)].mean() - 1
+        if op == 'rsi':
+            gain = self.windows[(f"{src}:gain", w)].mean()
+            loss = self.windows[(f"{src}:loss", w)].mean()
+            if loss == 0:
+                return 100.0 if gain > 0 else math.nan
+            return 100 - 100 / (1 + gain / loss)
+        if op == 'spread':
+            if spec.other not in values:
+                return 0.0
+            other = float(values[spec.other])
+            return (x - other) / other
+        if op == 'product':
+            return x * (out[spec.other] if spec.other in out else float(values[spec.other]))
+        raise ValueError(f"Unsupported online feature op '{op}' for {spec.name}")
+
+
+class FlatForest:
+    """
+    A fitted RandomForestClassifier flattened into padded (tree x node) arrays.
+    Scoring a handful of rows walks every tree at once with NumPy, avoiding
+    sklearn's per-tree dispatch, which dominates latency for single-row requests.
+    """
+
+    def __init__(self, forest):
+        trees = [est.tree_ for est in forest.estimators_]
+        width = max(t.node_count for t in trees)
+        self.depth = max(t.max_depth for t in trees)
+        n = len(trees)
+        self.left = np.zeros((n, width), dtype=np.int64)
+        self.right = np.zeros((n, width), dtype=np.int64)
+        self.feature = np.zeros((n, width), dtype=np.int64)
+        self.threshold = np.zeros((n, width), dtype=np.float64)
+        self.positive = np.zeros((n, width), dtype=np.float64)
+        for i, t in enumerate(trees):
+            k = t.node_count
+            leaf = t.children_left == -1
+            # Leaves point at themselves so extra iterations are no-ops
+            self.left[i, :k] = np.where(leaf, np.arange(k), t.children_left)
+            self.right[i, :k] = np.where(leaf, np.arange(k), t.children_right)
+            self.feature[i, :k] = np.maximum(t.feature, 0)
+            self.threshold[i, :k] = t.threshold
+            counts = t.value[:, 0, :]
+            self.positive[i, :k] = counts[:, 1] / counts.sum(axis=1)
+        self.rows = np.arange(n)
+
+    def predict_positive(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X))
+        for r, x in enumerate(X):
+            node = np.zeros(len(self.rows), dtype=np.int64)
+            for _ in range(self.depth):
+                go_left = x[self.feature[self.rows, node]] <= self.threshold[self.rows, node]
+                node = np.where(go_left, self.left[self.rows, node], self.right[self.rows, node])
+            out[r] = self.positive[self.rows, node].mean()
+        return out
+
+
+class TickerModels:
+    """Sentiment RF (calibrated) and optional LSTM for one ticker."""
+
+    def __init__(self, ticker, registry, run='latest'):
+        self.rf = registry.load(ticker, 'sent_rf', run)
+        self.features = registry.meta(ticker, run, 'sent_rf')['artifacts']['sent_rf']['features']
+        self.forest = FlatForest(getattr(self.rf, 'estimator', self.rf))
+        self.lstm = None
+        if ticker in registry.tickers(run, 'sent_lstm'):
+            self.lstm = registry.load(ticker, 'sent_lstm', run)
+            self.seq_len = registry.meta(ticker, run, 'sent_lstm')['artifacts']['sent_lstm']['seq_len']
+            self.mean = self.lstm.scaler.mean_.astype(np.float32)
+            self.scale = self.lstm.scaler.scale_.astype(np.float32)
+
+    def score(self, rows):
+        """rows: recent feature vectors (oldest first), the last one being today."""
+        raw = self.forest.predict_positive(rows[-1:])
+        prob = self.rf.calibrate(raw) if hasattr(self.rf, 'calibrate') else raw
+        result = {'rf': float(prob[0])}
+        # The LSTM was trained on windows X[t-seq_len:t] -> Target[t], so today's
+        # next-day signal uses the seq_len rows before today (see create_sequences).
+        if self.lstm is not None and len(rows) > self.seq_len:
+            import torch
+            window = (rows[-self.seq_len - 1:-1] - self.mean) / self.scale
+            with torch.no_grad():
+                result['lstm'] = float(self.lstm(torch.from_numpy(window[None].astype(np.float32)))[0, 0])
+        return result
+
+
+class SignalService:
+    """Holds per-ticker feature state and models; thread-safe update/score."""
+
+    def __init__(self, models_dir=MODELS_DIR, data_path=DATA_PATH, tickers=None, run='latest'):
+        registry = ModelRegistry(models_dir)
+        available = registry.tickers(run, 'sent_rf') if registry.runs() else []
+        self.tickers = [t for t in (tickers or available) if t in available]
+        if not self.tickers:
+            raise RuntimeError(f"No saved sentiment RF models in {models_dir}; run modelling.py first")
+        # With 'latest' every ticker's models come from the newest run that saved them
+        self.run = ', '.join(sorted({registry.resolve(run, t, 'sent_rf') for t in self.tickers}))
+        self.models = {t: TickerModels(t, registry, run) for t in self.tickers}
+        self.engines = {t: OnlineFeatureEngine() for t in self.tickers}
+        self.rows = {t: deque(maxlen=max(getattr(m, 'seq_len', 0) + 1, 1)) for t, m in self.models.items()}
+        self.latency = LatencyTracker()
+        self.lock = threading.Lock()
+        self.date = None
+        self.signals = {}
+        self.warm_up(data_path)
+
+    def warm_up(self, data_path):
+        """Replays the last WARMUP_ROWS days of history into every ticker's state."""
+        df = pd.read_csv(data_path)
+        df = df.sort_values('Date', kind='stable').tail(WARMUP_ROWS + 1)
+        for _, rec in df.iterrows():
+            news = {c: rec[c] for c in NEWS_COLUMNS if c in rec}
+            prices = {t: {f: rec[f"{t}_{f}"] for f in ('Open', 'Close', 'Volume')} for t in self.tickers}
+            self.apply(str(rec['Date']), news, prices, score=False)
+        print(f"Warmed up {len(self.tickers)} tickers through {self.date}")
+
+    def apply(self, date, news, prices, score=True):
+        for ticker in self.tickers:
+            if ticker not in prices:
+                continue
+            inputs = {**prices[ticker], **news}
+            # Model inputs may include raw columns (e.g. News_Disagreement) as well as features
+            values = {**inputs, **self.engines[ticker].update(inputs)}
+            names = self.models[ticker].features
+            self.rows[ticker].append(np.array([values[n] for n in names], dtype=np.float64))
+        self.date = date
+        if score:
+            self.signals = {}
+            for ticker in self.tickers:
+                rows = np.vstack(self.rows[ticker])
+                if np.isnan(rows[-1]).any():
+                    continue  # Not enough history for this ticker yet
+                self.signals[ticker] = self.models[ticker].score(rows)
+        return self.signals
+
+    def update(self, payload):
+        start = time.perf_counter()
+        with self.lock:
+            signals = self.apply(payload.get('date'), payload.get('news', {}), payload.get('prices', {}))
+            response = {'date': self.date, 'signals': signals}
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        response['latency_ms'] = elapsed * 1000
+        return response
+
+    def current(self):
+        with self.lock:
+            return {'date': self.date, 'signals': self.signals}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/signals':
+                self.send_json(service.current())
+            elif self.path == '/metrics':
+                self.send_json(service.latency.summary())
+            elif self.path == '/health':
+                self.send_json({'status': 'ok', 'tickers': service.tickers, 'date': service.date})
+            else:
+                self.send_json({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            if self.path != '/update':
+                self.send_json({'error': 'not found'}, 404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self.send_json(service.update(payload))
+            except Exception as e:
+                self.send_json({'error': str(e)}, 400)
+
+        def log_message(self, fmt, *args):
+            pass  # Latency is tracked in /metrics; keep stdout quiet
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve next-day signals from saved models')
+    parser.add_argument('--port', type=int, default=8000, help='HTTP port (default: 8000)')
+    parser.add_argument('--host', default='127.0.0.1', help='HTTP bind address (default: 127.0.0.1)')
+    parser.add_argument('--stdin', action='store_true', help='Read JSON payload lines from stdin')
+    parser.add_argument('--once', type=str, help='Score a single JSON payload file and exit')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help=f'Saved models (default: {MODELS_DIR})')
+    parser.add_argument('--data', default=DATA_PATH, help=f'History for warm-up (default: {DATA_PATH})')
+    parser.add_argument('--tickers', nargs='+', help='Tickers to serve (default: all saved)')
+    parser.add_argument('--run', default='latest', help="Model run id to serve (default: latest, each ticker's newest models)")
+    args = parser.parse_args()
+
+    service = SignalService(args.models_dir, args.data, args.tickers, args.run)
+
+    if args.once:
+        with open(args.once) as f:
+            print(json.dumps(service.update(json.load(f)), indent=2))
+        return
+    if args.stdin:
+        for line in sys.stdin:
+            if line.strip():
+                print(json.dumps(service.update(json.loads(line))), flush=True)
+        print(json.dumps(service.latency.summary()), file=sys.stderr)
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving signals for {', '.join(service.tickers)} (run {service.run}) on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-theme daily GKG sentiment as a sparse (date x theme) matrix.
+
+process-gdelt.py calls aggregate_themes() on every GKG file in the same pass
+that builds the global daily signals, and writes each file's result as a small
+long-format Parquet part (DATE, THEME, count, tone_sum, tone_sq). compact()
+merges the parts into results/theme_matrix.npz: one CSR structure (dates x
+themes) with three data arrays (record count, tone sum, tone sum of squares),
+so per-theme means, dispersion and pooled statistics over any set of themes
+come from a column slice instead of a re-scan of the raw GKG files.
+
+Usage:
+    python theme_matrix.py compact                          # Parts -> results/theme_matrix.npz
+    python theme_matrix.py info                             # Dates, themes, density
+    python theme_matrix.py show ECON_INFLATION ECON_DEBT    # Daily tone/count per theme
+
+    from theme_matrix import ThemeMatrix
+    tm = ThemeMatrix()
+    daily = tm.features(['ECON_INFLATION', 'ECON_CENTRALBANK'])  # date x (Tone, Count, Disagreement)
+    econ = tm.pooled(contains='ECON_')                            # all ECON_* themes combined
+"""
+
+import argparse
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+THEME_PARTS_DIR = os.path.join('results', 'theme_parts')
+THEME_MATRIX_PATH = os.path.join('results', 'theme_matrix.npz')
+
+# Market themes used by collect-gdelt.py's filter (always tracked here too)
+MARKET_THEMES = [
+    'ECON_STOCKMARKET',
+    'ECON_FINANCIAL_MARKETS',
+    'ECON_DEBT',
+    'ECON_CURRENCY_EXCHANGE_RATE',
+    'ECON_INFLATION',
+    'CRISISLEX_CRISISLEXREC',
+]
+
+STATS = ['count', 'tone_sum', 'tone_sq']
+
+
+def aggregate_themes(df, tone, keep_themes=None, market_themes=MARKET_THEMES):
+    """
+    Per (DATE, THEME) record count, tone sum and tone sum of squares for one GKG file.
+    df: DATE and THEMES (';'-separated) columns; tone: AvgTone per row (NaN rows are skipped).
+    Tracks themes containing any keep_themes substring plus the exact market_themes;
+    keep_themes=None tracks every theme.
+    """
+    rows = tone.notna() & df['THEMES'].notna()
+    if keep_themes is not None:
+        # Cheap record-level prefilter; exact theme matching happens after the split
+        rows &= df['THEMES'].str.contains('|'.join(re.escape(t) for t in [*keep_themes, *market_themes]))
+    rows = df.loc[rows, ['DATE', 'THEMES']].assign(tone=tone[rows])
+    if rows.empty:
+        return None
+
+    # One row per (record, theme); V2-style "THEME,offset" entries are reduced to the theme code
+    themes = rows['THEMES'].str.split(';').explode().str.split(',', n=1).str[0]
+    long = pd.DataFrame({'THEME': themes.values, 'record': themes.index})
+    long = long[long['THEME'].notna() & (long['THEME'] != '')].drop_duplicates()
+    if keep_themes is not None:
+        tracked = long['THEME'].str.contains('|'.join(re.escape(t) for t in keep_themes))
+        long = long[tracked | long['THEME'].isin(market_themes)]
+    if long.empty:
+        return None
+
+    long['DATE'] = rows['DATE'].loc[long['record']].values
+    long['tone'] = rows['tone'].loc[long['record']].values
+    long['tone_sq'] = long['tone'] ** 2
+    out = long.groupby(['DATE', 'THEME'], sort=False).agg(
+        count=('tone', 'size'), tone_sum=('tone', 'sum'), tone_sq=('tone_sq', 'sum')
+    ).reset_index()
+    out['count'] = out['count'].astype(np.int32)
+    return out
+
+
+def write_part(theme_df, source_file, parts_dir=THEME_PARTS_DIR):
+    os.makedirs(parts_dir, exist_ok=True)
+    theme_df.to_parquet(os.path.join(parts_dir, f"{os.path.basename(source_file)}.parquet"), index=False)
+
+
+def compact(parts_dir=THEME_PARTS_DIR, out_path=THEME_MATRIX_PATH):
+    """Merges all Parquet parts (summing duplicate date/theme cells) into one CSR .npz."""
+    parts = sorted(glob.glob(os.path.join(parts_dir, '*.parquet')))
+    if not parts:
+        raise FileNotFoundError(f"No theme parts in {parts_dir}")
+    long = pd.concat((pd.read_parquet(p) for p in parts), ignore_index=True)
+    long['DATE'] = long['DATE'].astype(str).str[:8]  # V2 timestamps are YYYYMMDDhhmmss
+    long = long.groupby(['DATE', 'THEME'], as_index=False)[STATS].sum()
+
+    dates = pd.to_datetime(long['DATE'], format='%Y%m%d', errors='coerce')
+    long, dates = long[dates.notna()], dates[dates.notna()]
+    date_codes, date_index = pd.factorize(dates.values.astype('datetime64[D]'), sort=True)
+    theme_codes, theme_index = pd.factorize(long['THEME'], sort=True)
+
+    order = np.lexsort((theme_codes, date_codes))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(date_codes, minlength=len(date_index)))])
+    np.savez(
+        out_path,
+        dates=np.asarray(date_index, dtype='datetime64[D]'),
+        themes=np.asarray(theme_index, dtype=str),
+        indptr=indptr.astype(np.int64),
+        indices=theme_codes[order].astype(np.int32),
+        count=long['count'].to_numpy(np.int32)[order],
+        tone_sum=long['tone_sum'].to_numpy(np.float64)[order],
+        tone_sq=long['tone_sq'].to_numpy(np.float64)[order],
+    )
+    print(f"Compacted {len(parts)} parts -> {out_path}: {len(date_index)} dates x {len(theme_index)} themes, "
+          f"{len(order):,} non-zero cells")
+    return out_path
+
+
+class ThemeMatrix:
+    """Loaded theme matrix; statistics are sliced by column from a CSC copy built on first use."""
+
+    def __init__(self, path=THEME_MATRIX_PATH):
+        data = np.load(path)
+        self.dates = pd.DatetimeIndex(data['dates'], name='Date')
+        self.themes = list(data['themes'])
+        self._position = {t: i for i, t in enumerate(self.themes)}
+        self._structure = (data['indptr'], data['indices'])
+        self._data = {stat: data[stat] for stat in STATS}
+        self._csc = {}
+
+    def matrix(self, stat='count'):
+        """scipy.sparse CSR matrix (dates x themes) of one statistic."""
+        from scipy.sparse import csr_matrix
+
+        indptr, indices = self._structure
+        return csr_matrix((self._data[stat], indices, indptr), shape=(len(self.dates), len(self.themes)))
+
+    def _columns(self, stat, cols):
+        if stat not in self._csc:
+            self._csc[stat] = self.matrix(stat).tocsc()
+        return self._csc[stat][:, cols].toarray()
+
+    def select(self, themes=None, contains=None):
+        """Column positions for explicit theme codes and/or themes containing a substring."""
+        cols = [self._position[t] for t in (themes or []) if t in self._position]
+        if contains:
+            cols += [i for i, t in enumerate(self.themes) if contains in t and i not in cols]
+        return cols
+
+    def features(self, themes, prefix=None):
+        """
+        Daily per-theme features: <theme>_Tone (mean), <theme>_Count and
+        <theme>_Disagreement (std of tone across records). Days without a
+        record have Count 0 and NaN tone.
+        """
+        cols = self.select(themes)
+        count, tone_sum, tone_sq = (self._columns(stat, cols) for stat in STATS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = tone_sum / count
+            var = (tone_sq - count * mean ** 2) / (count - 1)
+        out = {}
+        for j, col in enumerate(cols):
+            name = f"{prefix}{self.themes[col]}" if prefix else self.themes[col]
+            out[f"{name}_Tone"] = mean[:, j]
+            out[f"{name}_Count"] = count[:, j]
+            out[f"{name}_Disagreement"] = np.sqrt(np.clip(var[:, j], 0, None))
+        return pd.DataFrame(out, index=self.dates)
+
+    def pooled(self, themes=None, contains=None, name='Pooled'):
+        """Tone mean/std and record count pooled over a set of themes (records counted once per theme)."""
+        cols = self.select(themes, contains)
+        count, tone_sum, tone_sq = (self._columns(stat, cols).sum(axis=1) for stat in STATS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = tone_sum / count
+            std = np.sqrt(np.clip((tone_sq - count * mean ** 2) / (count - 1), 0, None))
+        return pd.DataFrame({f"{name}_Tone": mean, f"{name}_Count": count, f"{name}_Disagreement": std},
+                            index=self.dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-theme daily GKG sentiment matrix')
+    parser.add_argument('--path', default=THEME_MATRIX_PATH, help=f'Matrix file (default: {THEME_MATRIX_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('compact', help='Merge Parquet parts into the matrix file')
+    build.add_argument('--parts', default=THEME_PARTS_DIR, help=f'Parts directory (default: {THEME_PARTS_DIR})')
+    commands.add_parser('info', help='Matrix summary')
+    show = commands.add_parser('show', help='Daily features for themes')
+    show.add_argument('themes', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        compact(args.parts, args.path)
+        return
+
+    tm = ThemeMatrix(args.path)
+    if args.command == 'info':
+        nnz = len(tm._structure[1])
+        print(f"Dates:   {len(tm.dates)} ({tm.dates.min().date()} to {tm.dates.max().date()})")
+        print(f"Themes:  {len(tm.themes)}")
+        print(f"Cells:   {nnz:,} non-zero ({nnz / max(1, len(tm.dates) * len(tm.themes)):.1%} dense)")
+        print(f"File:    {os.path.getsize(args.path) / 1e6:.1f} MB")
+        top = np.asarray(tm.matrix('count').sum(axis=0)).ravel().argsort()[::-1][:10]
+        print("Most frequent themes: " + ", ".join(tm.themes[i] for i in top))
+    else:
+        print(tm.features(args.themes).dropna(how='all').to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Long-running ingest loop: watches a directory for new files, processes each in
+a bounded process pool as soon as it is fully written, and runs downstream
+updates as results land. Used by `python process-gdelt.py --watch`.
+
+Files are discovered by polling (portable, and it works on network mounts
+where inotify does not). A file is considered complete once its size and mtime
+have not changed for SETTLE_SECONDS. Downloaders that write to a temporary name
+and rename (fetch-gdelt.py's .part files) are picked up on the next poll. At
+most `workers * IN_FLIGHT_PER_WORKER` files are in the pool at once. The
+pending queue is capped at MAX_QUEUE; while it is full the watcher stops
+admitting new files (they stay on disk until there is room) and defers
+downstream updates, so a backlog drains at full speed instead of growing in
+memory.
+
+Metrics (queue depth, in-flight, throughput, detect->done latency and
+file-written->done lag percentiles, backpressure state) are written atomically
+to METRICS_PATH on every poll:
+
+    python watcher.py                       # Print the current metrics
+"""
+
+import json
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+
+from instrumentation import LatencyTracker
+
+POLL_INTERVAL = 5.0         # Seconds between directory scans
+SETTLE_SECONDS = 2.0        # Size/mtime must be unchanged this long before a file is processed
+IN_FLIGHT_PER_WORKER = 2    # Files submitted to the pool per worker
+MAX_QUEUE = 256             # Pending files admitted before backpressure kicks in
+DOWNSTREAM_INTERVAL = 60.0  # Minimum seconds between downstream updates while files keep arriving
+METRICS_PATH = os.path.join('results', 'watch_metrics.json')
+
+
+def _ignore_interrupts():
+    """Pool initializer: workers leave SIGINT/SIGTERM to the loop, which drains them."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+class DirectoryWatcher:
+    """Polls a directory and yields files matching a pattern once they stop changing."""
+
+    def __init__(self, directory, pattern, seen=(), settle=SETTLE_SECONDS, by_name=False):
+        self.directory = directory
+        self.pattern = pattern
+        self.settle = settle
+        self.by_name = by_name      # Order ready files by name (e.g. timestamped names) instead of mtime
+        self.seen = set(seen)       # Basenames already processed (or admitted)
+        self._candidates = {}       # path -> (size, mtime, unchanged since)
+
+    def poll(self, limit=None):
+        """Paths that are new and complete, oldest (or first by name) first, at most `limit` of them."""
+        now = time.time()
+        ready = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        for entry in entries:
+            if entry.name in self.seen or not fnmatch(entry.name, self.pattern) or not entry.is_file():
+                continue
+            st = entry.stat()
+            state = (st.st_size, st.st_mtime)
+            previous = self._candidates.get(entry.path)
+            if previous is None or previous[:2] != state:
+                self._candidates[entry.path] = (*state, now)
+            elif st.st_size > 0 and now - previous[2] >= self.settle:
+                ready.append((st.st_mtime, entry.path))
+        ready.sort(key=(lambda r: os.path.basename(r[1])) if self.by_name else None)
+        ready = ready[:limit] if limit is not None else ready
+        for _, path in ready:
+            self.seen.add(os.path.basename(path))
+            self._candidates.pop(path, None)
+        return [(path, mtime) for mtime, path in ready]
+
+
+class WatchLoop:
+    """
+    Drives a DirectoryWatcher through a bounded ProcessPoolExecutor.
+
+    task(path) runs in a worker; handle(path, result) runs in this process for
+    every finished file; downstream() runs after new results once the queue is
+    not backed up (and at most every downstream_interval seconds while files
+    keep arriving). With ordered=True results are handed on in submission
+    order: a file that finishes early waits (still counted in flight) until
+    every file submitted before it has been handled.
+    """
+
+    def __init__(self, watcher, task, handle, downstream=None, workers=1, max_queue=MAX_QUEUE,
+                 poll_interval=POLL_INTERVAL, downstream_interval=DOWNSTREAM_INTERVAL,
+                 metrics_path=METRICS_PATH, ordered=False):
+        self.watcher = watcher
+        self.task = task
+        self.handle = handle
+        self.downstream = downstream
+        self.workers = workers
+        self.max_in_flight = workers * IN_FLIGHT_PER_WORKER
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.downstream_interval = downstream_interval
+        self.metrics_path = metrics_path
+        self.ordered = ordered
+
+        self.queue = deque()        # (path, file mtime, detected at)
+        self.in_flight = {}         # future -> (path, file mtime, detected at), in submission order
+        self.latency = LatencyTracker()
+        self.lag = LatencyTracker()
+        self.started = time.time()
+        self.processed = 0
+        self.failed = 0
+        self.backpressure = False
+        self.backpressure_events = 0
+        self.pending_downstream = 0
+        self.last_downstream = time.time()
+        self.downstream_runs = 0
+        self.downstream_seconds = 0.0
+        self._stopping = False
+
+    def stop(self, *_):
+        if not self._stopping:
+            print("\nStopping: finishing in-flight files...")
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        print(f"Watching {self.watcher.directory}/{self.watcher.pattern} "
+              f"({self.workers} workers, queue limit {self.max_queue}, poll {self.poll_interval:g}s)")
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts) as pool:
+            while not (self._stopping and not self.in_flight):
+                if not self._stopping:
+                    self._admit()
+                while self.queue and len(self.in_flight) < self.max_in_flight and not self._stopping:
+                    path, mtime, detected = self.queue.popleft()
+                    self.in_flight[pool.submit(self.task, path)] = (path, mtime, detected)
+
+                if self.in_flight:
+                    pending = [f for f in self.in_flight if not f.done()]
+                    if pending:
+                        wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in self._completed():
+                        self._finish(future)
+                else:
+                    time.sleep(0.2 if self._stopping else self.poll_interval)
+
+                self._maybe_downstream()
+                self.write_metrics()
+
+        if self.pending_downstream:
+            self._run_downstream()
+        self.write_metrics()
+        print(f"Stopped after {self.processed} files ({self.failed} failed).")
+
+    def _admit(self):
+        room = self.max_queue - len(self.queue)
+        if room <= 0:
+            if not self.backpressure:
+                self.backpressure_events += 1
+                print(f"Backpressure: {len(self.queue)} files queued; pausing intake")
+            self.backpressure = True
+            return
+        if self.backpressure:
+            if len(self.queue) > self.max_queue // 2:
+                return
+            self.backpressure = False
+            print(f"Backpressure released ({len(self.queue)} files queued)")
+        now = time.time()
+        for path, mtime in self.watcher.poll(limit=room):
+            self.queue.append((path, mtime, now))
+
+    def _completed(self):
+        """Finished futures to hand on: all of them, or only the finished prefix when ordered."""
+        if not self.ordered:
+            return [f for f in self.in_flight if f.done()]
+        done = []
+        for future in self.in_flight:
+            if not future.done():
+                break
+            done.append(future)
+        return done
+
+    def _finish(self, future):
+        path, mtime, detected = self.in_flight.pop(future)
+        try:
+            self.handle(path, future.result())
+            self.processed += 1
+            self.pending_downstream += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"  ✗ {os.path.basename(path)}: {e}")
+        now = time.time()
+        self.latency.record(now - detected)
+        self.lag.record(max(0.0, now - mtime))
+
+    def _maybe_downstream(self):
+        if not self.pending_downstream or self.downstream is None or self.backpressure:
+            return
+        idle = not self.queue and not self.in_flight
+        if idle or time.time() - self.last_downstream >= self.downstream_interval:
+            self._run_downstream()
+
+    def _run_downstream(self):
+        start = time.time()
+        try:
+            if self.downstream is not None:
+                self.downstream()
+        except Exception as e:
+            print(f"  ✗ Downstream update failed: {e}")
+        self.downstream_runs += 1
+        self.downstream_seconds = time.time() - start
+        self.last_downstream = time.time()
+        self.pending_downstream = 0
+
+    def metrics(self):
+        uptime = time.time() - self.started
+        return {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'uptime_s': round(uptime, 1),
+            'queue_depth': len(self.queue),
+            'in_flight': len(self.in_flight),
+            'processed': self.processed,
+            'failed': self.failed,
+            'files_per_min': round(60 * self.processed / max(uptime, 1e-9), 2),
+            'backpressure': self.backpressure,
+            'backpressure_events': self.backpressure_events,
+            'latency': self.latency.summary(),     # Detected -> handled
+            'lag': self.lag.summary(),             # File last written -> handled
+            'pending_downstream': self.pending_downstream,
+            'downstream_runs': self.downstream_runs,
+            'downstream_last_s': round(self.downstream_seconds, 3),
+        }
+
+    def write_metrics(self):
+        if not self.metrics_path:
+            return
+        os.makedirs(os.path.dirname(self.metrics_path) or '.', exist_ok=True)
+        tmp = self.metrics_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.metrics(), f, indent=2)
+        os.replace(tmp, self.metrics_path)
+
+
+if __name__ == '__main__':
+    with open(METRICS_PATH) as f:
+        print(json.dumps(json.load(f), indent=2))